@@ -7,6 +7,9 @@ import MessageBubble from './MessageBubble';
 
 const { Title } = Typography;
 
+// Messages fetched per history page; older pages load on demand
+const HISTORY_PAGE_SIZE = 50;
+
 interface ChatInterfaceProps {
   userContact: string;
   sessionId: string | null;
@@ -24,6 +27,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userContact, sessionId: p
     hasTicket: boolean;
     guidanceStage: string;
   }>({ isActive: true, hasTicket: false, guidanceStage: 'normal' });
+  const [historyCursor, setHistoryCursor] = useState<number | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -50,13 +54,15 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userContact, sessionId: p
       setMessages([welcomeMessage]);
       setSessionId('');
       setChatDisabled(false);
+      setHistoryCursor(null);
     }
   }, [propSessionId]);
 
-  const loadSessionHistory = async (sessionIdToLoad: string) => {
+  const loadSessionHistory = async (sessionIdToLoad: string, before?: number) => {
     try {
       setLoading(true);
-      const response = await fetch(`http://localhost:8000/chat/history/${sessionIdToLoad}`);
+      const cursor = before !== undefined ? `&before=${before}` : '';
+      const response = await fetch(`http://localhost:8000/chat/history/${sessionIdToLoad}?limit=${HISTORY_PAGE_SIZE}${cursor}`);
       if (response.ok) {
         const data = await response.json();
         const loadedMessages: Message[] = [];
@@ -74,10 +80,10 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userContact, sessionId: p
         }
         
         // Load messages
-        data.messages.forEach((item: any, index: number) => {
+        data.messages.forEach((item: any) => {
           // Add user message
           loadedMessages.push({
-            id: `loaded-user-${index}`,
+            id: `loaded-user-${item.id}`,
             content: item.message,
             sender: 'user',
             timestamp: new Date(item.created_at),
@@ -85,14 +91,16 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userContact, sessionId: p
           
           // Add AI response
           loadedMessages.push({
-            id: `loaded-ai-${index}`,
+            id: `loaded-ai-${item.id}`,
             content: item.response,
             sender: 'ai',
             timestamp: new Date(item.created_at),
           });
         });
         
-        setMessages(loadedMessages);
+        // Older pages go above what is already shown
+        setMessages(prev => (before !== undefined ? [...loadedMessages, ...prev] : loadedMessages));
+        setHistoryCursor(data.next_cursor ?? null);
       } else {
         throw new Error('Failed to load session history');
       }
@@ -259,6 +267,13 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ userContact, sessionId: p
         }}
       >
         <div>
+          {historyCursor !== null && sessionId && (
+            <div style={{ textAlign: 'center', marginBottom: 16 }}>
+              <Button size="small" onClick={() => loadSessionHistory(sessionId, historyCursor)} disabled={loading}>
+                Load earlier messages
+              </Button>
+            </div>
+          )}
           {messages.map((message) => (
             <MessageBubble 
               key={message.id} 
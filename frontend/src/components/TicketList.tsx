@@ -20,8 +20,8 @@ import {
   ClockCircleOutlined,
   CheckCircleOutlined
 } from '@ant-design/icons';
-import { Ticket } from '../types';
-import { getTickets, updateTicketStatus } from '../services/api';
+import { Ticket, TicketUpdatedEvent } from '../types';
+import { getTickets, updateTicketStatus, subscribeToEvents } from '../services/api';
 
 const { Title, Text, Paragraph } = Typography;
 const { Option } = Select;
@@ -67,12 +67,31 @@ const TicketList: React.FC = () => {
     fetchTickets();
   }, []);
 
+  // Apply pushed changes as deltas instead of re-fetching the whole list
+  useEffect(() => {
+    const unsubscribe = subscribeToEvents(['tickets'], {
+      ticket_created: (ticket: Ticket) => {
+        setTickets(prev => (prev.some(t => t.id === ticket.id) ? prev : [ticket, ...prev]));
+      },
+      ticket_updated: (update: TicketUpdatedEvent) => {
+        setTickets(prev => prev.map(t => (t.id === update.id ? { ...t, status: update.status, updated_at: update.updated_at } : t)));
+        setSelectedTicket(prev => (prev && prev.id === update.id ? { ...prev, status: update.status } : prev));
+      },
+    });
+    return unsubscribe;
+  }, []);
+
+  useEffect(() => {
+    applyFilter(tickets, statusFilter);
+  }, [tickets, statusFilter]);
+
   const handleStatusUpdate = async (ticketId: number, newStatus: 'open' | 'in_progress' | 'closed') => {
     setUpdateLoading(true);
     try {
       await updateTicketStatus(ticketId, newStatus);
       message.success(`Ticket status updated to ${newStatus}`);
-      fetchTickets(); // Refresh the list
+      // Other workers' ticket_updated events may arrive late; refetch so this list is current
+      fetchTickets();
       if (selectedTicket && selectedTicket.id === ticketId) {
         setSelectedTicket({ ...selectedTicket, status: newStatus });
       }
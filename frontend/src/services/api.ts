@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { ChatRequest, ChatResponse, Ticket, KnowledgeBase, ChatHistory } from '../types';
+import { ChatRequest, ChatResponse, Ticket, KnowledgeBase, ChatHistory, ServerEventType } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -16,8 +16,8 @@ export const sendMessage = async (chatRequest: ChatRequest): Promise<ChatRespons
   return response.data;
 };
 
-export const getChatHistory = async (sessionId: string): Promise<ChatHistory> => {
-  const response = await api.get(`/chat/history/${sessionId}`);
+export const getChatHistory = async (sessionId: string, limit?: number, before?: number): Promise<ChatHistory> => {
+  const response = await api.get(`/chat/history/${sessionId}`, { params: { limit, before } });
   return response.data;
 };
 
@@ -62,6 +62,19 @@ export const reloadConfig = async (): Promise<{ message: string }> => {
   return response.data;
 };
 
+// Server-push events (SSE). EventSource reconnects on its own and resumes with Last-Event-ID.
+// Returns a function that closes the stream.
+export const subscribeToEvents = (
+  topics: string[],
+  handlers: Partial<Record<ServerEventType, (data: any) => void>>
+): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/events?topics=${encodeURIComponent(topics.join(','))}`);
+  (Object.keys(handlers) as ServerEventType[]).forEach((type) => {
+    source.addEventListener(type, (event) => handlers[type]?.(JSON.parse((event as MessageEvent).data)));
+  });
+  return () => source.close();
+};
+
 // Health check
 export const healthCheck = async (): Promise<{ message: string; version: string }> => {
   const response = await api.get('/');
@@ -32,6 +32,7 @@ export interface Ticket {
   status: 'open' | 'in_progress' | 'closed';
   ai_attempted_response: string;
   created_at: string;
+  updated_at: string | null;
 }
 
 export interface KnowledgeBase {
@@ -49,4 +50,14 @@ export interface ChatHistory {
     sender: 'user' | 'ai';
     timestamp: string;
   }>;
-}
\ No newline at end of file
+}
+
+// Server-push events from GET /events
+export type ServerEventType = 'ticket_created' | 'ticket_updated' | 'chat_message' | 'session_created';
+
+export interface TicketUpdatedEvent {
+  topic: string;
+  id: number;
+  status: Ticket['status'];
+  updated_at: string;
+}
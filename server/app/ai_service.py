@@ -1,13 +1,17 @@
+import os
 import re
 import random
-import aiohttp
 import json
 from typing import Tuple, Dict, Any
 from config_loader import config
+from llm_router import LLMRouter
+from metrics import span
 
 class LocalAIService:
     """Generic local AI service for FAQ systems"""
     
+    CONFIG_SECTIONS = ('ai_settings', 'ai_prompts', 'response_templates', 'ticket_logic')
+    
     def __init__(self):
         # Load configuration
         self.ai_settings = config.get_ai_settings()
@@ -15,8 +19,16 @@ class LocalAIService:
         self.response_templates = config.get_response_templates()
         self.ticket_logic = config.get_ticket_logic()
         
-        self.ollama_url = "http://localhost:11434"
-        self.model_name = "deepseek-r1:1.5b"
+        # Pool of Ollama backends and per-task models (see ai_settings in ai_prompts_config.yaml)
+        self.llm_router = LLMRouter(self.ai_settings)
+        self.ollama_url = self.llm_router.backends[0].url
+        self.model_name = self.llm_router.model_for('default')
+        
+        # Free-form LLM replies vary between calls, so the answer cache keeps them only on request
+        self.cache_llm_answers = os.getenv("ANSWER_CACHE_LLM", "0").lower() in ("1", "true", "yes")
+        
+        # Hot reload: refresh only the sections that changed
+        config.subscribe(self._on_config_changed, self.CONFIG_SECTIONS)
         
         self.greeting_responses = [
             "Hello! I'm here to help answer your questions. What can I assist you with today?",
@@ -76,32 +88,14 @@ class LocalAIService:
             }
         }
 
-    async def _call_ollama(self, prompt: str) -> str:
-        """Call Ollama API to generate response"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False
-                }
-                
-                async with session.post(
-                    f"{self.ollama_url}/api/generate",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        raw_response = result.get("response", "").strip()
-                        # Filter out <think> sections from R1 model
-                        return self._clean_r1_response(raw_response)
-                    else:
-                        print(f"Ollama API error: {response.status}")
-                        return None
-        except Exception as e:
-            print(f"Error calling Ollama: {e}")
+    async def _call_ollama(self, prompt: str, task: str = 'default') -> str:
+        """Call Ollama API to generate response (routed across the configured backends)"""
+        with span('llm' if task == 'default' else task):
+            raw_response = await self.llm_router.generate(prompt, task)
+        if raw_response is None:
             return None
+        # Filter out <think> sections from R1 model
+        return self._clean_r1_response(raw_response)
 
     def _clean_r1_response(self, response: str) -> str:
         """Remove <think> sections from DeepSeek-R1 model responses"""
@@ -124,6 +118,17 @@ class LocalAIService:
         Generate AI response using LLM with knowledge base integration
         Returns: (response_content, needs_ticket, is_unclear_intent)
         """
+        response, needs_ticket, is_unclear_intent, _ = await self.generate_turn(
+            user_message, kb_answer, kb_found, session_state
+        )
+        return response, needs_ticket, is_unclear_intent
+
+    async def generate_turn(self, user_message: str, kb_answer: str = None, kb_found: bool = False,
+                            session_state: dict = None) -> Tuple[str, bool, bool, bool]:
+        """
+        generate_response, plus whether the reply can be cached for the same message and state
+        Returns: (response_content, needs_ticket, is_unclear_intent, cacheable)
+        """
         
         # Initialize session state if not provided
         if session_state is None:
@@ -138,7 +143,7 @@ class LocalAIService:
         
         if human_help_needed:
             direct_help_response = self._get_direct_help_response()
-            return direct_help_response, True, False  # Force immediate ticket creation
+            return direct_help_response, True, False, True  # Force immediate ticket creation
         
         # Check if this is an unclear intent message
         is_unclear_intent = self._is_unclear_intent(user_message, kb_found)
@@ -151,17 +156,17 @@ class LocalAIService:
                 # Reset session state after ticket creation
                 session_state['guidance_stage'] = 'normal'
                 session_state['unclear_message_count'] = 0
-                return response, True, False  # Create ticket
+                return response, True, False, True  # Create ticket
             elif self._user_wants_to_end_chat(user_message):
                 response = "I understand. Thank you for using our service! Feel free to start a new conversation anytime with a more specific question."
                 # Set special status to indicate chat ended
                 session_state['guidance_stage'] = 'ended'
                 session_state['unclear_message_count'] = 0
-                return response, False, False  # End chat, no ticket
+                return response, False, False, True  # End chat, no ticket
             else:
                 # User didn't give clear choice, ask again
                 response = "Please let me know clearly: would you like me to **create a support ticket** or **end this conversation**?"
-                return response, False, True
+                return response, False, True, True
         
         # Handle 3-message guidance system
         if is_unclear_intent and session_state['guidance_stage'] != 'escalated':
@@ -172,12 +177,12 @@ class LocalAIService:
                 # After 3 unclear messages, give user choice
                 response = self._get_choice_message()
                 session_state['guidance_stage'] = 'waiting_for_choice'  # Set state to wait for choice
-                return response, False, True  # Don't force ticket, let user choose
+                return response, False, True, True  # Don't force ticket, let user choose
             else:
                 # Provide guidance
                 response = self._get_guidance_message(user_message, unclear_count)
                 session_state['guidance_stage'] = 'guiding'  # Set guidance stage
-                return response, False, True
+                return response, False, True, True
         
         if kb_found and kb_answer:
             # Knowledge base found an answer, use LLM to enhance it
@@ -192,11 +197,11 @@ Please provide a helpful, professional response that incorporates this knowledge
                 # Clean the response to remove technical markers
                 cleaned_response = self._clean_technical_markers(llm_response)
                 needs_ticket = self._check_needs_ticket_robust(llm_response, user_message)
-                return cleaned_response, needs_ticket, False
+                return cleaned_response, needs_ticket, False, self.cache_llm_answers
             else:
                 # Fallback to enhanced KB answer if LLM fails
                 enhanced_response = self._enhance_kb_answer(user_message, kb_answer)
-                return enhanced_response, False, False
+                return enhanced_response, False, False, True
         else:
             # No knowledge base match, use LLM for general response
             prompt = f"""You are a helpful customer service assistant. A customer asked: "{user_message}"
@@ -227,12 +232,12 @@ If the message seems like a simple greeting (hello, hi, etc.), respond with a fr
                 # Clean the response to remove technical markers
                 cleaned_response = self._clean_technical_markers(llm_response)
                 needs_ticket = self._check_needs_ticket_robust(llm_response, user_message)
-                return cleaned_response, needs_ticket, False
+                return cleaned_response, needs_ticket, False, self.cache_llm_answers
             else:
                 # Fallback to template responses if LLM fails
                 fallback_response = self._generate_smart_fallback(user_message)
                 needs_ticket = self._check_needs_ticket_robust(fallback_response, user_message)
-                return fallback_response, needs_ticket, False
+                return fallback_response, needs_ticket, False, False  # random template, not worth pinning
 
     def _enhance_kb_answer(self, user_message: str, kb_answer: str) -> str:
         """Enhance knowledge base answers with contextual intros"""
@@ -278,19 +283,16 @@ If the message seems like a simple greeting (hello, hi, etc.), respond with a fr
         if "NEEDS_HUMAN_FOLLOWUP" in ai_response.upper():
             return True
             
+        # Keyword lists are pre-lowered and compiled once per config load
+        ticket_settings = config.settings.ticket
+        
         # Check AI response for ticket keywords
-        response_keywords = self.ticket_logic.get('response_keywords', [])
-        for keyword in response_keywords:
-            if keyword in ai_response:
-                return True
+        if ticket_settings.response_pattern is not None and ticket_settings.response_pattern.search(ai_response):
+            return True
         
         # Check user message for urgent keywords  
-        urgent_keywords = self.ticket_logic.get('urgent_user_keywords', [])
-        user_lower = user_message.lower()
-        
-        for keyword in urgent_keywords:
-            if keyword.lower() in user_lower:
-                return True
+        if ticket_settings.urgent_pattern is not None and ticket_settings.urgent_pattern.search(user_message.lower()):
+            return True
                 
         return False
     
@@ -416,7 +418,7 @@ Respond NO for:
 Answer: YES or NO only"""
 
         try:
-            ai_intent = await self._call_ollama(intent_prompt)
+            ai_intent = await self._call_ollama(intent_prompt, task='intent')
             if ai_intent and "YES" in ai_intent.strip().upper():
                 return True
         except Exception:
@@ -588,9 +590,7 @@ Thank you for reaching out, and we'll have someone contact you soon."""
     
     def get_ticket_created_message(self, ticket_id: int) -> str:
         """Get formatted ticket creation message"""
-        template = self.response_templates.get('ticket_created', 
-            'I have created a support ticket #{ticket_id} for you. Our team will review your request and get back to you soon.')
-        return template.format(ticket_id=ticket_id)
+        return config.settings.templates.ticket_created.render(ticket_id=ticket_id)
     
     def get_welcome_message(self) -> str:
         """Get a random welcome message"""
@@ -608,15 +608,35 @@ Thank you for reaching out, and we'll have someone contact you soon."""
                 "greeting_detection",
                 "pattern_matching"
             ],
-            "contextual_patterns": list(self.contextual_patterns.keys())
+            "contextual_patterns": list(self.contextual_patterns.keys()),
+            "llm_routing": self.llm_router.get_status()
         }
     
+    def _on_config_changed(self, old, new):
+        """Apply a config hot reload, touching only the sections that changed"""
+        changed = config.changed_sections(old, new)
+        if 'ai_prompts' in changed:
+            self.prompts = new.ai_config.get('ai_prompts', {})
+        if 'response_templates' in changed:
+            self.response_templates = new.ai_config.get('response_templates', {})
+        if 'ticket_logic' in changed:
+            self.ticket_logic = new.ai_config.get('ticket_logic', {})
+        if 'ai_settings' in changed:
+            self.ai_settings = new.ai_config.get('ai_settings', {})
+            self.llm_router.configure(self.ai_settings)
+            self.ollama_url = self.llm_router.backends[0].url
+            self.model_name = self.llm_router.model_for('default')
+    
     def reload_config(self):
         """Reload configuration"""
         config.reload_configs()
         self.ai_settings = config.get_ai_settings()
+        self.prompts = config.get_ai_prompts()
         self.response_templates = config.get_response_templates()
         self.ticket_logic = config.get_ticket_logic()
+        self.llm_router.configure(self.ai_settings)
+        self.ollama_url = self.llm_router.backends[0].url
+        self.model_name = self.llm_router.model_for('default')
 
 # Create alias for backward compatibility
 AIService = LocalAIService
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import hashlib
+from typing import List, Tuple
+import numpy as np
+from scipy import sparse
+from vector_index import normalize_rows, top_k, BLOCK_ROWS
+
+
+def chain_fingerprint(fingerprint: str, texts: List[str]) -> str:
+    """Extend a fingerprint with more texts; lets an index be validated after incremental inserts"""
+    for text in texts:
+        fingerprint = hashlib.sha1((fingerprint + '\x00' + text).encode('utf-8')).hexdigest()
+    return fingerprint
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by cosine) for each row, computed in blocks"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], BLOCK_ROWS):
+        block = vectors[start:start + BLOCK_ROWS]
+        assignments[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10,
+                     sample_size: int = None, seed: int = 0) -> np.ndarray:
+    """k-means on the unit sphere; trains on a sample for large inputs. Returns centroids"""
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or n_clusters * 256
+    if vectors.shape[0] > sample_size:
+        vectors = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        # Sum members per cluster with one sparse product instead of a Python loop
+        membership = sparse.csr_matrix(
+            (np.ones(len(assignments), dtype=np.float32), (assignments, np.arange(len(assignments)))),
+            shape=(n_clusters, vectors.shape[0])
+        )
+        sums = np.asarray(membership @ vectors)
+        empty = np.asarray(membership.sum(axis=1)).ravel() == 0
+        if empty.any():
+            # Reseed empty clusters with random points
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index (cosine similarity).
+    Vectors are bucketed by their nearest k-means centroid; a query only scores
+    the vectors in its `nprobe` closest buckets. Raise nprobe for recall, lower it for speed.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = 8, fingerprint: str = ""):
+        self.centroids = normalize_rows(centroids)
+        self.nlist = self.centroids.shape[0]
+        self.dim = self.centroids.shape[1]
+        self.nprobe = nprobe
+        self.fingerprint = fingerprint
+        self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+        self.list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(self.nlist)]
+        self.size = 0
+
+    @staticmethod
+    def default_nlist(n_vectors: int) -> int:
+        return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int = 0, nprobe: int = 8,
+              iterations: int = 10, fingerprint: str = "", seed: int = 0) -> 'IVFIndex':
+        """Train centroids on the vectors and index them"""
+        vectors = normalize_rows(vectors)
+        nlist = nlist or cls.default_nlist(vectors.shape[0])
+        centroids = spherical_kmeans(vectors, min(nlist, vectors.shape[0]), iterations, seed=seed)
+        index = cls(centroids, nprobe=nprobe, fingerprint=fingerprint)
+        index.add(vectors)
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Insert vectors (ids continue from the current size). Returns the new ids"""
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        ids = np.arange(self.size, self.size + vectors.shape[0], dtype=np.int64)
+        assignments = _assign(vectors, self.centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        lists, starts = np.unique(assignments[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for list_no, start, end in zip(lists, starts, ends):
+            rows = order[start:end]
+            self.list_ids[list_no] = np.concatenate([self.list_ids[list_no], ids[rows]])
+            self.list_vectors[list_no] = np.concatenate([self.list_vectors[list_no], vectors[rows]])
+
+        self.size += vectors.shape[0]
+        return ids
+
+    def search(self, queries: np.ndarray, k: int = 1, nprobe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search. Returns (indices, scores) of shape (m, k);
+        missing results are padded with index -1 and score -inf.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes, _ = top_k(queries @ self.centroids.T, nprobe)
+
+        indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            candidate_ids = np.concatenate([self.list_ids[c] for c in probes[row]])
+            if len(candidate_ids) == 0:
+                continue
+            candidate_scores = np.concatenate([self.list_vectors[c] @ query for c in probes[row]])
+            best, best_scores = top_k(candidate_scores[None, :], k)
+            indices[row, :best.shape[1]] = candidate_ids[best[0]]
+            scores[row, :best.shape[1]] = best_scores[0]
+        return indices, scores
+
+    def save(self, path: str):
+        """Write the index to disk atomically"""
+        offsets = np.cumsum([0] + [len(ids) for ids in self.list_ids])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                offsets=offsets,
+                ids=np.concatenate(self.list_ids),
+                vectors=np.concatenate(self.list_vectors),
+                nprobe=np.array(self.nprobe),
+                fingerprint=np.array(self.fingerprint)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        with np.load(path) as data:
+            index = cls(data['centroids'], nprobe=int(data['nprobe']), fingerprint=str(data['fingerprint']))
+            offsets, ids, vectors = data['offsets'], data['ids'], data['vectors']
+        for list_no in range(index.nlist):
+            index.list_ids[list_no] = ids[offsets[list_no]:offsets[list_no + 1]]
+            index.list_vectors[list_no] = vectors[offsets[list_no]:offsets[list_no + 1]]
+        index.size = len(ids)
+        return index
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from shared_state import STATE_DIR, multi_worker_enabled
+from metrics import ANSWER_CACHE_LOOKUPS
+
+
+def normalize_message(message: str) -> str:
+    return ' '.join(message.lower().split())
+
+
+class CachedAnswer:
+    """A finished chat turn: the reply, where it came from, and the session state it leads to"""
+
+    __slots__ = ('response', 'kb_found', 'needs_ticket', 'is_unclear_intent',
+                 'guidance_stage', 'unclear_message_count', 'expires_at')
+
+    def __init__(self, response: str, kb_found: bool, needs_ticket: bool, is_unclear_intent: bool,
+                 guidance_stage: str, unclear_message_count: int, expires_at: float = 0.0):
+        self.response = response
+        self.kb_found = kb_found
+        self.needs_ticket = needs_ticket
+        self.is_unclear_intent = is_unclear_intent
+        self.guidance_stage = guidance_stage
+        self.unclear_message_count = unclear_message_count
+        self.expires_at = expires_at
+
+    def to_json(self) -> str:
+        return json.dumps([self.response, self.kb_found, self.needs_ticket, self.is_unclear_intent,
+                           self.guidance_stage, self.unclear_message_count])
+
+    @classmethod
+    def from_json(cls, value: str, expires_at: float) -> 'CachedAnswer':
+        return cls(*json.loads(value), expires_at=expires_at)
+
+
+class SharedAnswerStore:
+    """
+    Answers shared by all worker processes, in a small SQLite file next to the other shared state.
+    Lookups give up quickly when another worker holds the write lock - a miss is cheaper than waiting.
+    Expiry uses wall-clock time, since monotonic clocks are per process.
+    """
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=0.05, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT value, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading shared answer cache: {e}")
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return CachedAnswer.from_json(row[0], row[1])
+
+    def put(self, key: str, answer: CachedAnswer, ttl: float):
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("INSERT OR REPLACE INTO answers (key, value, expires_at) VALUES (?, ?, ?)",
+                             (key, answer.to_json(), time.time() + ttl))
+                self._puts += 1
+                if self._puts % self.PRUNE_EVERY == 0:
+                    self._prune(conn)
+        except sqlite3.Error as e:
+            print(f"Error writing shared answer cache: {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM answers WHERE expires_at < ?", (time.time(),))
+        conn.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                     (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM answers")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AnswerCache:
+    """
+    Finished chat turns keyed by normalized message + the session state fields the reply
+    depends on + the config/KB version, so a repeated message skips both the KB search and the LLM.
+    Two tiers: an in-process LRU with a TTL, then an optional store shared by all workers
+    (hits there are copied into the LRU). A config or KB change changes every key.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0, shared: SharedAnswerStore = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self.hits = {"lru": 0, "shared": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(message: str, session_state: dict, version: str) -> str:
+        parts = [normalize_message(message), session_state['guidance_stage'],
+                 session_state['unclear_message_count'], version]
+        return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        answer = self._entries.get(key)
+        if answer is not None:
+            if answer.expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                return self._hit("lru", answer)
+            del self._entries[key]
+
+        if self.shared is not None:
+            answer = self.shared.get(key)
+            if answer is not None:
+                self._store(key, answer, min(self.ttl, answer.expires_at - time.time()))
+                return self._hit("shared", answer)
+
+        self.misses += 1
+        ANSWER_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def _hit(self, tier: str, answer: CachedAnswer) -> CachedAnswer:
+        self.hits[tier] += 1
+        ANSWER_CACHE_LOOKUPS.inc(result=f"{tier}_hit")
+        return answer
+
+    def put(self, key: str, answer: CachedAnswer):
+        self._store(key, answer, self.ttl)
+        if self.shared is not None:
+            self.shared.put(key, answer, self.ttl)
+
+    def _store(self, key: str, answer: CachedAnswer, ttl: float):
+        if self.max_entries <= 0:
+            return
+        answer.expires_at = time.monotonic() + ttl
+        self._entries[key] = answer
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def get_stats(self) -> dict:
+        total = sum(self.hits.values()) + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "shared": self.shared.path if self.shared is not None else None,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(sum(self.hits.values()) / total, 3) if total else 0.0
+        }
+
+
+def create_answer_cache() -> Optional[AnswerCache]:
+    """
+    Configure from ANSWER_CACHE_SIZE (in-process entries, default 0 = off), ANSWER_CACHE_TTL
+    (seconds, default 3600) and ANSWER_CACHE_SHARED (1 = also share answers between workers
+    through ANSWER_CACHE_PATH, default on with several workers once the cache is enabled).
+    Returns None when no tier is enabled.
+    """
+    max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "0"))
+    ttl = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    default_shared = "1" if multi_worker_enabled() and max_entries > 0 else "0"
+    shared = None
+    if os.getenv("ANSWER_CACHE_SHARED", default_shared).lower() in ("1", "true", "yes"):
+        shared = SharedAnswerStore(os.getenv("ANSWER_CACHE_PATH", os.path.join(STATE_DIR, "answer_cache.sqlite3")))
+    if ttl <= 0 or (max_entries <= 0 and shared is None):
+        return None
+    return AnswerCache(max_entries=max_entries, ttl=ttl, shared=shared)
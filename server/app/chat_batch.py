@@ -0,0 +1,181 @@
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field, asdict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+BATCH_FORMATS = ('jsonl', 'text')
+
+
+@dataclass
+class BatchItem:
+    index: int
+    message: str
+    id: Optional[str] = None
+    session: Optional[str] = None  # items sharing a session are replayed in order, as one conversation
+
+
+@dataclass
+class BatchResult:
+    index: int
+    id: Optional[str]
+    session: Optional[str]
+    message: str
+    response: Optional[str] = None
+    is_from_kb: bool = False
+    kb_score: float = 0.0
+    needs_ticket: bool = False
+    is_unclear_intent: bool = False
+    guidance_stage: str = 'normal'
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class BatchSummary:
+    items: int = 0
+    errors: int = 0
+    kb_hits: int = 0
+    tickets: int = 0
+    unclear: int = 0
+    kb_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    issues: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        summary = asdict(self)
+        summary['kb_hit_rate'] = round(self.kb_hits / self.items, 4) if self.items else 0.0
+        summary['items_per_second'] = round(self.items / self.elapsed_seconds, 2) if self.elapsed_seconds else 0.0
+        return summary
+
+
+def parse_batch(lines: Iterable[str], fmt: str = 'jsonl') -> Tuple[List[BatchItem], List[str]]:
+    """
+    Questions from JSONL ({"message" or "question", optional "id" and "session"}) or plain text,
+    one per line. Returns the items and a list of issues for lines that were skipped.
+    """
+    if fmt not in BATCH_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(BATCH_FORMATS)}")
+    items: List[BatchItem] = []
+    issues: List[str] = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if fmt == 'text':
+            items.append(BatchItem(index=len(items), message=line))
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            issues.append(f"line {line_number}: invalid JSON ({e.msg})")
+            continue
+        if isinstance(record, str):
+            record = {'message': record}
+        message = record.get('message', record.get('question')) if isinstance(record, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            issues.append(f"line {line_number}: missing message")
+            continue
+        session = record.get('session', record.get('session_id'))
+        items.append(BatchItem(
+            index=len(items),
+            message=message.strip(),
+            id=str(record['id']) if record.get('id') is not None else None,
+            session=str(session) if session is not None else None
+        ))
+    return items, issues
+
+
+class BatchChatRunner:
+    """
+    Answers many chat messages at once, for offline evaluation and bulk replay.
+    KB retrieval for the whole batch is one vectorized search; LLM work runs on a pool of
+    `concurrency` workers. Results are yielded as they complete, not in input order.
+    Nothing is written here - persisting sessions and tickets is up to the caller.
+    """
+
+    def __init__(self, kb_service, ai_service, concurrency: int = 8, retrieval_only: bool = False):
+        self.kb_service = kb_service
+        self.ai_service = ai_service
+        self.concurrency = max(1, concurrency)
+        self.retrieval_only = retrieval_only
+        self.summary = BatchSummary()
+
+    def _conversations(self, items: List[BatchItem]) -> List[List[BatchItem]]:
+        """Items grouped per session (in input order); items without a session stand alone"""
+        sessions: Dict[str, List[BatchItem]] = {}
+        conversations: List[List[BatchItem]] = []
+        for item in items:
+            if item.session is None:
+                conversations.append([item])
+            elif item.session in sessions:
+                sessions[item.session].append(item)
+            else:
+                sessions[item.session] = [item]
+                conversations.append(sessions[item.session])
+        return conversations
+
+    async def _answer(self, item: BatchItem, kb_match: tuple, session_state: dict) -> BatchResult:
+        kb_answer, kb_found, kb_score = kb_match
+        result = BatchResult(index=item.index, id=item.id, session=item.session, message=item.message,
+                             is_from_kb=kb_found, kb_score=round(kb_score, 4))
+        start = time.perf_counter()
+        try:
+            if self.retrieval_only:
+                result.response = kb_answer if kb_found else None
+            else:
+                response, needs_ticket, is_unclear_intent = await self.ai_service.generate_response(
+                    item.message, kb_answer, kb_found, session_state
+                )
+                result.response = response
+                result.is_unclear_intent = is_unclear_intent
+                result.needs_ticket = needs_ticket or self.ai_service.should_create_ticket(item.message, response, kb_found)
+                result.guidance_stage = session_state['guidance_stage']
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    async def run(self, items: List[BatchItem]) -> AsyncIterator[BatchResult]:
+        summary = self.summary
+        started = time.perf_counter()
+        summary.items = len(items)
+
+        # One matrix product for the whole batch, off the event loop
+        kb_start = time.perf_counter()
+        kb_matches = await asyncio.to_thread(self.kb_service.search_many, [item.message for item in items])
+        summary.kb_seconds = round(time.perf_counter() - kb_start, 3)
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for conversation in self._conversations(items):
+            pending.put_nowait(conversation)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    conversation = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                session_state = {'unclear_message_count': 0, 'guidance_stage': 'normal'}
+                for item in conversation:
+                    await results.put(await self._answer(item, kb_matches[item.index], session_state))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, pending.qsize()))]
+        try:
+            for _ in range(len(items)):
+                result = await results.get()
+                summary.errors += result.error is not None
+                summary.kb_hits += result.is_from_kb
+                summary.tickets += result.needs_ticket
+                summary.unclear += result.is_unclear_intent
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            summary.elapsed_seconds = round(time.perf_counter() - started, 3)
+
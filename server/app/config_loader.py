@@ -1,7 +1,47 @@
 import yaml
 import os
-from typing import Dict, Any, List
+import hashlib
+import threading
+import weakref
+from types import MappingProxyType
+from typing import Dict, Any, List, Callable, Iterable, Set
 from pathlib import Path
+from config_settings import RuntimeSettings
+
+KB_CONFIG_FILE = "knowledge_base_config.yaml"
+AI_CONFIG_FILE = "ai_prompts_config.yaml"
+
+
+def _freeze(value):
+    """Recursively convert parsed YAML into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ConfigSnapshot:
+    """Immutable view of both config files at one point in time"""
+    
+    __slots__ = ('kb_config', 'ai_config', 'settings', 'version', 'mtimes')
+    
+    def __init__(self, kb_config, ai_config, settings: RuntimeSettings, version: str, mtimes: tuple):
+        self.kb_config = kb_config
+        self.ai_config = ai_config
+        self.settings = settings
+        self.version = version
+        self.mtimes = mtimes
+    
+    def section(self, name: str):
+        """Get a top-level section from either config file"""
+        if name in self.kb_config:
+            return self.kb_config[name]
+        return self.ai_config.get(name)
+    
+    def sections(self) -> Set[str]:
+        return set(self.kb_config) | set(self.ai_config)
+
 
 class ConfigLoader:
     def __init__(self, config_dir: str = None):
@@ -11,27 +51,161 @@ class ConfigLoader:
         else:
             self.config_dir = Path(config_dir)
         
-        self.kb_config = None
-        self.ai_config = None
+        self._snapshot = None
+        self._subscribers = []
+        self._reload_lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
         self._load_configs()
     
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """Current config snapshot - grab it once per request for a consistent view"""
+        return self._snapshot
+    
+    @property
+    def kb_config(self):
+        return self._snapshot.kb_config
+    
+    @property
+    def ai_config(self):
+        return self._snapshot.ai_config
+    
+    @property
+    def settings(self) -> RuntimeSettings:
+        """Typed, precompiled settings for the hot path"""
+        return self._snapshot.settings
+    
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+    
+    def _config_paths(self) -> List[Path]:
+        return [self.config_dir / KB_CONFIG_FILE, self.config_dir / AI_CONFIG_FILE]
+    
+    def _current_mtimes(self) -> tuple:
+        mtimes = []
+        for path in self._config_paths():
+            stat = os.stat(path)
+            mtimes.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(mtimes)
+    
+    def _read_configs(self) -> ConfigSnapshot:
+        """Parse and validate both config files into a new snapshot (does not touch the current one)"""
+        mtimes = self._current_mtimes()
+        kb_config_path, ai_config_path = self._config_paths()
+        
+        with open(kb_config_path, 'rb') as f:
+            kb_raw = f.read()
+        with open(ai_config_path, 'rb') as f:
+            ai_raw = f.read()
+        
+        kb_config = yaml.safe_load(kb_raw.decode('utf-8'))
+        ai_config = yaml.safe_load(ai_raw.decode('utf-8'))
+        self._validate(kb_config, ai_config)
+        
+        version = hashlib.sha1(kb_raw + b'\x00' + ai_raw).hexdigest()[:12]
+        settings = RuntimeSettings.from_config(kb_config, ai_config)
+        return ConfigSnapshot(_freeze(kb_config), _freeze(ai_config), settings, version, mtimes)
+    
+    @staticmethod
+    def _validate(kb_config, ai_config):
+        """Reject configs that would break request handling"""
+        if not isinstance(kb_config, dict) or not isinstance(kb_config.get('knowledge_base'), dict):
+            raise ValueError(f"{KB_CONFIG_FILE}: missing 'knowledge_base' section")
+        if not isinstance(ai_config, dict):
+            raise ValueError(f"{AI_CONFIG_FILE}: expected a mapping at the top level")
+        
+        kb_section = kb_config['knowledge_base']
+        threshold = kb_section.get('similarity_threshold', 0.3)
+        if not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+            raise ValueError(f"{KB_CONFIG_FILE}: similarity_threshold must be a number between 0 and 1")
+        
+        no_match_responses = kb_section.get('no_match_responses')
+        if no_match_responses is not None and (not isinstance(no_match_responses, list) or not no_match_responses):
+            raise ValueError(f"{KB_CONFIG_FILE}: no_match_responses must be a non-empty list")
+        
+        ticket_logic = ai_config.get('ticket_logic') or {}
+        for key in ('response_keywords', 'urgent_user_keywords'):
+            keywords = ticket_logic.get(key, [])
+            if not isinstance(keywords, list) or not all(isinstance(keyword, str) for keyword in keywords):
+                raise ValueError(f"{AI_CONFIG_FILE}: ticket_logic.{key} must be a list of strings")
+    
     def _load_configs(self):
         """Load all configuration files"""
         try:
-            # Load knowledge base config
-            kb_config_path = self.config_dir / "knowledge_base_config.yaml"
-            with open(kb_config_path, 'r', encoding='utf-8') as f:
-                self.kb_config = yaml.safe_load(f)
-            
-            # Load AI prompts config
-            ai_config_path = self.config_dir / "ai_prompts_config.yaml"
-            with open(ai_config_path, 'r', encoding='utf-8') as f:
-                self.ai_config = yaml.safe_load(f)
-                
+            self._snapshot = self._read_configs()
         except Exception as e:
             print(f"Error loading configs: {e}")
             raise
     
+    @staticmethod
+    def changed_sections(old: ConfigSnapshot, new: ConfigSnapshot) -> Set[str]:
+        """Names of top-level sections that differ between two snapshots"""
+        return {name for name in old.sections() | new.sections() if old.section(name) != new.section(name)}
+    
+    def subscribe(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None], sections: Iterable[str]):
+        """
+        Call callback(old_snapshot, new_snapshot) after a reload that changed any of the given sections.
+        Bound methods are held weakly so subscribing does not keep services alive.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else (lambda: callback)
+        self._subscribers.append((frozenset(sections), ref))
+    
+    def reload_configs(self) -> Set[str]:
+        """
+        Reload configuration files. The new snapshot is parsed and validated first and then
+        swapped in with a single assignment; on error the current config stays active.
+        Returns the names of the sections that changed.
+        """
+        with self._reload_lock:
+            new = self._read_configs()
+            old = self._snapshot
+            self._snapshot = new
+            changed = self.changed_sections(old, new)
+            
+            if changed:
+                print(f"Config reloaded (version {new.version}), changed sections: {', '.join(sorted(changed))}")
+            
+            live = []
+            for sections, ref in self._subscribers:
+                callback = ref()
+                if callback is None:
+                    continue
+                live.append((sections, ref))
+                if sections & changed:
+                    try:
+                        callback(old, new)
+                    except Exception as e:
+                        print(f"Error applying config change in {callback}: {e}")
+            self._subscribers = live
+            return changed
+    
+    def start_watching(self, interval: float = 2.0):
+        """Poll config file modification times in a background thread and hot-reload on change"""
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="config-watcher", daemon=True
+        )
+        self._watch_thread.start()
+    
+    def stop_watching(self):
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+            self._watch_thread = None
+    
+    def _watch_loop(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            try:
+                if self._current_mtimes() != self._snapshot.mtimes:
+                    self.reload_configs()
+            except Exception as e:
+                # Half-written or invalid file - keep serving the previous snapshot
+                print(f"Config reload failed, keeping previous config: {e}")
+    
     def get_knowledge_base_config(self) -> Dict[str, Any]:
         """Get knowledge base configuration"""
         return self.kb_config.get('knowledge_base', {})
@@ -56,20 +230,33 @@ class ConfigLoader:
         """Get ticket creation logic configuration"""
         return self.ai_config.get('ticket_logic', {})
     
-    def get_knowledge_base_path(self, kb_name: str = None) -> str:
-        """Get path to knowledge base file"""
+    def _get_knowledge_base_spec(self, kb_name: str = None):
+        """Get the configured KB entry - a file, directory, glob pattern or list of those"""
         kb_config = self.get_knowledge_base_config()
         
         if kb_name is None:
             # Use primary KB
-            kb_file = kb_config.get('primary_kb_file', 'knowledge_bases/automotive_en.txt')
-        else:
-            # Use specific KB
-            available_kbs = kb_config.get('available_kbs', {})
-            kb_file = available_kbs.get(kb_name, 'knowledge_bases/automotive_en.txt')
+            return kb_config.get('primary_kb_file', 'knowledge_bases/automotive_en.txt')
+        
+        # Use specific KB
+        available_kbs = kb_config.get('available_kbs', {})
+        return available_kbs.get(kb_name, 'knowledge_bases/automotive_en.txt')
+    
+    def get_knowledge_base_path(self, kb_name: str = None) -> str:
+        """Get path to knowledge base file (the first entry for multi-file KBs)"""
+        kb_file = self._get_knowledge_base_spec(kb_name)
+        if isinstance(kb_file, (list, tuple)):
+            kb_file = kb_file[0]
         
         return str(self.config_dir / kb_file)
     
+    def get_knowledge_base_sources(self, kb_name: str = None) -> List[str]:
+        """Get all knowledge base paths/patterns for a KB, relative entries resolved against the config dir"""
+        kb_files = self._get_knowledge_base_spec(kb_name)
+        if not isinstance(kb_files, (list, tuple)):
+            kb_files = [kb_files]
+        return [str(self.config_dir / kb_file) for kb_file in kb_files]
+    
     def get_urgent_keywords(self, topic: str = 'automotive') -> List[str]:
         """Get urgent keywords for a topic"""
         topic_config = self.get_topic_config(topic)
@@ -80,16 +267,14 @@ class ConfigLoader:
         kb_config = self.get_knowledge_base_config()
         return kb_config.get('similarity_threshold', 0.3)
     
-    def get_no_match_responses(self) -> List[str]:
-        """Get fallback responses when no match found"""
+    def get_retrieval_settings(self) -> Dict[str, Any]:
+        """Get retrieval mode and embedding settings"""
         kb_config = self.get_knowledge_base_config()
-        return kb_config.get('no_match_responses', [
-            "I couldn't find a relevant answer in the knowledge base. Please contact customer service."
-        ])
+        return kb_config.get('retrieval', {}) or {}
     
-    def reload_configs(self):
-        """Reload configuration files"""
-        self._load_configs()
+    def get_no_match_responses(self) -> List[str]:
+        """Get fallback responses when no match found"""
+        return self._snapshot.settings.kb.no_match_responses
 
 # Global config instance
 config = ConfigLoader()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import re
+import string
+from dataclasses import dataclass
+from typing import Optional, Pattern, Tuple
+
+DEFAULT_NO_MATCH_RESPONSE = "I couldn't find a relevant answer in the knowledge base. Please contact customer service."
+DEFAULT_TICKET_CREATED = 'I have created a support ticket #{ticket_id} for you. Our team will review your request and get back to you soon.'
+
+
+class MessageTemplate:
+    """A str.format-style template parsed once; render() only fills in the fields"""
+
+    __slots__ = ('source', '_parts')
+
+    def __init__(self, source: str):
+        self.source = source
+        self._parts = tuple(string.Formatter().parse(source))
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field, spec, conversion in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            out.append(format(value, spec or ''))
+        return ''.join(out)
+
+
+def compile_keywords(keywords, ignore_case: bool = False) -> Optional[Pattern]:
+    """One alternation regex for a keyword list - a single scan instead of one `in` per keyword"""
+    keywords = [keyword.lower() if ignore_case else keyword for keyword in keywords if keyword]
+    if not keywords:
+        return None
+    # Longest first so overlapping keywords match the same way plain substring checks do
+    keywords.sort(key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+
+@dataclass(frozen=True)
+class KnowledgeBaseSettings:
+    __slots__ = ('similarity_threshold', 'no_match_responses', 'max_results')
+
+    similarity_threshold: float
+    no_match_responses: Tuple[str, ...]
+    max_results: int
+
+    @classmethod
+    def from_config(cls, kb_section) -> 'KnowledgeBaseSettings':
+        return cls(
+            similarity_threshold=float(kb_section.get('similarity_threshold', 0.3)),
+            no_match_responses=tuple(kb_section.get('no_match_responses') or [DEFAULT_NO_MATCH_RESPONSE]),
+            max_results=int(kb_section.get('max_results', 5))
+        )
+
+
+@dataclass(frozen=True)
+class TicketSettings:
+    __slots__ = ('response_keywords', 'urgent_user_keywords', 'response_pattern', 'urgent_pattern',
+                 'confidence_threshold')
+
+    response_keywords: Tuple[str, ...]
+    urgent_user_keywords: Tuple[str, ...]  # Pre-lowered
+    response_pattern: Optional[Pattern]    # Case-sensitive, matched against the AI response
+    urgent_pattern: Optional[Pattern]      # Matched against the lower-cased user message
+    confidence_threshold: float
+
+    @classmethod
+    def from_config(cls, ticket_logic) -> 'TicketSettings':
+        response_keywords = tuple(ticket_logic.get('response_keywords') or ())
+        urgent_user_keywords = tuple(keyword.lower() for keyword in ticket_logic.get('urgent_user_keywords') or ())
+        return cls(
+            response_keywords=response_keywords,
+            urgent_user_keywords=urgent_user_keywords,
+            response_pattern=compile_keywords(response_keywords),
+            urgent_pattern=compile_keywords(urgent_user_keywords, ignore_case=True),
+            confidence_threshold=float(ticket_logic.get('confidence_threshold', 0.3))
+        )
+
+
+@dataclass(frozen=True)
+class TemplateSettings:
+    __slots__ = ('ticket_created', 'system_error', 'api_error')
+
+    ticket_created: MessageTemplate
+    system_error: str
+    api_error: str
+
+    @classmethod
+    def from_config(cls, response_templates) -> 'TemplateSettings':
+        return cls(
+            ticket_created=MessageTemplate(response_templates.get('ticket_created', DEFAULT_TICKET_CREATED)),
+            system_error=response_templates.get('system_error', ''),
+            api_error=response_templates.get('api_error', '')
+        )
+
+
+@dataclass(frozen=True)
+class RuntimeSettings:
+    """Typed, precompiled view of a config snapshot - per-request lookups are attribute accesses"""
+
+    __slots__ = ('kb', 'ticket', 'templates')
+
+    kb: KnowledgeBaseSettings
+    ticket: TicketSettings
+    templates: TemplateSettings
+
+    @classmethod
+    def from_config(cls, kb_config, ai_config) -> 'RuntimeSettings':
+        return cls(
+            kb=KnowledgeBaseSettings.from_config(kb_config.get('knowledge_base') or {}),
+            ticket=TicketSettings.from_config(ai_config.get('ticket_logic') or {}),
+            templates=TemplateSettings.from_config(ai_config.get('response_templates') or {})
+        )
@@ -0,0 +1,79 @@
+import re
+import json
+import zlib
+import urllib.request
+from typing import List, Dict, Any
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free embedder (feature hashing of words and word bigrams).
+    Used in tests and as an offline stand-in for a real embedding model.
+    """
+
+    is_remote = False
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _embed_one(self, text: str, out: np.ndarray):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            out[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._embed_one(text, vectors[i])
+        return vectors
+
+
+class OllamaEmbedder:
+    """Embeddings from a local Ollama server (/api/embed)"""
+
+    is_remote = True
+
+    def __init__(self, url: str = "http://localhost:11434", model: str = "nomic-embed-text",
+                 batch_size: int = 64, timeout: float = 60):
+        self.url = url.rstrip('/')
+        self.model = model
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        payload = json.dumps({"model": self.model, "input": texts}).encode('utf-8')
+        request = urllib.request.Request(
+            f"{self.url}/api/embed",
+            data=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            result = json.loads(response.read().decode('utf-8'))
+        return result["embeddings"]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            rows.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
+
+
+def create_embedder(embedding_settings: Dict[str, Any]):
+    """Create the embedder configured under retrieval.embeddings"""
+    provider = embedding_settings.get('provider', 'ollama')
+    if provider == 'hashing':
+        return HashingEmbedder(dim=embedding_settings.get('dim', 256))
+    if provider == 'ollama':
+        return OllamaEmbedder(
+            url=embedding_settings.get('url', "http://localhost:11434"),
+            model=embedding_settings.get('model', "nomic-embed-text"),
+            batch_size=embedding_settings.get('batch_size', 64),
+            timeout=embedding_settings.get('timeout', 60)
+        )
+    raise ValueError(f"Unknown embedding provider: {provider}")
@@ -0,0 +1,299 @@
+import os
+import json
+import uuid
+import queue
+import sqlite3
+import asyncio
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from shared_state import STATE_DIR, multi_worker_enabled
+
+
+class Event:
+    """One published change; id is monotonic per bus so clients can resume with Last-Event-ID"""
+
+    __slots__ = ('id', 'type', 'topic', 'data')
+
+    def __init__(self, id: int, type: str, topic: str, data: Dict[str, Any]):
+        self.id = id
+        self.type = type
+        self.topic = topic
+        self.data = data
+
+    def to_sse(self) -> str:
+        """Server-Sent Events wire format"""
+        payload = json.dumps({"topic": self.topic, **self.data}, default=_json_default)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def topic_matches(topic: str, patterns: Iterable[str]) -> bool:
+    """Exact topic names, or prefix patterns ending in '*' (e.g. 'session:*')"""
+    for pattern in patterns:
+        if pattern == topic or (pattern.endswith('*') and topic.startswith(pattern[:-1])):
+            return True
+    return False
+
+
+class Subscription:
+    """A subscriber's bounded queue. Use as an async iterator; events it can't keep up with are dropped"""
+
+    def __init__(self, backend: 'EventBackend', topics: List[str], max_queue: int):
+        self.backend = backend
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def deliver(self, event: Event):
+        if not topic_matches(event.topic, self.topics):
+            return
+        if self.queue.full():
+            # Slow client: drop the oldest event, it will reconcile with a full fetch
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float = None) -> Optional[Event]:
+        """Next event, or None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        return await self.queue.get()
+
+
+class EventBackend:
+    """Transport between publishers and subscribers. Subclass to fan out across processes"""
+
+    def publish(self, event: Event):
+        raise NotImplementedError
+
+    def subscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def replay(self, last_event_id: int) -> Optional[List[Event]]:
+        """Events after last_event_id, or None to replay from the bus's own history"""
+        return None
+
+
+class InProcessBackend(EventBackend):
+    """Delivers events to subscribers in this process only (one worker)"""
+
+    def __init__(self):
+        self.subscriptions = set()
+
+    def publish(self, event: Event):
+        for subscription in list(self.subscriptions):
+            subscription.deliver(event)
+
+    def subscribe(self, subscription: Subscription):
+        self.subscriptions.add(subscription)
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+
+class SharedLogBackend(InProcessBackend):
+    """
+    Events of all worker processes, through an append-only SQLite log next to the other shared state.
+    Local subscribers get this worker's events once they are written; events of the other workers
+    are picked up by polling the log every poll_interval seconds. Event ids are the log's row ids,
+    so Last-Event-ID works whichever worker a client reconnects to.
+    Inserts run on a writer thread with a connection of their own, so a busy log never blocks the
+    event loop; reads (polling, replay) use a separate connection.
+    """
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str = None, poll_interval: float = None, history: int = 10000):
+        super().__init__()
+        self.path = path or os.getenv("EVENT_BUS_PATH", os.path.join(STATE_DIR, "events.sqlite3"))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv("EVENT_BUS_POLL_INTERVAL", "0.5"))
+        self.history = history
+        self.origin = uuid.uuid4().hex
+        self._conn = None
+        self._lock = threading.Lock()
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._published = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._last_id = self._query("SELECT COALESCE(MAX(id), 0) FROM events")[0][0]
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "type TEXT NOT NULL, topic TEXT NOT NULL, data TEXT NOT NULL, origin TEXT NOT NULL)")
+        return conn
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            return self._conn.execute(sql, params).fetchall()
+
+    def publish(self, event: Event):
+        """Queue the event for the writer thread; outside an event loop it is written right away"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(event)
+            super().publish(event)
+            return
+        self._writes.put((event, loop))
+        with self._write_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+                self._writer.start()
+
+    def _write(self, event: Event):
+        data = json.dumps(event.data, default=_json_default)
+        with self._write_lock:
+            if self._write_conn is None:
+                self._write_conn = self._open()
+            try:
+                cursor = self._write_conn.execute("INSERT INTO events (type, topic, data, origin) VALUES (?, ?, ?, ?)",
+                                                  (event.type, event.topic, data, self.origin))
+                event.id = cursor.lastrowid
+                self._published += 1
+                if self._published % self.PRUNE_EVERY == 0:
+                    self._write_conn.execute("DELETE FROM events WHERE id <= ?", (event.id - self.history,))
+            except sqlite3.Error as e:
+                # Local subscribers still get the event, the other workers miss it
+                print(f"Error writing event to the shared log: {e}")
+
+    def _write_loop(self):
+        while True:
+            event, loop = self._writes.get()
+            try:
+                self._write(event)
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(InProcessBackend.publish, self, event)
+            except RuntimeError:
+                pass  # loop closed meanwhile
+            finally:
+                self._writes.task_done()
+
+    def flush(self):
+        """Wait until queued events are written"""
+        self._writes.join()
+
+    def _read_since(self, last_id: int, limit: int = 1000) -> List[tuple]:
+        return self._query("SELECT id, type, topic, data, origin FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                           (last_id, limit))
+
+    def replay(self, last_event_id: int) -> List[Event]:
+        rows = self._read_since(last_event_id, self.history)
+        return [Event(row_id, event_type, topic, json.loads(data)) for row_id, event_type, topic, data, _ in rows]
+
+    def subscribe(self, subscription: Subscription):
+        super().subscribe(subscription)
+        # The poller belongs to the running loop and stops once nobody is subscribed
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    def unsubscribe(self, subscription: Subscription):
+        super().unsubscribe(subscription)
+        if not self.subscriptions and self._poller is not None:
+            if not self._poller.get_loop().is_closed():
+                self._poller.cancel()
+            self._poller = None
+
+    async def _poll(self):
+        while self.subscriptions:
+            await asyncio.sleep(self.poll_interval)
+            self.poll_once(await asyncio.to_thread(self._read_since, self._last_id))
+
+    def poll_once(self, rows: List[tuple]):
+        """Deliver the other workers' events among rows read from the log"""
+        for row_id, event_type, topic, data, origin in rows:
+            self._last_id = max(self._last_id, row_id)
+            if origin != self.origin:
+                super().publish(Event(row_id, event_type, topic, json.loads(data)))
+
+
+# Backend name -> factory, selected with EVENT_BUS_BACKEND
+BACKENDS: Dict[str, Callable[[], EventBackend]] = {
+    "memory": InProcessBackend,
+    "sqlite": SharedLogBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], EventBackend]):
+    BACKENDS[name] = factory
+
+
+class EventBus:
+    """
+    Publish/subscribe for server-push updates (ticket changes, new chat messages).
+    Keeps the last `history` events so reconnecting clients can replay what they missed.
+    """
+
+    def __init__(self, backend: EventBackend = None, history: int = 1000, max_queue: int = 256):
+        self.backend = backend or InProcessBackend()
+        self.max_queue = max_queue
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history)
+
+    def publish(self, event_type: str, topic: str, data: Dict[str, Any]) -> Event:
+        event = Event(next(self._ids), event_type, topic, data)
+        # A shared backend replaces the id with one that is unique across workers
+        self.backend.publish(event)
+        self._history.append(event)
+        return event
+
+    def subscribe(self, topics: List[str], last_event_id: int = None) -> Subscription:
+        subscription = Subscription(self.backend, topics, self.max_queue)
+        if last_event_id is not None:
+            missed = self.backend.replay(last_event_id)
+            for event in (missed if missed is not None else self._history):
+                if event.id > last_event_id:
+                    subscription.deliver(event)
+        self.backend.subscribe(subscription)
+        return subscription
+
+    def get_stats(self) -> dict:
+        subscriptions = getattr(self.backend, 'subscriptions', ())
+        return {
+            "backend": type(self.backend).__name__,
+            "subscribers": len(subscriptions),
+            "buffered_events": len(self._history)
+        }
+
+
+def create_event_bus() -> EventBus:
+    """EVENT_BUS_BACKEND: memory (one worker) or sqlite (default with several workers)"""
+    name = os.getenv("EVENT_BUS_BACKEND", "sqlite" if multi_worker_enabled() else "memory")
+    if name not in BACKENDS:
+        print(f"Unknown event bus backend '{name}', using in-process delivery")
+        name = "memory"
+    return EventBus(BACKENDS[name]())
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+from typing import Any, Iterable, Optional
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Optional - gzip only
+    BrotliMiddleware = None
+
+# Revalidate on every use - clients keep the body and send If-None-Match
+CACHE_CONTROL = "no-cache"
+
+# Streamed line by line; compressing would hold rows back until the compressor's buffer fills
+STREAMING_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values that determine a response (versions, hashes, counts)"""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+    return f'"{digest.hexdigest()[:24]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"})
+
+
+def json_with_etag(content: Any, etag: str) -> Response:
+    return JSONResponse(jsonable_encoder(content), headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def conditional_response(request: Request, etag: str, build_content) -> Response:
+    """304 when the client's copy is current; otherwise build and serialize the body"""
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return json_with_etag(build_content(), etag)
+
+
+def hashed_response(request: Request, content: Any) -> Response:
+    """For bodies with no cheap version key: the ETag is a hash of the serialized body"""
+    body = JSONResponse(jsonable_encoder(content)).body
+    etag = f'"{hashlib.sha1(body).hexdigest()[:24]}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+class CompressionMiddleware:
+    """
+    gzip (or brotli, when brotli-asgi is installed) for responses over minimum_size bytes.
+    Streams that must flush every line (Server-Sent Events, NDJSON) are passed through uncompressed.
+    A compressed body is a different representation from the identity one, so clients that accept
+    compression get weak ETags - on small uncompressed bodies and 304s too, to keep them consistent.
+    """
+
+    def __init__(self, app, mode: str = "gzip", minimum_size: int = 1024, skip_paths: Iterable[str] = ()):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+        self.encoding = "br" if mode == "brotli" and BrotliMiddleware is not None else "gzip"
+        if self.encoding == "br":
+            self.compressed_app = BrotliMiddleware(self._mark_streams, minimum_size=minimum_size)
+        else:
+            if mode == "brotli":
+                print("brotli-asgi is not installed, using gzip compression")
+            self.compressed_app = GZipMiddleware(self._mark_streams, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        accepts_compression = self.encoding in Headers(scope=scope).get("accept-encoding", "")
+
+        async def send_with_weak_etag(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                encoding = headers.get("content-encoding")
+                if encoding == "identity":
+                    del headers["content-encoding"]
+                elif encoding or accepts_compression:
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["etag"] = f"W/{etag}"
+            await send(message)
+
+        await self.compressed_app(scope, receive, send_with_weak_etag)
+
+    async def _mark_streams(self, scope, receive, send):
+        """The compressors leave responses with a Content-Encoding alone; the marker is removed again above"""
+        async def send_marked(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if content_type in STREAMING_CONTENT_TYPES and "content-encoding" not in headers:
+                    headers["content-encoding"] = "identity"
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
+
+
+def compression_mode() -> Optional[str]:
+    """HTTP_COMPRESSION: gzip (default), brotli, or off"""
+    mode = os.getenv("HTTP_COMPRESSION", "gzip").lower()
+    return None if mode in ("off", "none", "0", "") else mode
@@ -0,0 +1,145 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Set, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from kb_ingest import render_entry
+
+# Universal hashing modulo the Mersenne prime 2^31 - 1 keeps a * x + b inside uint64
+MERSENNE_PRIME = (1 << 31) - 1
+TOKEN = re.compile(r'\w+')
+
+
+def shingles(text: str) -> Set[str]:
+    """Word unigrams and bigrams - questions are too short for character shingles to be selective"""
+    tokens = TOKEN.findall(text.lower())
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+class MinHasher:
+    """MinHash signatures: the fraction of equal rows estimates the Jaccard similarity of two shingle sets"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) % MERSENNE_PRIME for s in shingles(text)), dtype=np.uint64)
+        if not hashes.size:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self.signature(text) for text in texts]) if texts else np.empty((0, self.num_perm), np.uint64)
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int) -> Set[Tuple[int, int]]:
+    """Pairs that agree on at least one band of the signature - only those get an exact comparison"""
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band_values = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for index, key in enumerate(band_values):
+            buckets[key.tobytes()].append(index)
+        for members in buckets.values():
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+@dataclass
+class DuplicateGroup:
+    keep_index: int                # Position of the first occurrence in the KB
+    keep: dict                     # First occurrence, stays in the KB
+    merge: List[dict] = field(default_factory=list)  # Paraphrases folded into `keep` (with index and similarity)
+    answers_differ: bool = False   # Needs a human look before compacting
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class NearDuplicateFinder:
+    """
+    Near-duplicate questions via MinHash/LSH blocking, verified with TF-IDF cosine.
+    Only pairs sharing an LSH bucket are compared, so the cost grows roughly linearly with the KB size.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+
+    def find(self, qa_pairs: List[dict]) -> List[DuplicateGroup]:
+        questions = [qa['question'] for qa in qa_pairs]
+        candidates = sorted(lsh_candidates(self.hasher.signatures(questions), self.bands))
+        if not candidates:
+            return []
+
+        matrix = TfidfVectorizer(lowercase=True).fit_transform(questions)
+        first, second = (np.array(side) for side in zip(*candidates))
+        similarities = np.asarray(matrix[first].multiply(matrix[second]).sum(axis=1)).ravel()
+
+        # Union-find over verified pairs; the lowest index (first occurrence) is each group's root
+        parent = list(range(len(questions)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        best_similarity: Dict[int, float] = {}
+        for i, j, similarity in zip(first, second, similarities):
+            if similarity < self.threshold:
+                continue
+            ri, rj = root(int(i)), root(int(j))
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+            for index in (int(i), int(j)):
+                best_similarity[index] = max(best_similarity.get(index, 0.0), float(similarity))
+
+        members: Dict[int, List[int]] = defaultdict(list)
+        for index in range(len(questions)):
+            members[root(index)].append(index)
+
+        groups = []
+        for keep, group in sorted(members.items()):
+            if len(group) < 2:
+                continue
+            merged = [i for i in group if i != keep]
+            groups.append(DuplicateGroup(
+                keep_index=keep,
+                keep=dict(qa_pairs[keep]),
+                merge=[{**qa_pairs[i], 'index': i, 'similarity': round(best_similarity[i], 4)} for i in merged],
+                answers_differ=any(qa_pairs[i]['answer'].strip() != qa_pairs[keep]['answer'].strip() for i in merged)
+            ))
+        return groups
+
+
+def compact(qa_pairs: List[dict], groups: List[DuplicateGroup], merge_differing: bool = False) -> List[dict]:
+    """KB without the merged duplicates; groups whose answers differ are left alone unless merge_differing"""
+    drop = set()
+    for group in groups:
+        if group.answers_differ and not merge_differing:
+            continue
+        drop.update(qa['index'] for qa in group.merge)
+    return [qa for index, qa in enumerate(qa_pairs) if index not in drop]
+
+
+def write_kb(path: str, qa_pairs: List[dict]):
+    """Write Q&A pairs in the format given by the file extension (.txt / .md / .jsonl), atomically"""
+    separator = '\n' if path.endswith('.jsonl') else '\n\n'
+    entries = ['\n'.join(render_entry(qa['question'], qa['answer'], path)) for qa in qa_pairs]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(separator.join(entries) + '\n')
+    os.replace(tmp_path, path)
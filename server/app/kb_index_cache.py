@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+from typing import List, Optional, Dict, Any
+import numpy as np
+from scipy import sparse
+from shared_state import FileLock
+
+# Cache entries kept per directory; older ones are pruned after a save
+MAX_ENTRIES = 4
+
+
+class KBIndexCache:
+    """
+    On-disk cache of built KB indexes, shared between worker processes.
+    The TF-IDF CSR arrays and the dense embedding matrix are stored as .npy files and
+    memory-mapped on load, so all workers share one copy through the OS page cache.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(kb_sources: List[str], settings: Dict[str, Any]) -> str:
+        """Cache key from KB file identities (path, mtime, size) and the index-related settings"""
+        digest = hashlib.sha1()
+        for path in kb_sources:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}\n".encode('utf-8'))
+        digest.update(json.dumps(settings, sort_keys=True, default=dict).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def build_lock(self, key: str) -> FileLock:
+        """Held while building, so only one worker builds and the others load its result"""
+        return FileLock(os.path.join(self.cache_dir, f"{key}.lock"))
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entry_dir(key)
+        if not os.path.exists(os.path.join(entry, "meta.json")):
+            return None
+
+        with open(os.path.join(entry, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(entry, "qa_pairs.json"), 'r', encoding='utf-8') as f:
+            qa_pairs = json.load(f)
+        with open(os.path.join(entry, "vectorizer.pkl"), 'rb') as f:
+            vectorizer = pickle.load(f)
+
+        tfidf_matrix = None
+        if meta.get("tfidf_shape"):
+            arrays = [np.load(os.path.join(entry, f"tfidf_{name}.npy"), mmap_mode='r')
+                      for name in ("data", "indices", "indptr")]
+            tfidf_matrix = sparse.csr_matrix(tuple(arrays), shape=tuple(meta["tfidf_shape"]), copy=False)
+
+        dense_matrix = dense_scales = None
+        if os.path.exists(os.path.join(entry, "dense.npy")):
+            dense_matrix = np.load(os.path.join(entry, "dense.npy"), mmap_mode='r')
+            if os.path.exists(os.path.join(entry, "dense_scales.npy")):
+                dense_scales = np.load(os.path.join(entry, "dense_scales.npy"), mmap_mode='r')
+
+        return {
+            "qa_pairs": qa_pairs,
+            "vectorizer": vectorizer,
+            "tfidf_matrix": tfidf_matrix,
+            "dense_matrix": dense_matrix,
+            "dense_scales": dense_scales,
+            "embedding_model": meta.get("embedding_model"),
+            "parse_issues": meta.get("parse_issues", []),
+            "stats": meta.get("stats"),
+        }
+
+    def save(self, key: str, qa_pairs: List[dict], vectorizer, tfidf_matrix, dense_index=None,
+             embedding_model: str = None, parse_issues: List[str] = None, stats: dict = None):
+        """Write an entry into a temp directory and rename it into place"""
+        entry = self._entry_dir(key)
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+
+        with open(os.path.join(tmp_entry, "qa_pairs.json"), 'w', encoding='utf-8') as f:
+            json.dump(qa_pairs, f)
+        with open(os.path.join(tmp_entry, "vectorizer.pkl"), 'wb') as f:
+            pickle.dump(vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        meta = {"tfidf_shape": None, "embedding_model": embedding_model, "parse_issues": parse_issues or [],
+                "stats": stats}
+        if tfidf_matrix is not None:
+            tfidf_matrix = sparse.csr_matrix(tfidf_matrix)
+            for name in ("data", "indices", "indptr"):
+                np.save(os.path.join(tmp_entry, f"tfidf_{name}.npy"), getattr(tfidf_matrix, name))
+            meta["tfidf_shape"] = list(tfidf_matrix.shape)
+
+        # Exact dense indexes only - IVF indexes are persisted next to the KB file
+        if dense_index is not None and hasattr(dense_index, 'scores'):
+            np.save(os.path.join(tmp_entry, "dense.npy"), dense_index.matrix)
+            if dense_index.scales is not None:
+                np.save(os.path.join(tmp_entry, "dense_scales.npy"), dense_index.scales)
+
+        # meta.json marks the entry complete
+        with open(os.path.join(tmp_entry, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+        self._prune(keep=key)
+
+    def _prune(self, keep: str):
+        """Drop old entries (workers still mapping them keep their open files)"""
+        entries = [
+            name for name in os.listdir(self.cache_dir)
+            if os.path.isdir(os.path.join(self.cache_dir, name)) and not name.endswith('.tmp')
+        ]
+        entries.sort(key=lambda name: os.path.getmtime(os.path.join(self.cache_dir, name)), reverse=True)
+        for name in entries[MAX_ENTRIES:]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                lock_path = os.path.join(self.cache_dir, f"{name}.lock")
+                if os.path.exists(lock_path):
+                    os.remove(lock_path)
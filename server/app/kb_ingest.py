@@ -0,0 +1,237 @@
+import os
+import json
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, List, Optional
+from sklearn.feature_extraction.text import TfidfVectorizer
+from config_loader import config
+from kb_parser import KBParser, QARecord, QUESTION_LINE, ANSWER_LINE, resolve_kb_sources
+from shared_state import FileLock
+
+DUPLICATE_POLICIES = ('skip', 'replace')
+
+# One publish at a time - each batch reads, rewrites and re-indexes the KB files.
+# The thread lock covers this process, a lock file next to the KB covers the other workers.
+_publish_lock = threading.Lock()
+
+
+def normalize_question(question: str) -> str:
+    return ' '.join(question.lower().split())
+
+
+@dataclass
+class Collision:
+    question: str
+    existing_question: str
+    similarity: float
+    against: str  # "kb" (already in the knowledge base) or "batch" (earlier in the same upload)
+
+
+@dataclass
+class IngestReport:
+    received: int = 0
+    added: List[str] = field(default_factory=list)
+    replaced: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    collisions: List[Collision] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+    dry_run: bool = False
+    published: bool = False
+    target: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        report = asdict(self)
+        report['summary'] = {
+            'received': self.received,
+            'added': len(self.added),
+            'replaced': len(self.replaced),
+            'unchanged': len(self.unchanged),
+            'collisions': len(self.collisions),
+            'issues': len(self.issues)
+        }
+        return report
+
+
+def render_entry(question: str, answer: str, path: str) -> List[str]:
+    """Lines for one entry in the target file's own format"""
+    if path.endswith('.jsonl'):
+        return [json.dumps({'question': question, 'answer': answer}, ensure_ascii=False)]
+    # Text entries end at a blank line, so blank lines inside the answer are dropped
+    question = ' '.join(question.split())
+    answer_lines = [line for line in answer.splitlines() if line.strip()]
+    if path.endswith('.md'):
+        return [f"**Q: {question}**", f"A: {answer_lines[0]}"] + answer_lines[1:]
+    return [f"Q: {question}", f"A: {answer_lines[0]}"] + answer_lines[1:]
+
+
+def entry_end(lines: List[str], start: int) -> int:
+    """Index just past the text entry whose question is lines[start]"""
+    seen_answer = False
+    for index in range(start + 1, len(lines)):
+        line = lines[index]
+        if QUESTION_LINE.match(line):
+            return index
+        if not seen_answer and ANSWER_LINE.match(line):
+            seen_answer = True
+        elif seen_answer and not line.strip():
+            return index
+    return len(lines)
+
+
+class KBIngestor:
+    """
+    Bulk ingestion of Q&A pairs into the active knowledge base.
+    Near-duplicate questions (normalized exact match or TF-IDF cosine >= threshold) are reported
+    as collisions and skipped or, with on_duplicate="replace", update the existing answer.
+    All changes are written to the KB files atomically and the index is rebuilt once per batch.
+    """
+
+    def __init__(self, kb_service, threshold: float = None, on_duplicate: str = None):
+        settings = config.get_knowledge_base_config().get('ingestion', {})
+        self.kb_service = kb_service
+        self.threshold = float(threshold if threshold is not None else settings.get('duplicate_threshold', 0.9))
+        self.on_duplicate = on_duplicate or settings.get('on_duplicate', 'skip')
+        if self.on_duplicate not in DUPLICATE_POLICIES:
+            raise ValueError(f"on_duplicate must be one of {', '.join(DUPLICATE_POLICIES)}")
+
+    def ingest_stream(self, lines: Iterable[str], fmt: str, dry_run: bool = False, source: str = '<upload>') -> IngestReport:
+        parser = KBParser()
+        records = list(parser.iter_stream(lines, fmt, source))
+        report = self.ingest(records, dry_run=dry_run)
+        report.issues = [str(issue) for issue in parser.issues]
+        return report
+
+    def ingest(self, records: List[QARecord], dry_run: bool = False) -> IngestReport:
+        sources = self._sources()
+        with _publish_lock, FileLock(self._lock_path(sources[-1])):
+            existing = self._current_qa_pairs(sources)
+            report, additions, replacements = self.plan(records, existing)
+            report.dry_run = dry_run
+            if dry_run or not (additions or replacements):
+                return report
+            report.target = self._publish(sources, existing, additions, replacements)
+            report.published = True
+            return report
+
+    def _sources(self) -> List[str]:
+        sources = resolve_kb_sources(config.get_knowledge_base_sources(self.kb_service.kb_name))
+        if not sources:
+            raise FileNotFoundError(f"Knowledge base file not found: {config.get_knowledge_base_path(self.kb_service.kb_name)}")
+        return sources
+
+    @staticmethod
+    def _lock_path(path: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(path)), f".{os.path.basename(path)}.lock")
+
+    def _current_qa_pairs(self, sources: List[str]) -> List[dict]:
+        """The KB as it is on disk now - another worker may have published a batch since it was loaded"""
+        on_disk = [record.to_dict() for record in KBParser().iter_sources(sources)]
+        loaded = self.kb_service.qa_pairs
+        if [(qa['question'], qa['answer']) for qa in on_disk] != [(qa['question'], qa['answer']) for qa in loaded]:
+            self.kb_service.load_knowledge_base()
+        return self.kb_service.qa_pairs
+
+    def plan(self, records: List[QARecord], existing: List[dict]):
+        """Classify each record as added, replaced, unchanged or a collision; nothing is written"""
+        report = IngestReport(received=len(records))
+        additions: List[QARecord] = []
+        replacements: Dict[int, QARecord] = {}
+        if not records:
+            return report, additions, replacements
+
+        kb_sims, batch_sims = self._similarities([qa['question'] for qa in existing], [r.question for r in records])
+        exact_kb = {normalize_question(qa['question']): i for i, qa in enumerate(existing)}
+        accepted = {}  # normalized question -> batch position, for records kept so far
+        accepted_positions = set()
+
+        for i, record in enumerate(records):
+            key = normalize_question(record.question)
+
+            # Earlier record in the same batch - the first one wins
+            batch_match, batch_score = accepted.get(key), 1.0
+            if batch_match is None and batch_sims is not None:
+                row = batch_sims.getrow(i)
+                for j, score in zip(row.indices, row.data):
+                    if j < i and j in accepted_positions and score >= self.threshold:
+                        batch_match, batch_score = j, float(score)
+                        break
+            if batch_match is not None:
+                report.collisions.append(Collision(record.question, records[batch_match].question, round(batch_score, 4), "batch"))
+                continue
+            accepted[key] = i
+            accepted_positions.add(i)
+
+            # Question already in the knowledge base
+            kb_match, kb_score = exact_kb.get(key), 1.0
+            if kb_match is None and kb_sims is not None:
+                row = kb_sims.getrow(i)
+                if row.nnz:
+                    best = row.data.argmax()
+                    if row.data[best] >= self.threshold:
+                        kb_match, kb_score = int(row.indices[best]), float(row.data[best])
+            if kb_match is None:
+                additions.append(record)
+                report.added.append(record.question)
+                continue
+
+            report.collisions.append(Collision(record.question, existing[kb_match]['question'], round(kb_score, 4), "kb"))
+            if self.on_duplicate == 'replace':
+                if existing[kb_match]['answer'] == record.answer:
+                    report.unchanged.append(record.question)
+                else:
+                    # Keep the existing question wording, only the answer changes
+                    replacements[kb_match] = QARecord(existing[kb_match]['question'], record.answer, record.source, record.line)
+                    report.replaced.append(existing[kb_match]['question'])
+
+        return report, additions, replacements
+
+    def _similarities(self, existing_questions: List[str], batch_questions: List[str]):
+        """Sparse cosine similarities batch x KB and batch x batch, on one vocabulary"""
+        vectorizer = TfidfVectorizer(lowercase=True)
+        try:
+            matrix = vectorizer.fit_transform(existing_questions + batch_questions)
+        except ValueError:  # Empty vocabulary (e.g. only stop words / punctuation)
+            return None, None
+        batch = matrix[len(existing_questions):]
+        kb_sims = (batch @ matrix[:len(existing_questions)].T).tocsr() if existing_questions else None
+        return kb_sims, (batch @ batch.T).tocsr()
+
+    def _publish(self, sources: List[str], existing: List[dict], additions: List[QARecord],
+                 replacements: Dict[int, QARecord]) -> str:
+        """Apply the batch to the KB files (temp file + rename each) and rebuild the index once"""
+        # Locate replaced entries in their files; the parse order matches the loaded qa_pairs
+        edits: Dict[str, Dict[int, QARecord]] = {}
+        if replacements:
+            on_disk = list(KBParser().iter_sources(sources))
+            if [r.question for r in on_disk] != [qa['question'] for qa in existing]:
+                raise RuntimeError("Knowledge base changed on disk since it was loaded - reload and retry")
+            for index, record in replacements.items():
+                edits.setdefault(on_disk[index].source, {})[on_disk[index].line] = record
+
+        # New entries go to the last KB file
+        target = sources[-1]
+        for path in set(edits) | {target}:
+            self._rewrite(path, edits.get(path, {}), additions if path == target else [])
+
+        self.kb_service.load_knowledge_base()
+        return target
+
+    def _rewrite(self, path: str, edits: Dict[int, QARecord], additions: List[QARecord]):
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+        # Bottom-up so earlier line numbers stay valid
+        for line_no in sorted(edits, reverse=True):
+            start = line_no - 1
+            end = start + 1 if path.endswith('.jsonl') else entry_end(lines, start)
+            lines[start:end] = render_entry(edits[line_no].question, edits[line_no].answer, path)
+
+        for record in additions:
+            if lines and lines[-1].strip() and not path.endswith('.jsonl'):
+                lines.append('')
+            lines.extend(render_entry(record.question, record.answer, path))
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
@@ -0,0 +1,188 @@
+import os
+import re
+import csv
+import json
+import glob
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Union
+
+KB_FILE_EXTENSIONS = ('.txt', '.md', '.jsonl')
+
+# "Q: ..." or markdown "**Q: ...**"; "A: ..." or "**A:** ..."
+QUESTION_LINE = re.compile(r'^\s*(?:\*\*)?Q:\s*(.*?)\s*(?:\*\*)?\s*$')
+ANSWER_LINE = re.compile(r'^\s*(?:\*\*)?A:(?:\*\*)?\s*(.*)$')
+
+
+@dataclass
+class QARecord:
+    question: str
+    answer: str
+    source: str
+    line: int  # Line number of the question
+
+    def to_dict(self) -> dict:
+        return {'question': self.question, 'answer': self.answer}
+
+
+@dataclass
+class ParseIssue:
+    source: str
+    line: int
+    message: str
+
+    def __str__(self):
+        return f"{self.source}:{self.line}: {self.message}"
+
+
+def resolve_kb_sources(spec: Union[str, List[str]]) -> List[str]:
+    """Expand a KB spec (file, directory, glob pattern, or a list of those) into sorted file paths"""
+    specs = spec if isinstance(spec, (list, tuple)) else [spec]
+    paths = []
+    for entry in specs:
+        if os.path.isdir(entry):
+            paths.extend(sorted(
+                os.path.join(entry, name) for name in os.listdir(entry)
+                if name.endswith(KB_FILE_EXTENSIONS)
+            ))
+        elif glob.has_magic(entry):
+            paths.extend(sorted(path for path in glob.glob(entry, recursive=True) if os.path.isfile(path)))
+        elif os.path.isfile(entry):
+            paths.append(entry)
+
+    # De-duplicate while keeping order
+    return list(dict.fromkeys(paths))
+
+
+class KBParser:
+    """
+    Line-oriented streaming parser for knowledge base files.
+    Yields QARecords one at a time; malformed entries are recorded in `issues` instead of being silently dropped.
+    """
+
+    def __init__(self):
+        self.issues: List[ParseIssue] = []
+
+    def _issue(self, source: str, line: int, message: str):
+        self.issues.append(ParseIssue(source, line, message))
+
+    def iter_sources(self, spec: Union[str, List[str]]) -> Iterator[QARecord]:
+        for path in resolve_kb_sources(spec):
+            yield from self.iter_file(path)
+
+    def iter_file(self, path: str) -> Iterator[QARecord]:
+        if path.endswith('.jsonl'):
+            yield from self._iter_jsonl(path)
+        else:
+            yield from self._iter_text(path)
+
+    def _make_record(self, source: str, line: int, question_lines: List[str], answer_lines: List[str]):
+        question = "\n".join(question_lines).strip()
+        answer = "\n".join(answer_lines).strip()
+        if not question:
+            self._issue(source, line, "empty question")
+            return None
+        if not answer:
+            self._issue(source, line, f"empty answer for question: {question[:60]}")
+            return None
+        return QARecord(question, answer, source, line)
+
+    def _iter_text(self, path: str) -> Iterator[QARecord]:
+        """Plain text (Q: / A:) and markdown (**Q: ...** / A:) entries separated by blank lines"""
+        state = 'idle'  # idle | question | answer | skip
+        question_lines, answer_lines, question_line_no = [], [], 0
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, raw_line in enumerate(f, start=1):
+                line = raw_line.rstrip('\r\n')
+                question_match = QUESTION_LINE.match(line)
+
+                if question_match:
+                    if state == 'answer':
+                        record = self._make_record(path, question_line_no, question_lines, answer_lines)
+                        if record:
+                            yield record
+                    elif state == 'question':
+                        self._issue(path, question_line_no, "question without answer")
+                    state = 'question'
+                    question_lines, answer_lines, question_line_no = [question_match.group(1)], [], line_no
+                    continue
+
+                answer_match = ANSWER_LINE.match(line) if state != 'answer' else None
+                if answer_match:
+                    if state == 'question':
+                        state = 'answer'
+                        answer_lines = [answer_match.group(1)]
+                    else:
+                        self._issue(path, line_no, "answer without question")
+                        state = 'skip'
+                    continue
+
+                if not line.strip():
+                    if state == 'answer':
+                        record = self._make_record(path, question_line_no, question_lines, answer_lines)
+                        if record:
+                            yield record
+                        state = 'idle'
+                    elif state == 'skip':
+                        state = 'idle'
+                    # Blank lines between a question and its answer are allowed
+                    continue
+
+                if state == 'question':
+                    question_lines.append(line)
+                elif state == 'answer':
+                    answer_lines.append(line)
+                # Text outside entries (titles, section headings) is ignored
+
+        if state == 'answer':
+            record = self._make_record(path, question_line_no, question_lines, answer_lines)
+            if record:
+                yield record
+        elif state == 'question':
+            self._issue(path, question_line_no, "question without answer")
+
+    def _iter_jsonl(self, path: str) -> Iterator[QARecord]:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from self.iter_jsonl_lines(f, path)
+
+    def iter_jsonl_lines(self, lines: Iterable[str], source: str) -> Iterator[QARecord]:
+        """One JSON object per line with "question"/"answer" (or "q"/"a") keys"""
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                self._issue(source, line_no, f"invalid JSON: {e.msg}")
+                continue
+            if not isinstance(item, dict):
+                self._issue(source, line_no, "expected a JSON object")
+                continue
+            question = item.get('question', item.get('q'))
+            answer = item.get('answer', item.get('a'))
+            record = self._make_record(source, line_no, [str(question or '')], [str(answer or '')])
+            if record:
+                yield record
+
+    def iter_csv_lines(self, lines: Iterable[str], source: str) -> Iterator[QARecord]:
+        """CSV with a header row containing question/answer (or q/a) columns"""
+        reader = csv.DictReader(lines)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        question_field = fields.get('question', fields.get('q'))
+        answer_field = fields.get('answer', fields.get('a'))
+        if question_field is None or answer_field is None:
+            self._issue(source, 1, "CSV header needs question and answer columns")
+            return
+        for row in reader:
+            record = self._make_record(source, reader.line_num, [row.get(question_field) or ''], [row.get(answer_field) or ''])
+            if record:
+                yield record
+
+    def iter_stream(self, lines: Iterable[str], fmt: str, source: str = '<upload>') -> Iterator[QARecord]:
+        """Parse an uploaded stream of Q&A pairs, fmt is 'jsonl' or 'csv'"""
+        if fmt == 'csv':
+            yield from self.iter_csv_lines(lines, source)
+        elif fmt == 'jsonl':
+            yield from self.iter_jsonl_lines(lines, source)
+        else:
+            raise ValueError(f"Unsupported ingestion format: {fmt}")
@@ -0,0 +1,79 @@
+from typing import Dict, List
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+
+# Keywords per topic; a word counts for a keyword when it starts with it ("vehicles" for "vehicle")
+TOPIC_KEYWORDS = {
+    'automotive': ['car', 'vehicle', 'auto', 'insurance', 'buy', 'sell', 'drive', 'engine', 'repair'],
+    'technology': ['software', 'computer', 'app', 'system', 'code', 'programming', 'tech', 'device'],
+    'finance': ['money', 'bank', 'loan', 'credit', 'payment', 'investment', 'financial', 'account'],
+    'health': ['health', 'medical', 'doctor', 'medicine', 'symptom', 'treatment', 'patient', 'hospital'],
+    'education': ['school', 'student', 'learn', 'course', 'study', 'education', 'teacher', 'class'],
+    'ecommerce': ['product', 'order', 'shipping', 'return', 'purchase', 'customer', 'delivery', 'store']
+}
+
+TOP_TERMS = 20
+
+# Part of the shared index cache key, so cached entries with stats computed differently are rebuilt
+STATS_VERSION = 2
+
+
+def _length_summary(lengths: np.ndarray) -> Dict[str, float]:
+    if not len(lengths):
+        return {"mean": 0.0, "median": 0.0, "p95": 0.0, "max": 0}
+    return {
+        "mean": round(float(lengths.mean()), 1),
+        "median": float(np.median(lengths)),
+        "p95": float(np.percentile(lengths, 95)),
+        "max": int(lengths.max())
+    }
+
+
+def compute_kb_stats(qa_pairs: List[dict], top_terms: int = TOP_TERMS) -> dict:
+    """
+    Topic scores, term frequencies, answer lengths and vocabulary size of a KB, from one
+    term-count pass over all questions and answers (computed once per index build).
+    """
+    stats = {
+        "qa_pairs": len(qa_pairs),
+        "topic": "general",
+        "topic_scores": {},
+        "vocabulary_size": 0,
+        "top_terms": [],
+        "answer_chars": _length_summary(np.zeros(0)),
+        "answer_words": _length_summary(np.zeros(0))
+    }
+    if not qa_pairs:
+        return stats
+
+    n = len(qa_pairs)
+    stats["answer_chars"] = _length_summary(np.fromiter((len(qa['answer']) for qa in qa_pairs), dtype=np.int64, count=n))
+    stats["answer_words"] = _length_summary(np.fromiter((len(qa['answer'].split()) for qa in qa_pairs), dtype=np.int64, count=n))
+
+    try:
+        # No stop word list here: sklearn's would drop topic keywords such as "system"
+        counter = CountVectorizer(lowercase=True)
+        counts = counter.fit_transform(qa['question'] + ' ' + qa['answer'] for qa in qa_pairs)
+    except ValueError:
+        # Nothing but punctuation / one-letter words
+        return stats
+    vocabulary = counter.get_feature_names_out().astype(str)
+    term_totals = np.asarray(counts.sum(axis=0)).ravel()
+    stats["vocabulary_size"] = len(vocabulary)
+
+    # Stop words are only left out of the top terms list
+    content = np.flatnonzero([term not in ENGLISH_STOP_WORDS for term in vocabulary])
+    top = content[np.argsort(-term_totals[content], kind='stable')[:top_terms]]
+    stats["top_terms"] = [[vocabulary[i], int(term_totals[i])] for i in top]
+
+    # topic x vocabulary indicator, then one product with the term totals
+    topics = list(TOPIC_KEYWORDS)
+    indicator = np.zeros((len(topics), len(vocabulary)), dtype=bool)
+    for row, topic in enumerate(topics):
+        for keyword in TOPIC_KEYWORDS[topic]:
+            indicator[row] |= np.char.startswith(vocabulary, keyword)
+    scores = indicator.astype(np.int64) @ term_totals
+    stats["topic_scores"] = {topic: int(score) for topic, score in zip(topics, scores) if score > 0}
+    if scores.max() > 0:
+        stats["topic"] = topics[int(scores.argmax())]
+    return stats
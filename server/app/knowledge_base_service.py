@@ -1,119 +1,540 @@
 import os
 import re
+import json
 import random
+import hashlib
 from typing import List, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from config_loader import config
+from embedding_service import create_embedder
+from vector_index import DenseIndex
+from ann_index import IVFIndex, chain_fingerprint
+from kb_parser import KBParser, resolve_kb_sources
+from sharded_vectorizer import ShardedTfidfVectorizer
+from kb_index_cache import KBIndexCache
+from kb_stats import STATS_VERSION, compute_kb_stats
+from threshold_calibration import calibration_key, load_thresholds
+from shared_state import STATE_DIR, multi_worker_enabled
+
+# Queries scored per sparse product in search_many
+QUERY_CHUNK = 1024
+# Cap on query x question cells per chunk for dense scores (float32: 64 MB)
+DENSE_CHUNK_CELLS = 2 ** 24
+
+class KBIndex:
+    """
+    Everything a search reads - Q&A pairs, vectorizer, TF-IDF matrix and dense index.
+    Built off to the side and swapped in with one assignment, so searches never see a half-built index.
+    """
+    
+    __slots__ = ('qa_pairs', 'vectorizer', 'tfidf_matrix', 'dense_index', 'embedder',
+                 'retrieval_mode', 'hybrid_weight', 'ann_candidates', 'parse_issues', '_content_hash', '_stats')
+    
+    def __init__(self, qa_pairs=None, vectorizer=None, tfidf_matrix=None, dense_index=None, embedder=None,
+                 retrieval_mode='tfidf', hybrid_weight=0.5, ann_candidates=50, parse_issues=None, stats=None):
+        self.qa_pairs = qa_pairs if qa_pairs is not None else []
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.dense_index = dense_index
+        self.embedder = embedder
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_weight = hybrid_weight
+        self.ann_candidates = ann_candidates
+        self.parse_issues = parse_issues if parse_issues is not None else []
+        self._content_hash = None
+        self._stats = stats
+    
+    @property
+    def content_hash(self) -> str:
+        """Hash of the Q&A pairs, computed on first use (the index is never modified in place)"""
+        if self._content_hash is None:
+            payload = json.dumps(self.qa_pairs, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            self._content_hash = hashlib.sha1(payload).hexdigest()
+        return self._content_hash
+    
+    @property
+    def stats(self) -> dict:
+        """Topic, term and answer length statistics (kb_stats), computed once per index"""
+        if self._stats is None:
+            self._stats = compute_kb_stats(self.qa_pairs)
+        return self._stats
+
 
 class KnowledgeBaseService:
-    def __init__(self, kb_name: str = None):
+    # knowledge_base settings that require re-parsing / re-indexing when they change
+    INDEX_CONFIG_KEYS = ('primary_kb_file', 'available_kbs', 'tfidf_settings', 'retrieval')
+    
+    def __init__(self, kb_name: str = None, index_cache: KBIndexCache = None):
         self.kb_name = kb_name
-        self.qa_pairs = []
+        self.index = KBIndex(vectorizer=self._create_vectorizer(0))
+        
+        # Worker processes share built indexes through a memory-mapped on-disk cache
+        if index_cache is None and multi_worker_enabled():
+            index_cache = KBIndexCache(os.path.join(STATE_DIR, "index_cache"))
+        self.index_cache = index_cache
+        self._configure_retrieval()
+        self.load_knowledge_base()
         
-        # Load configuration
+        # Hot reload: only re-index when index-related settings change
+        config.subscribe(self._on_config_changed, ['knowledge_base'])
+
+    # Read-only views of the active index
+    @property
+    def qa_pairs(self) -> List[dict]:
+        return self.index.qa_pairs
+
+    @property
+    def parse_issues(self):
+        return self.index.parse_issues
+
+    @property
+    def vectorizer(self):
+        return self.index.vectorizer
+
+    @property
+    def tfidf_matrix(self):
+        return self.index.tfidf_matrix
+
+    @property
+    def dense_index(self):
+        return self.index.dense_index
+
+    def _create_vectorizer(self, n_docs: int):
+        """TfidfVectorizer, or a process-parallel hashing TF-IDF build for large KBs"""
         kb_config = config.get_knowledge_base_config()
         tfidf_settings = kb_config.get('tfidf_settings', {})
         
-        self.vectorizer = TfidfVectorizer(
+        workers = tfidf_settings.get('build_workers', 1)
+        if workers != 1 and n_docs >= tfidf_settings.get('parallel_min_docs', 20000):
+            return ShardedTfidfVectorizer(
+                lowercase=tfidf_settings.get('lowercase', True),
+                stop_words=tfidf_settings.get('stop_words'),
+                n_features=tfidf_settings.get('hash_features', 2 ** 20),
+                workers=workers
+            )
+        
+        return TfidfVectorizer(
             stop_words=tfidf_settings.get('stop_words'),
             lowercase=tfidf_settings.get('lowercase', True), 
             max_features=tfidf_settings.get('max_features', 1000)
         )
-        self.tfidf_matrix = None
-        self.similarity_threshold = config.get_similarity_threshold()
-        self.load_knowledge_base()
+
+    def _configure_retrieval(self):
+        """Read retrieval mode (tfidf | dense | hybrid) and embedding settings"""
+        retrieval = config.get_retrieval_settings()
+        self.retrieval_mode = retrieval.get('mode', 'tfidf')
+        self.hybrid_weight = retrieval.get('hybrid_weight', 0.5)
+        self.embedding_settings = retrieval.get('embeddings', {})
+        self.ann_settings = retrieval.get('ann', {}) or {}
+        
+        # Dense cosine scores live on a different scale, so they may use their own threshold
+        similarity_threshold = config.get_similarity_threshold()
+        if self.retrieval_mode != 'tfidf' and retrieval.get('similarity_threshold') is not None:
+            similarity_threshold = retrieval['similarity_threshold']
+        self.config_threshold = similarity_threshold
+        self.load_calibration()
+
+    def load_calibration(self):
+        """Use the calibrated thresholds of this KB and retrieval mode instead of the configured one, if any"""
+        self.calibration = load_thresholds().get(calibration_key(self.kb_name, self.retrieval_mode))
+        self.similarity_threshold = self.calibration['threshold'] if self.calibration else self.config_threshold
+        self._question_thresholds = None
+        # Changes whenever the effective thresholds do (part of the answer cache version)
+        payload = json.dumps([self.similarity_threshold, self.calibration], sort_keys=True).encode('utf-8')
+        self.threshold_fingerprint = hashlib.sha1(payload).hexdigest()[:12]
+
+    def _question_thresholds_for(self, index: KBIndex):
+        """Calibrated per-question thresholds aligned with the index (NaN = the KB threshold), or None"""
+        questions = self.calibration.get('questions') if self.calibration else None
+        if not questions:
+            return None
+        cached = self._question_thresholds
+        if cached is None or cached[0] is not index:
+            values = np.array([questions.get(qa['question'], np.nan) for qa in index.qa_pairs], dtype=np.float64)
+            cached = self._question_thresholds = (index, values)
+        return cached[1]
+
+    def _on_config_changed(self, old, new):
+        """Config hot reload: cheap settings are applied in place, index settings trigger a rebuild"""
+        old_kb = old.kb_config.get('knowledge_base', {})
+        new_kb = new.kb_config.get('knowledge_base', {})
+        self._configure_retrieval()
+        if any(old_kb.get(key) != new_kb.get(key) for key in self.INDEX_CONFIG_KEYS):
+            self.load_knowledge_base()
 
     def load_knowledge_base(self):
-        """Load knowledge base file and parse Q&A pairs"""
-        kb_file = config.get_knowledge_base_path(self.kb_name)
+        """Load knowledge base file(s) and parse Q&A pairs"""
+        kb_sources = resolve_kb_sources(config.get_knowledge_base_sources(self.kb_name))
+        
+        if not kb_sources:
+            print(f"Knowledge base file not found: {config.get_knowledge_base_path(self.kb_name)}")
+            return
         
-        if not os.path.exists(kb_file):
-            print(f"Knowledge base file not found: {kb_file}")
+        if self.index_cache is not None:
+            self.index = self._load_shared_index(kb_sources)
             return
+        
+        # Build TF-IDF vectors, then publish the new index in one step
+        self.index = self._build_index(*self._parse_sources(kb_sources))
+
+    def _parse_sources(self, kb_sources: List[str]):
+        """Stream records one at a time - supports plain text, markdown and JSONL files"""
+        parser = KBParser()
+        qa_pairs = [record.to_dict() for record in parser.iter_sources(kb_sources)]
+        
+        print(f"Loaded {len(qa_pairs)} Q&A pairs from knowledge base: {', '.join(kb_sources)}")
+        if parser.issues:
+            print(f"Skipped {len(parser.issues)} malformed knowledge base entries:")
+            for issue in parser.issues[:10]:
+                print(f"  {issue}")
+        return qa_pairs, parser.issues
+
+    def _index_settings(self) -> dict:
+        """Settings that affect the built index (part of the shared cache key)"""
+        kb_config = config.get_knowledge_base_config()
+        return {
+            'tfidf_settings': kb_config.get('tfidf_settings', {}),
+            'retrieval': kb_config.get('retrieval', {}),
+            'stats_version': STATS_VERSION
+        }
+
+    def _load_shared_index(self, kb_sources: List[str]) -> KBIndex:
+        """Load the index from the shared cache; the first worker to get here builds and saves it"""
+        key = self.index_cache.key(kb_sources, self._index_settings())
+        index = self._index_from_cache(key)
+        if index is not None:
+            return index
+        
+        with self.index_cache.build_lock(key):
+            # Another worker may have finished the build while we waited
+            index = self._index_from_cache(key)
+            if index is not None:
+                return index
             
-        with open(kb_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+            index = self._build_index(*self._parse_sources(kb_sources))
+            try:
+                self.index_cache.save(
+                    key, index.qa_pairs, index.vectorizer, index.tfidf_matrix, index.dense_index,
+                    embedding_model=index.embedder.model if index.embedder else None,
+                    parse_issues=[str(issue) for issue in index.parse_issues],
+                    stats=index.stats
+                )
+            except OSError as e:
+                print(f"Error saving shared KB index: {e}")
+            return index
+
+    def _index_from_cache(self, key: str) -> KBIndex:
+        try:
+            cached = self.index_cache.load(key)
+        except Exception as e:
+            print(f"Error loading shared KB index {key}, rebuilding: {e}")
+            return None
+        if cached is None:
+            return None
         
-        # Parse Q&A pairs - supports both markdown and plain text formats
-        # Try plain text format first (Q: ... A: ...)
-        qa_pattern_plain = r'Q:\s*(.*?)\n\s*A:\s*(.*?)(?=\n\n|\nQ:|$)'
-        matches = re.findall(qa_pattern_plain, content, re.DOTALL)
+        index = KBIndex(
+            qa_pairs=cached['qa_pairs'],
+            vectorizer=cached['vectorizer'],
+            tfidf_matrix=cached['tfidf_matrix'],
+            retrieval_mode=self.retrieval_mode,
+            hybrid_weight=self.hybrid_weight,
+            ann_candidates=self.ann_settings.get('candidates', 50),
+            parse_issues=cached['parse_issues'],
+            stats=cached['stats']
+        )
+        if self.retrieval_mode != 'tfidf' and index.qa_pairs:
+            try:
+                index.embedder = create_embedder(self.embedding_settings)
+                if cached['dense_matrix'] is not None:
+                    index.dense_index = DenseIndex.from_arrays(cached['dense_matrix'], cached['dense_scales'])
+                else:
+                    # IVF indexes are loaded from their own file next to the KB
+                    index.dense_index = self._build_dense_index(index.embedder, [qa['question'] for qa in index.qa_pairs])
+            except Exception as e:
+                index.embedder = index.dense_index = None
+                print(f"Error building embeddings, falling back to TF-IDF: {e}")
+        print(f"Loaded shared KB index {key} ({len(index.qa_pairs)} Q&A pairs)")
+        return index
+
+    def _build_index(self, qa_pairs: List[dict], parse_issues=None) -> KBIndex:
+        """Build the TF-IDF matrix and, in dense/hybrid mode, the embedding index"""
+        questions = [qa['question'] for qa in qa_pairs]
+        index = KBIndex(
+            qa_pairs=qa_pairs,
+            vectorizer=self._create_vectorizer(len(questions)),
+            retrieval_mode=self.retrieval_mode,
+            hybrid_weight=self.hybrid_weight,
+            ann_candidates=self.ann_settings.get('candidates', 50),
+            parse_issues=parse_issues
+        )
+        if not qa_pairs:
+            return index
         
-        # If no matches with plain text, try markdown format (**Q: ... **A: ...)
-        if not matches:
-            qa_pattern_markdown = r'\*\*Q:\s*(.*?)\*\*\s*\n\s*A:\s*(.*?)(?=\n\n|\n\*\*Q:|$)'
-            matches = re.findall(qa_pattern_markdown, content, re.DOTALL)
+        index.tfidf_matrix = index.vectorizer.fit_transform(questions)
         
-        self.qa_pairs = []
-        for question, answer in matches:
-            self.qa_pairs.append({
-                'question': question.strip(),
-                'answer': answer.strip()
-            })
+        if self.retrieval_mode != 'tfidf':
+            try:
+                index.embedder = create_embedder(self.embedding_settings)
+                index.dense_index = self._build_dense_index(index.embedder, questions)
+                print(f"Built {index.embedder.model} {type(index.dense_index).__name__} for {len(index.dense_index)} questions")
+            except Exception as e:
+                # Keep serving with TF-IDF if the embedding backend is unavailable
+                index.embedder = index.dense_index = None
+                print(f"Error building embeddings, falling back to TF-IDF: {e}")
+        return index
+
+    def _ann_index_path(self, model: str) -> str:
+        """ANN index file stored next to the KB file, e.g. automotive_en.txt.nomic-embed-text.ivf.npz"""
+        model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        kb_path = config.get_knowledge_base_path(self.kb_name)
+        if os.path.isdir(kb_path):
+            kb_path = os.path.join(kb_path, "kb")
+        # Glob patterns are not valid file names
+        kb_path = re.sub(r'[*?\[\]]', '_', kb_path)
+        return f"{kb_path}.{model}.ivf.npz"
+
+    def _use_ann(self, n_questions: int) -> bool:
+        return bool(self.ann_settings.get('enabled')) and n_questions >= self.ann_settings.get('min_vectors', 50000)
+
+    def _build_dense_index(self, embedder, questions: List[str]):
+        """Exact DenseIndex for small KBs, IVF ANN index (loaded from disk when up to date) for large ones"""
+        if not self._use_ann(len(questions)):
+            vectors = embedder.embed(questions)
+            return DenseIndex(vectors, quantize=self.embedding_settings.get('quantize_int8', False))
+        
+        nprobe = self.ann_settings.get('nprobe', 8)
+        fingerprint = chain_fingerprint(embedder.model, questions)
+        path = self._ann_index_path(embedder.model)
+        if os.path.exists(path):
+            try:
+                ann_index = IVFIndex.load(path)
+                if ann_index.fingerprint == fingerprint:
+                    ann_index.nprobe = nprobe
+                    return ann_index
+            except Exception as e:
+                print(f"Error loading ANN index {path}, rebuilding: {e}")
+        
+        ann_index = IVFIndex.build(
+            embedder.embed(questions),
+            nlist=self.ann_settings.get('nlist', 0),
+            nprobe=nprobe,
+            fingerprint=fingerprint
+        )
+        self._save_ann_index(embedder.model, ann_index)
+        return ann_index
+
+    def _save_ann_index(self, model: str, ann_index: IVFIndex):
+        try:
+            ann_index.save(self._ann_index_path(model))
+        except OSError as e:
+            print(f"Error saving ANN index: {e}")
+
+    def _dense_scores(self, index: KBIndex, query: str) -> np.ndarray:
+        """Dense similarity against every question; with an ANN index only candidates get a finite score"""
+        return self._dense_scores_many(index, [query])[0]
+
+    def _dense_scores_many(self, index: KBIndex, queries: List[str]) -> np.ndarray:
+        """
+        Dense similarity of each query (rows) against every question (columns). With an ANN index,
+        questions outside a query's candidates score -inf, so they never outrank a candidate (even one
+        with a negative cosine) and stay out of the hybrid blend.
+        """
+        query_vectors = index.embedder.embed(queries)
+        if not isinstance(index.dense_index, IVFIndex):
+            return index.dense_index.scores(query_vectors)
+        
+        ids, scores = index.dense_index.search(query_vectors, k=index.ann_candidates)
+        n_questions = len(index.qa_pairs)
+        valid = (ids >= 0) & (ids < n_questions)
+        dense_scores = np.full((len(queries), n_questions), -np.inf, dtype=np.float32)
+        rows = np.broadcast_to(np.arange(len(queries))[:, None], ids.shape)
+        dense_scores[rows[valid], ids[valid]] = scores[valid]
+        return dense_scores
+
+    @property
+    def search_is_blocking(self) -> bool:
+        """True when a search makes a network call (remote query embedding)"""
+        index = self.index
+        return index.dense_index is not None and getattr(index.embedder, 'is_remote', False)
+
+    def _score_query(self, index: KBIndex, query: str) -> np.ndarray:
+        """Similarity of a query against every KB question for the index's retrieval mode"""
+        mode = index.retrieval_mode if index.dense_index is not None else 'tfidf'
+        
+        if mode == 'tfidf':
+            query_vector = index.vectorizer.transform([query])
+            return cosine_similarity(query_vector, index.tfidf_matrix)[0]
+        
+        dense_scores = self._dense_scores(index, query)
+        if mode == 'dense':
+            return dense_scores
+        
+        query_vector = index.vectorizer.transform([query])
+        tfidf_scores = cosine_similarity(query_vector, index.tfidf_matrix)[0]
+        return (1 - index.hybrid_weight) * tfidf_scores + index.hybrid_weight * dense_scores
+
+    def _top_matches(self, index: KBIndex, queries: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k question indices and scores per query (best first), scoring a chunk of queries per
+        matrix product. Rows with fewer than k non-zero TF-IDF scores (or ANN candidates) are padded
+        with index -1, score 0.
+        """
+        mode = index.retrieval_mode if index.dense_index is not None else 'tfidf'
+        n_questions = len(index.qa_pairs)
+        k = min(k, n_questions)
+        chunk = QUERY_CHUNK if mode == 'tfidf' else max(1, min(QUERY_CHUNK, DENSE_CHUNK_CELLS // n_questions))
+        top_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        top_scores = np.zeros((len(queries), k), dtype=np.float32)
+        
+        for start in range(0, len(queries), chunk):
+            batch = queries[start:start + chunk]
+            # TF-IDF rows are L2-normalized, so the sparse product is the cosine similarity
+            tfidf_scores = None
+            if mode != 'dense':
+                tfidf_scores = (index.vectorizer.transform(batch) @ index.tfidf_matrix.T).tocsr()
+            if mode == 'tfidf':
+                ids, scores = self._sparse_top_k(tfidf_scores, k)
+            else:
+                scores_matrix = self._dense_scores_many(index, batch)
+                if mode == 'hybrid':
+                    scores_matrix = (1 - index.hybrid_weight) * tfidf_scores.toarray() + index.hybrid_weight * scores_matrix
+                ids, scores = self._dense_top_k(scores_matrix, k)
+                # Fewer ANN candidates than k
+                ids[np.isneginf(scores)] = -1
+                scores[np.isneginf(scores)] = 0
+            top_ids[start:start + len(batch)] = ids
+            top_scores[start:start + len(batch)] = scores
+        return top_ids, top_scores
+
+    @classmethod
+    def _sparse_top_k(cls, scores, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k of each CSR row; zero scores (no shared terms) come back as index -1"""
+        n_rows, n_cols = scores.shape
+        if k == 1:
+            # Straight on the stored values: scores.max() would first sort the product's indices
+            row_sizes = np.diff(scores.indptr)
+            values = np.zeros(n_rows, dtype=np.float32)
+            if scores.nnz:
+                filled = row_sizes > 0
+                values[filled] = np.maximum.reduceat(scores.data, scores.indptr[:-1][filled])
+            # Ties go to the lowest question index, like the single search's argmax
+            rows = np.repeat(np.arange(n_rows), row_sizes)
+            best = scores.data.astype(np.float32) == values[rows]
+            ids = np.full(n_rows, n_cols, dtype=np.int64)
+            np.minimum.at(ids, rows[best], scores.indices[best])
+            ids, values = ids[:, None], values[:, None]
+        else:
+            # Blocks of dense rows: partitioning is far cheaper than sorting every stored score
+            ids = np.empty((n_rows, k), dtype=np.int64)
+            values = np.empty((n_rows, k), dtype=np.float32)
+            block = max(1, DENSE_CHUNK_CELLS // n_cols)
+            for start in range(0, n_rows, block):
+                ids[start:start + block], values[start:start + block] = cls._dense_top_k(
+                    scores[start:start + block].toarray(), k)
+        ids[values <= 0] = -1
+        values[values <= 0] = 0
+        return ids, values
+
+    @staticmethod
+    def _dense_top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if k == 1:
+            ids = scores.argmax(axis=1)[:, None]
+        else:
+            ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            ids = np.take_along_axis(ids, np.argsort(-np.take_along_axis(scores, ids, axis=1), axis=1, kind='stable'), axis=1)
+        return ids, np.take_along_axis(scores, ids, axis=1)
+
+    def top_k_many(self, queries: List[str], k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k KB entries for each query: (indices into qa_pairs, scores), both shaped
+        (len(queries), k) and ordered best first. Missing entries are index -1 with score 0.
+        """
+        index = self.index
+        if not queries or not index.qa_pairs or index.tfidf_matrix is None:
+            return np.full((len(queries), k), -1, dtype=np.int64), np.zeros((len(queries), k), dtype=np.float32)
+        return self._top_matches(index, list(queries), k)
+
+    def search_many(self, queries: List[str], threshold: float = None) -> List[Tuple[str, bool, float]]:
+        """
+        search_knowledge_base for a list of queries: one transform and one matrix product per
+        chunk of queries instead of one per query. Returns (answer, found_match, score) per query.
+        """
+        index = self.index
+        per_question = self._question_thresholds_for(index) if threshold is None else None
+        if threshold is None:
+            threshold = self.similarity_threshold
+        if not queries:
+            return []
+        
+        no_match_responses = config.settings.kb.no_match_responses
+        if not index.qa_pairs or index.tfidf_matrix is None:
+            return [(random.choice(no_match_responses), False, 0.0) for _ in queries]
         
-        print(f"Loaded {len(self.qa_pairs)} Q&A pairs from knowledge base: {kb_file}")
+        try:
+            best_ids, best_scores = self._top_matches(index, list(queries), 1)
+        except Exception as e:
+            # e.g. embedding backend went away - one query at a time, with the TF-IDF fallback
+            print(f"Error scoring query batch, searching one by one: {e}")
+            return [self.search_knowledge_base(query, threshold) for query in queries]
         
-        # Build TF-IDF vectors
-        if self.qa_pairs:
-            questions = [qa['question'] for qa in self.qa_pairs]
-            self.tfidf_matrix = self.vectorizer.fit_transform(questions)
+        best_ids, best_scores = best_ids[:, 0], best_scores[:, 0]
+        limits = np.full(len(best_ids), threshold, dtype=np.float64)
+        if per_question is not None:
+            own = per_question[np.maximum(best_ids, 0)]
+            limits = np.where(np.isnan(own), limits, own)
+        found = (best_ids >= 0) & (best_scores >= limits)
+        return [
+            (index.qa_pairs[i]['answer'], True, score) if hit
+            else (random.choice(no_match_responses), False, score)
+            for i, score, hit in zip(best_ids.tolist(), best_scores.tolist(), found.tolist())
+        ]
 
     def search_knowledge_base(self, query: str, threshold: float = None) -> Tuple[str, bool, float]:
         """
         Search for relevant answers in knowledge base
         Returns: (answer, found_match, similarity_score)
         """
+        # One consistent index for the whole search, even if a reload swaps it meanwhile
+        index = self.index
+        per_question = self._question_thresholds_for(index) if threshold is None else None
         if threshold is None:
             threshold = self.similarity_threshold
             
-        if not self.qa_pairs or self.tfidf_matrix is None:
-            no_match_responses = config.get_no_match_responses()
+        if not index.qa_pairs or index.tfidf_matrix is None:
+            no_match_responses = config.settings.kb.no_match_responses
             return random.choice(no_match_responses), False, 0.0
         
         # Calculate similarity between query and all questions
-        query_vector = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix)[0]
+        try:
+            similarities = self._score_query(index, query)
+        except Exception as e:
+            # e.g. embedding backend went away - answer from TF-IDF alone
+            print(f"Error scoring query, using TF-IDF only: {e}")
+            query_vector = index.vectorizer.transform([query])
+            similarities = cosine_similarity(query_vector, index.tfidf_matrix)[0]
         
         # Find most similar question
         best_match_idx = np.argmax(similarities)
         best_similarity = similarities[best_match_idx]
+        if np.isneginf(best_similarity):
+            # No ANN candidates at all
+            no_match_responses = config.settings.kb.no_match_responses
+            return random.choice(no_match_responses), False, 0.0
+        if per_question is not None and not np.isnan(per_question[best_match_idx]):
+            threshold = per_question[best_match_idx]
         
         if best_similarity >= threshold:
-            answer = self.qa_pairs[best_match_idx]['answer']
-            return answer, True, best_similarity
+            answer = index.qa_pairs[best_match_idx]['answer']
+            return answer, True, float(best_similarity)
         else:
-            no_match_responses = config.get_no_match_responses()
-            return random.choice(no_match_responses), False, best_similarity
+            no_match_responses = config.settings.kb.no_match_responses
+            return random.choice(no_match_responses), False, float(best_similarity)
 
     def detect_kb_topic(self) -> str:
         """Detect the main topic/domain of the loaded knowledge base"""
-        if not self.qa_pairs:
-            return "general"
-        
-        # Analyze questions to determine topic
-        all_text = " ".join([qa['question'] + " " + qa['answer'] for qa in self.qa_pairs]).lower()
-        
-        # Topic detection based on keyword frequency
-        topic_keywords = {
-            'automotive': ['car', 'vehicle', 'auto', 'insurance', 'buy', 'sell', 'drive', 'engine', 'repair'],
-            'technology': ['software', 'computer', 'app', 'system', 'code', 'programming', 'tech', 'device'],
-            'finance': ['money', 'bank', 'loan', 'credit', 'payment', 'investment', 'financial', 'account'],
-            'health': ['health', 'medical', 'doctor', 'medicine', 'symptom', 'treatment', 'patient', 'hospital'],
-            'education': ['school', 'student', 'learn', 'course', 'study', 'education', 'teacher', 'class'],
-            'ecommerce': ['product', 'order', 'shipping', 'return', 'purchase', 'customer', 'delivery', 'store']
-        }
-        
-        topic_scores = {}
-        for topic, keywords in topic_keywords.items():
-            score = sum(all_text.count(keyword) for keyword in keywords)
-            if score > 0:
-                topic_scores[topic] = score
-        
-        if topic_scores:
-            return max(topic_scores, key=topic_scores.get)
-        return "general"
+        return self.index.stats['topic']
 
     def get_all_qa_pairs(self) -> List[dict]:
         """Get all Q&A pairs"""
@@ -121,17 +542,30 @@ class KnowledgeBaseService:
 
     def add_qa_pair(self, question: str, answer: str):
         """Add new Q&A pair (can be used for dynamic knowledge base updates)"""
-        self.qa_pairs.append({
+        index = self.index
+        qa_pairs = index.qa_pairs + [{
             'question': question,
             'answer': answer
-        })
-        # Rebuild TF-IDF vectors
-        questions = [qa['question'] for qa in self.qa_pairs]
-        self.tfidf_matrix = self.vectorizer.fit_transform(questions)
+        }]
+        if not isinstance(index.dense_index, IVFIndex):
+            # Rebuild TF-IDF vectors (and embeddings)
+            self.index = self._build_index(qa_pairs, index.parse_issues)
+            return
+        
+        # ANN index supports incremental insertion - only TF-IDF is refit
+        questions = [qa['question'] for qa in qa_pairs]
+        vectorizer = self._create_vectorizer(len(questions))
+        tfidf_matrix = vectorizer.fit_transform(questions)
+        index.dense_index.add(index.embedder.embed([question]))
+        index.dense_index.fingerprint = chain_fingerprint(index.dense_index.fingerprint, [question])
+        self._save_ann_index(index.embedder.model, index.dense_index)
+        self.index = KBIndex(qa_pairs, vectorizer, tfidf_matrix, index.dense_index, index.embedder,
+                             index.retrieval_mode, index.hybrid_weight, index.ann_candidates, index.parse_issues)
     
     def switch_knowledge_base(self, kb_name: str):
         """Switch to a different knowledge base"""
         self.kb_name = kb_name
+        self.load_calibration()
         self.load_knowledge_base()
     
     def get_available_knowledge_bases(self) -> List[str]:
@@ -141,6 +575,9 @@ class KnowledgeBaseService:
     
     def reload_config(self):
         """Reload configuration and knowledge base"""
+        index_before = self.index
         config.reload_configs()
-        self.similarity_threshold = config.get_similarity_threshold()
-        self.load_knowledge_base()
\ No newline at end of file
+        # Re-read the KB file unless the config change already rebuilt the index
+        if self.index is index_before:
+            self._configure_retrieval()
+            self.load_knowledge_base()
\ No newline at end of file
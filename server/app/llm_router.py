@@ -0,0 +1,229 @@
+import os
+import time
+import asyncio
+import aiohttp
+from typing import Callable, List, Optional, Dict, Any
+from metrics import LLM_REQUESTS, LLM_DURATION, LLM_EXHAUSTED, LLM_SLOT_WAIT
+from micro_batch import LLMBatcher
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "deepseek-r1:1.5b"
+
+
+class OllamaBackend:
+    """A single Ollama endpoint with its load and latency statistics"""
+
+    def __init__(self, url: str, weight: float = 1.0, models: List[str] = None):
+        self.url = url.rstrip('/')
+        self.weight = max(float(weight), 0.01)
+        self.models = set(models) if models else None  # None = serves every model
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.total_requests = 0
+        self.total_failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def record_success(self, latency: float, alpha: float):
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def record_failure(self, cooldown: float):
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        # Back off longer from backends that keep failing
+        self.unhealthy_until = time.monotonic() + cooldown * min(self.consecutive_failures, 6)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "models": sorted(self.models) if self.models else "all",
+            "outstanding": self.outstanding,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "healthy": self.is_available(time.monotonic())
+        }
+
+
+class LLMRouter:
+    """Routes LLM calls across a pool of Ollama backends with retry on failure"""
+
+    STRATEGIES = ('least_outstanding', 'ewma_latency')
+
+    def __init__(self, ai_settings: Dict[str, Any] = None):
+        self.backends: List[OllamaBackend] = []
+        self.batcher: Optional[LLMBatcher] = None
+        self.configure(ai_settings or {})
+
+    def configure(self, ai_settings: Dict[str, Any]):
+        """(Re)build the backend pool from the ai_settings config section"""
+        backend_configs = ai_settings.get('ollama_backends') or [{'url': DEFAULT_OLLAMA_URL}]
+
+        # Environment override, e.g. OLLAMA_BACKENDS=http://box1:11434,http://box2:11434
+        env_backends = os.getenv("OLLAMA_BACKENDS")
+        if env_backends:
+            backend_configs = [{'url': url.strip()} for url in env_backends.split(',') if url.strip()]
+            if not backend_configs:
+                print(f"OLLAMA_BACKENDS={env_backends!r} has no URLs, using {DEFAULT_OLLAMA_URL}")
+                backend_configs = [{'url': DEFAULT_OLLAMA_URL}]
+
+        # Keep statistics for backends that survive a reload
+        existing = {backend.url: backend for backend in self.backends}
+        backends = []
+        for backend_config in backend_configs:
+            if isinstance(backend_config, str):
+                backend_config = {'url': backend_config}
+            url = backend_config.get('url', DEFAULT_OLLAMA_URL).rstrip('/')
+            backend = existing.get(url) or OllamaBackend(url)
+            backend.weight = max(float(backend_config.get('weight', 1.0)), 0.01)
+            models = backend_config.get('models')
+            backend.models = set(models) if models else None
+            backends.append(backend)
+        self.backends = backends
+
+        self.models = {'default': DEFAULT_MODEL}
+        self.models.update(ai_settings.get('models') or {})
+
+        self.strategy = ai_settings.get('routing_strategy', 'least_outstanding')
+        if self.strategy not in self.STRATEGIES:
+            print(f"Unknown routing strategy '{self.strategy}', using least_outstanding")
+            self.strategy = 'least_outstanding'
+
+        self.request_timeout = float(ai_settings.get('request_timeout', 30))
+        self.max_retries = int(ai_settings.get('max_retries', 2))
+        self.failure_cooldown = float(ai_settings.get('failure_cooldown', 10))
+        self.ewma_alpha = float(ai_settings.get('ewma_alpha', 0.3))
+        self._configure_batching(ai_settings.get('batching') or {})
+
+    def _configure_batching(self, batching: Dict[str, Any]):
+        """Optional micro-batching of prompts (LLM_BATCHING=1/0 overrides batching.enabled)"""
+        enabled = os.getenv("LLM_BATCHING", str(batching.get('enabled', False)))
+        if enabled.strip().lower() not in ('1', 'true', 'yes', 'on'):
+            self.batcher = None
+            return
+        window_ms = float(batching.get('window_ms', 5))
+        max_batch = int(batching.get('max_batch', 32))
+        parallel = int(batching.get('parallel', 4))
+        current = self.batcher
+        if current is None or (current.window * 1000, current.max_batch, current.parallel) != (window_ms, max_batch, parallel):
+            # Prompts already queued in the old batcher still complete
+            self.batcher = LLMBatcher(self, window_ms=window_ms, max_batch=max_batch, parallel=parallel)
+
+    def model_for(self, task: str = 'default') -> str:
+        """Get the model configured for a task type, falling back to the default model"""
+        return self.models.get(task) or self.models['default']
+
+    def _score(self, backend: OllamaBackend) -> float:
+        if self.strategy == 'ewma_latency':
+            # Unmeasured backends score 0 so they get probed first
+            latency = backend.ewma_latency or 0.0
+            return latency * (backend.outstanding + 1) / backend.weight
+        return backend.outstanding / backend.weight
+
+    def pick_backend(self, model: str, exclude: set = None) -> Optional[OllamaBackend]:
+        """Pick the best backend for a model, skipping excluded and cooling-down backends"""
+        exclude = exclude or set()
+        candidates = [b for b in self.backends if b.serves(model) and b.url not in exclude]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [b for b in candidates if b.is_available(now)]
+        if not healthy:
+            # Every backend is cooling down - try the one that recovers first
+            return min(candidates, key=lambda b: b.unhealthy_until)
+
+        return min(healthy, key=lambda b: (self._score(b), b.total_requests))
+
+    async def generate(self, prompt: str, task: str = 'default') -> Optional[str]:
+        """
+        Generate a completion, retrying on another backend if one fails
+        Returns the raw response text, or None if every attempt failed
+        """
+        if self.batcher is not None:
+            return await self.batcher.submit((prompt, task))
+        return await self.generate_now(prompt, task)
+
+    async def generate_now(self, prompt: str, task: str = 'default',
+                           slots_for: Callable[[OllamaBackend], asyncio.Semaphore] = None) -> Optional[str]:
+        """
+        generate without going through the batcher. With slots_for, each attempt waits for
+        one of the chosen backend's slots (the batcher's per-backend parallelism).
+        """
+        model = self.model_for(task)
+        tried = set()
+
+        for _ in range(self.max_retries + 1):
+            backend = self.pick_backend(model, tried)
+            if backend is None:
+                break
+            tried.add(backend.url)
+
+            # Counted while waiting for a slot too, so the next pick prefers a less busy backend
+            backend.outstanding += 1
+            slots = slots_for(backend) if slots_for is not None else None
+            acquired = False
+            try:
+                if slots is not None:
+                    wait_start = time.monotonic()
+                    await slots.acquire()
+                    acquired = True
+                    LLM_SLOT_WAIT.observe(time.monotonic() - wait_start)
+                start = time.monotonic()
+                text = await self._post_generate(backend, model, prompt)
+                elapsed = time.monotonic() - start
+                backend.record_success(elapsed, self.ewma_alpha)
+                LLM_REQUESTS.inc(task=task, outcome="success")
+                LLM_DURATION.observe(elapsed, task=task)
+                return text
+            except Exception as e:
+                backend.record_failure(self.failure_cooldown)
+                LLM_REQUESTS.inc(task=task, outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                print(f"Error calling Ollama at {backend.url} ({model}): {e!r}")
+            finally:
+                backend.outstanding -= 1
+                if acquired:
+                    slots.release()
+
+        LLM_EXHAUSTED.inc(task=task)
+        return None
+
+    async def _post_generate(self, backend: OllamaBackend, model: str, prompt: str) -> str:
+        """POST a prompt to one backend's /api/generate endpoint"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False
+        }
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{backend.url}/api/generate",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Ollama API error: {response.status}")
+                result = await response.json()
+                return result.get("response", "").strip()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get routing configuration and per-backend statistics"""
+        return {
+            "strategy": self.strategy,
+            "models": dict(self.models),
+            "batching": self.batcher.get_stats() if self.batcher is not None else None,
+            "backends": [backend.get_status() for backend in self.backends]
+        }
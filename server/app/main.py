@@ -1,19 +1,46 @@
+import os
+import json
 import uuid
+import secrets
+import asyncio
 from datetime import datetime
-from fastapi import FastAPI, Depends, HTTPException
+from typing import Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Header
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, exists, func
 from dotenv import load_dotenv
 
 # Load environment variables first
 load_dotenv()
 
-from database import get_db, init_db
+from database import AsyncSessionLocal, get_db, init_db, engine
 from models import ChatSession, ChatMessage, Ticket
 from schemas import ChatRequest, ChatResponse, TicketResponse
 from knowledge_base_service import KnowledgeBaseService
+from kb_ingest import KBIngestor
+from kb_dedup import NearDuplicateFinder
+from threshold_calibration import (
+    ThresholdCalibrator, calibration_key, fetch_chat_outcomes, parse_labeled_records, save_thresholds
+)
+from chat_batch import BatchChatRunner, parse_batch
 from ai_service import AIService
+from config_loader import config
+from shared_state import SharedState, multi_worker_enabled
+from session_cache import create_session_cache
+from event_bus import create_event_bus
+from metrics import (
+    REGISTRY, CONTENT_TYPE, MetricsMiddleware, instrument_engine, span,
+    KB_SEARCHES, CHAT_TURNS, TICKETS_CREATED
+)
+from profiling import create_profiler
+from micro_batch import create_kb_batcher
+from answer_cache import CachedAnswer, create_answer_cache
+from http_cache import (
+    CompressionMiddleware, compression_mode, make_etag, etag_matches, not_modified,
+    json_with_etag, conditional_response, hashed_response
+)
 
 app = FastAPI(title="Customer FAQ System", version="1.0.0")
 
@@ -26,13 +53,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses; the SSE stream must flush each event, so it is left alone
+if compression_mode():
+    app.add_middleware(CompressionMiddleware, mode=compression_mode(), skip_paths=["/events"])
+
+# Opt-in stack-sampling profiles of slow / sampled requests, and the slow SQL log
+profiler = create_profiler()
+profiler.install(app, engine, skip_paths=("/events", "/metrics", "/debug/profiles", "/debug/slow-queries"))
+
+# Outermost, so the request latency includes compression; /metrics scrapes are not counted
+app.add_middleware(MetricsMiddleware, skip_paths=["/metrics"])
+instrument_engine(engine)
+
 # Initialize services
 kb_service = KnowledgeBaseService()
 ai_service = AIService()
 
+# Optional: KB searches of concurrent requests scored as one batch (KB_BATCH_WINDOW_MS)
+kb_batcher = create_kb_batcher(kb_service)
+
+# Finished turns for repeated messages (ANSWER_CACHE_SIZE / ANSWER_CACHE_SHARED), skipping KB search and LLM
+answer_cache = create_answer_cache()
+
+def answer_cache_version() -> str:
+    """Cached answers are only valid for the config, KB content and similarity thresholds they were produced with"""
+    return f"{config.version}:{kb_service.kb_name}:{kb_service.index.content_hash}:{kb_service.threshold_fingerprint}"
+
+# Per-session guidance state, so active sessions skip the session read on every turn
+session_cache = create_session_cache(multi_worker_enabled())
+
+# Server-push updates (tickets, chat messages) for /events subscribers
+event_bus = create_event_bus()
+
+# Cross-worker state (active KB, reload requests) when running several worker processes
+shared_state = SharedState() if multi_worker_enabled() else None
+
+def apply_shared_state(old: dict, new: dict):
+    """Apply a change published by another worker"""
+    if new.get("active_kb") and new.get("active_kb") != kb_service.kb_name:
+        kb_service.switch_knowledge_base(new["active_kb"])
+    if new.get("reload_generation", 0) != old.get("reload_generation", 0):
+        kb_service.reload_config()
+        ai_service.reload_config()
+    elif new.get("thresholds_generation", 0) != old.get("thresholds_generation", 0):
+        kb_service.load_calibration()
+
 @app.on_event("startup")
 async def startup():
     await init_db()
+    profiler.start()
+    
+    if shared_state is not None:
+        # Workers started after a switch pick up the active KB
+        active_kb = shared_state.state.get("active_kb")
+        if active_kb and active_kb != kb_service.kb_name:
+            kb_service.switch_knowledge_base(active_kb)
+        shared_state.on_change(apply_shared_state)
+        shared_state.start_polling(float(os.getenv("SHARED_STATE_POLL_INTERVAL", "1")))
+    
+    # Hot-reload YAML configs when they change on disk (CONFIG_WATCH_INTERVAL=0 disables)
+    watch_interval = float(os.getenv("CONFIG_WATCH_INTERVAL", "2"))
+    if watch_interval > 0:
+        config.start_watching(watch_interval)
+
+@app.on_event("shutdown")
+async def shutdown():
+    config.stop_watching()
+    profiler.stop()
+    if answer_cache is not None and answer_cache.shared is not None:
+        answer_cache.shared.close()
+    if shared_state is not None:
+        shared_state.stop_polling()
 
 @app.get("/")
 async def root():
@@ -45,49 +136,97 @@ async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
     # Generate or use existing session_id
     session_id = request.session_id or str(uuid.uuid4())
     
-    # Create or get chat session
+    # Session state comes from the per-session cache; only cold sessions hit the database
+    cached_state = session_cache.get(session_id) if request.session_id else None
     chat_session = None
-    if not request.session_id:
-        chat_session = ChatSession(
-            session_id=session_id,
-            user_contact=request.user_contact
-        )
-        db.add(chat_session)
-        await db.flush()  # Get the new session
+    if cached_state is not None:
+        session_state = cached_state.as_dict()
+        has_ticket = cached_state.has_ticket
     else:
-        # Get existing session
-        result = await db.execute(select(ChatSession).where(ChatSession.session_id == session_id))
-        chat_session = result.scalar_one_or_none()
+        row = None
+        if request.session_id:
+            # Get existing session - just the state columns, plus whether it already has a ticket
+            result = await db.execute(
+                select(
+                    ChatSession.unclear_message_count,
+                    ChatSession.guidance_stage,
+                    exists().where(Ticket.session_id == ChatSession.session_id)
+                ).where(ChatSession.session_id == session_id)
+            )
+            row = result.first()
         
-        if not chat_session:
-            # Session doesn't exist, create it
+        if row is None:
+            # New session, or the session doesn't exist - create it
             chat_session = ChatSession(
                 session_id=session_id,
-                user_contact=request.user_contact
+                user_contact=request.user_contact,
+                unclear_message_count=0,
+                guidance_stage='normal'
             )
             db.add(chat_session)
             await db.flush()
+            row = (0, 'normal', False)
+        
+        session_state = {
+            'unclear_message_count': row[0] or 0,
+            'guidance_stage': row[1] or 'normal'
+        }
+        has_ticket = bool(row[2])
     
-    # 1. Search in knowledge base first
-    kb_answer, kb_found, _ = kb_service.search_knowledge_base(request.message)
-    
-    # 2. Prepare session state for AI service (refresh from DB to avoid lazy loading)
-    await db.refresh(chat_session, ['unclear_message_count', 'guidance_stage'])
+    # Keep the state we started with, to only write it back when it changed
+    previous_state = dict(session_state)
     
-    session_state = {
-        'unclear_message_count': chat_session.unclear_message_count or 0,
-        'guidance_stage': chat_session.guidance_stage or 'normal'
-    }
+    # 1. A repeated message in the same state gets the cached turn: no KB search, no LLM call
+    cache_key = cached = None
+    if answer_cache is not None:
+        cache_key = answer_cache.key(request.message, session_state, answer_cache_version())
+        cached = answer_cache.get(cache_key)
     
-    # 3. Generate AI response
-    ai_response, needs_ticket, is_unclear_intent = await ai_service.generate_response(
-        request.message, kb_answer, kb_found, session_state
-    )
+    if cached is not None:
+        ai_response, kb_found = cached.response, cached.kb_found
+        needs_ticket, is_unclear_intent = cached.needs_ticket, cached.is_unclear_intent
+        session_state['guidance_stage'] = cached.guidance_stage
+        session_state['unclear_message_count'] = cached.unclear_message_count
+    else:
+        # 2. Search in knowledge base first (off the event loop if it calls a remote embedder)
+        with span("kb"):
+            if kb_batcher is not None:
+                kb_answer, kb_found, _ = await kb_batcher.submit(request.message)
+            elif kb_service.search_is_blocking:
+                kb_answer, kb_found, _ = await asyncio.to_thread(kb_service.search_knowledge_base, request.message)
+            else:
+                kb_answer, kb_found, _ = kb_service.search_knowledge_base(request.message)
+        KB_SEARCHES.inc(result="hit" if kb_found else "miss")
+        
+        # 3. Generate AI response
+        if answer_cache is None:
+            ai_response, needs_ticket, is_unclear_intent = await ai_service.generate_response(
+                request.message, kb_answer, kb_found, session_state
+            )
+        else:
+            ai_response, needs_ticket, is_unclear_intent, cacheable = await ai_service.generate_turn(
+                request.message, kb_answer, kb_found, session_state
+            )
+            if cacheable:
+                answer_cache.put(cache_key, CachedAnswer(
+                    ai_response, kb_found, needs_ticket, is_unclear_intent,
+                    session_state['guidance_stage'], session_state['unclear_message_count']
+                ))
     
     # 4. Update session state based on AI service modifications
     # The AI service updates session_state internally, so use those values
-    chat_session.unclear_message_count = session_state['unclear_message_count']
-    chat_session.guidance_stage = session_state['guidance_stage']
+    if chat_session is not None:
+        chat_session.unclear_message_count = session_state['unclear_message_count']
+        chat_session.guidance_stage = session_state['guidance_stage']
+    elif session_state != previous_state:
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.session_id == session_id)
+            .values(
+                unclear_message_count=session_state['unclear_message_count'],
+                guidance_stage=session_state['guidance_stage']
+            )
+        )
     
     # 5. Save conversation record
     chat_message = ChatMessage(
@@ -102,7 +241,9 @@ async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
     ticket_created = False
     ticket_id = None
     
-    if needs_ticket or ai_service.should_create_ticket(request.message, ai_response, kb_found):
+    with span("ticket_check"):
+        create_ticket = needs_ticket or ai_service.should_create_ticket(request.message, ai_response, kb_found)
+    if create_ticket:
         ticket = Ticket(
             session_id=session_id,
             user_question=request.message,
@@ -114,14 +255,48 @@ async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
         ticket_created = True
         ticket_id = ticket.id
         
+        TICKETS_CREATED.inc()
+        
         # Add ticket information to response
         ticket_message = ai_service.get_ticket_created_message(ticket_id)
         ai_response += f"\n\n{ticket_message}"
     
-    # Store the chat ended status before commit to avoid lazy loading issues
-    chat_ended = (chat_session.guidance_stage == 'ended')
+    chat_ended = (session_state['guidance_stage'] == 'ended')
     
-    await db.commit()
+    try:
+        await db.commit()
+    except Exception:
+        session_cache.invalidate(session_id)
+        raise
+    
+    CHAT_TURNS.inc(source="kb" if kb_found else "guidance" if is_unclear_intent else "ai")
+    
+    # Write-through: the cache now matches the committed row
+    session_cache.update(
+        session_id,
+        session_state['unclear_message_count'],
+        session_state['guidance_stage'],
+        has_ticket=has_ticket or ticket_created
+    )
+    
+    # Push the changes to subscribers as deltas
+    now = datetime.now()
+    if chat_session is not None:
+        event_bus.publish("session_created", f"sessions:{request.user_contact}", {
+            "session_id": session_id, "user_contact": request.user_contact, "created_at": now
+        })
+    event_bus.publish("chat_message", f"session:{session_id}", {
+        "session_id": session_id,
+        "message": request.message,
+        "response": ai_response,
+        "is_from_kb": kb_found,
+        "guidance_stage": session_state['guidance_stage'],
+        "created_at": now
+    })
+    if ticket_created:
+        # The same shape GET /tickets returns (created_at is set by the database)
+        await db.refresh(ticket)
+        event_bus.publish("ticket_created", "tickets", TicketResponse.model_validate(ticket).model_dump())
     
     return ChatResponse(
         response=ai_response,
@@ -132,12 +307,79 @@ async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
         chat_ended=chat_ended
     )
 
+@app.post("/chat/batch")
+async def chat_batch(
+    request: Request,
+    format: str = Query("jsonl", pattern="^(jsonl|text)$"),
+    dry_run: bool = True,
+    concurrency: int = Query(8, ge=1, le=64),
+    retrieval_only: bool = False,
+    user_contact: Optional[str] = None
+):
+    """
+    Answer a batch of messages (JSONL or one per line) for offline evaluation or bulk replay.
+    Results stream back as JSON lines in completion order, followed by a {"summary": ...} line.
+    With dry_run=false each conversation is saved as a session, with its messages and tickets.
+    """
+    body = (await request.body()).decode('utf-8-sig')
+    items, issues = parse_batch(body.splitlines(), format)
+    max_items = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+    if len(items) > max_items:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(items)} messages, the limit is {max_items}")
+    
+    runner = BatchChatRunner(kb_service, ai_service, concurrency=concurrency, retrieval_only=retrieval_only)
+    runner.summary.issues = issues
+    persist = not dry_run and not retrieval_only
+    
+    async def results():
+        # The stream outlives the request scope, so it writes through a session of its own
+        async with AsyncSessionLocal() as db:
+            sessions = {}  # batch session key -> (session_id, ChatSession)
+            saved = 0
+            async for result in runner.run(items):
+                if persist and result.error is None:
+                    key = result.session if result.session is not None else f"#{result.index}"
+                    if key not in sessions:
+                        session_id = str(uuid.uuid4())
+                        sessions[key] = (session_id, ChatSession(session_id=session_id, user_contact=user_contact))
+                        db.add(sessions[key][1])
+                    session_id, chat_session = sessions[key]
+                    chat_session.guidance_stage = result.guidance_stage
+                    db.add(ChatMessage(session_id=session_id, message=result.message,
+                                       response=result.response, is_from_kb=result.is_from_kb))
+                    if result.needs_ticket:
+                        db.add(Ticket(session_id=session_id, user_question=result.message,
+                                      user_contact=user_contact, ai_attempted_response=result.response))
+                    saved += 1
+                    # Commit in chunks, so a long batch neither holds the write lock nor loses everything on failure
+                    if saved % 200 == 0:
+                        await db.commit()
+                line = result.to_dict()
+                if persist and result.error is None:
+                    line["session_id"] = session_id
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            if persist:
+                await db.commit()
+            summary = runner.summary.to_dict()
+            summary["dry_run"] = not persist
+            yield json.dumps({"summary": summary}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.get("/tickets")
-async def get_tickets(db: AsyncSession = Depends(get_db)):
+async def get_tickets(request: Request, db: AsyncSession = Depends(get_db)):
     """Get all tickets"""
+    # Cheap version key: any insert changes count/max(id), any status change bumps updated_at
+    version = (await db.execute(
+        select(func.count(Ticket.id), func.max(Ticket.id), func.max(Ticket.updated_at))
+    )).one()
+    etag = make_etag("tickets", *version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     result = await db.execute(select(Ticket).order_by(Ticket.created_at.desc()))
     tickets = result.scalars().all()
-    return [TicketResponse.from_orm(ticket) for ticket in tickets]
+    return json_with_etag([TicketResponse.from_orm(ticket) for ticket in tickets], etag)
 
 @app.get("/tickets/{ticket_id}")
 async def get_ticket(ticket_id: int, db: AsyncSession = Depends(get_db)):
@@ -168,54 +410,159 @@ async def update_ticket_status(
     
     ticket.status = status
     ticket.updated_at = datetime.now()
+    updated_at = ticket.updated_at
     await db.commit()
     
+    event_bus.publish("ticket_updated", "tickets", {"id": ticket_id, "status": status, "updated_at": updated_at})
+    
     return {"message": "Ticket status updated successfully"}
 
-@app.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str, db: AsyncSession = Depends(get_db)):
-    """Get chat history with session status"""
-    # Get session info
-    session_result = await db.execute(
-        select(ChatSession)
-        .where(ChatSession.session_id == session_id)
-    )
-    session = session_result.scalar()
+# Seconds between SSE keep-alive comments on an idle stream
+SSE_HEARTBEAT = 15
+
+def debug_token_valid(x_debug_token: Optional[str]) -> bool:
+    token = os.getenv("DEBUG_TOKEN")
+    return bool(token) and secrets.compare_digest(x_debug_token or "", token)
+
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    topics: str = "tickets",
+    last_event_id: Optional[str] = Header(None),
+    x_debug_token: Optional[str] = Header(None)
+):
+    """
+    Server-Sent Events stream of changes. topics is a comma-separated list, e.g.
+    "tickets", "session:<session_id>" or "sessions:<email>". Prefix patterns like "session:*"
+    stream every user's messages, so they need the DEBUG_TOKEN in X-Debug-Token.
+    Reconnecting clients send Last-Event-ID and get the events they missed replayed.
+    """
+    topic_list = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    if any('*' in topic for topic in topic_list) and not debug_token_valid(x_debug_token):
+        raise HTTPException(status_code=403, detail="Wildcard topics need a debug token")
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = event_bus.subscribe(topic_list, resume_from)
     
-    # Get messages
-    messages_result = await db.execute(
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at)
-    )
-    messages = messages_result.scalars().all()
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=SSE_HEARTBEAT)
+                yield event.to_sse() if event is not None else ": keep-alive\n\n"
+        finally:
+            subscription.close()
     
-    # Check if there's a ticket
-    ticket_result = await db.execute(
-        select(Ticket)
-        .where(Ticket.session_id == session_id)
-        .limit(1)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    has_ticket = ticket_result.scalar() is not None
-    
+
+# Rows fetched per query when streaming a transcript as NDJSON
+HISTORY_STREAM_PAGE = 500
+
+HISTORY_COLUMNS = (ChatMessage.id, ChatMessage.message, ChatMessage.response, ChatMessage.is_from_kb, ChatMessage.created_at)
+
+def format_history_row(row) -> dict:
     return {
-        "session_info": {
-            "session_id": session_id,
-            "is_active": session.is_active if session else True,
-            "has_ticket": has_ticket,
-            "guidance_stage": session.guidance_stage if session else "normal"
-        },
-        "messages": [
-            {
-                "message": msg.message,
-                "response": msg.response,
-                "is_from_kb": msg.is_from_kb,
-                "created_at": msg.created_at
-            }
-            for msg in messages
-        ]
+        "id": row.id,
+        "message": row.message,
+        "response": row.response,
+        "is_from_kb": row.is_from_kb,
+        "created_at": row.created_at
+    }
+
+async def get_session_info(db: AsyncSession, session_id: str) -> dict:
+    """Session status and ticket flag in one query"""
+    result = await db.execute(
+        select(
+            ChatSession.is_active,
+            ChatSession.guidance_stage,
+            exists().where(Ticket.session_id == ChatSession.session_id)
+        ).where(ChatSession.session_id == session_id)
+    )
+    row = result.first()
+    return {
+        "session_id": session_id,
+        "is_active": row[0] if row else True,
+        "has_ticket": bool(row[2]) if row else False,
+        "guidance_stage": row[1] if row else "normal"
     }
 
+async def stream_chat_history(session_id: str, session_info: dict, after: int = 0):
+    """
+    NDJSON: a session_info line, then one line per message (oldest first), fetched page by page.
+    Runs after the request's own session is closed, so it reads through a session of its own.
+    """
+    yield json.dumps({"session_info": session_info}) + "\n"
+    async with AsyncSessionLocal() as db:
+        while True:
+            result = await db.execute(
+                select(*HISTORY_COLUMNS)
+                .where(ChatMessage.session_id == session_id, ChatMessage.id > after)
+                .order_by(ChatMessage.id)
+                .limit(HISTORY_STREAM_PAGE)
+            )
+            rows = result.all()
+            if rows:
+                yield "".join(json.dumps(format_history_row(row), default=datetime.isoformat) + "\n" for row in rows)
+                after = rows[-1].id
+            if len(rows) < HISTORY_STREAM_PAGE:
+                break
+
+@app.get("/chat/history/{session_id}")
+async def get_chat_history(
+    request: Request,
+    session_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    before: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get chat history with session status.
+    limit/before page backwards: the last `limit` messages older than message id `before`;
+    `next_cursor` is the value of `before` for the previous page (null when there is none).
+    format=ndjson streams the whole transcript one message per line.
+    """
+    session_info = await get_session_info(db, session_id)
+    
+    # Messages are append-only, so the count and newest id identify the transcript
+    message_version = (await db.execute(
+        select(func.count(ChatMessage.id), func.max(ChatMessage.id)).where(ChatMessage.session_id == session_id)
+    )).one()
+    etag = make_etag("history", session_info, *message_version, limit, before, format)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_chat_history(session_id, session_info),
+            media_type="application/x-ndjson",
+            headers={"ETag": etag}
+        )
+    
+    query = select(*HISTORY_COLUMNS).where(ChatMessage.session_id == session_id)
+    if before is not None:
+        query = query.where(ChatMessage.id < before)
+    
+    next_cursor = None
+    if limit is None:
+        rows = (await db.execute(query.order_by(ChatMessage.id))).all()
+    else:
+        # Newest first, one extra row tells whether an older page exists
+        rows = (await db.execute(query.order_by(ChatMessage.id.desc()).limit(limit + 1))).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+        rows.reverse()
+    
+    return json_with_etag({
+        "session_info": session_info,
+        "messages": [format_history_row(row) for row in rows],
+        "next_cursor": next_cursor
+    }, etag)
+
 @app.get("/sessions/{email}")
 async def get_user_sessions(email: str, db: AsyncSession = Depends(get_db)):
     """Get all sessions for a user by email"""
@@ -289,10 +636,109 @@ async def debug_raw_sessions(email: str, db: AsyncSession = Depends(get_db)):
     print(f"DEBUG RAW: Found {len(rows)} rows for {email}")
     return [{"user_contact": row[0], "session_id": row[1]} for row in rows]
 
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """Profiles and slow SQL are served only when DEBUG_TOKEN is set and sent back in X-Debug-Token"""
+    if not os.getenv("DEBUG_TOKEN"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not debug_token_valid(x_debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+@app.get("/debug/profiles", dependencies=[Depends(require_debug_token)])
+async def list_profiles(limit: int = Query(50, ge=1, le=1000)):
+    """Debug: Saved request profiles, newest first"""
+    names = await asyncio.to_thread(profiler.store.list)
+    return {"status": profiler.get_status(), "profiles": names[:limit]}
+
+@app.get("/debug/profiles/{name}", dependencies=[Depends(require_debug_token)])
+async def get_profile(name: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """Debug: One profile; format=folded gives collapsed stacks for flamegraph.pl / speedscope"""
+    profile = await asyncio.to_thread(profiler.store.load, name)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        folded = "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+        return Response(folded, media_type="text/plain")
+    return profile
+
+@app.get("/debug/slow-queries", dependencies=[Depends(require_debug_token)])
+async def get_slow_queries(limit: int = Query(100, ge=1, le=5000)):
+    """Debug: Most recent slow SQL statements, newest first"""
+    if profiler.slow_queries is None:
+        return {"threshold_ms": 0, "queries": []}
+    queries = await asyncio.to_thread(profiler.slow_queries.tail, limit)
+    return {"threshold_ms": profiler.slow_queries.threshold_ms, "queries": queries}
+
 @app.get("/knowledge-base")
-async def get_knowledge_base():
+async def get_knowledge_base(request: Request):
     """Get knowledge base content"""
-    return {"qa_pairs": kb_service.get_all_qa_pairs()}
+    index = kb_service.index
+    return conditional_response(request, make_etag("kb", index.content_hash), lambda: {"qa_pairs": index.qa_pairs})
+
+@app.post("/knowledge-base/ingest")
+async def ingest_knowledge_base(
+    request: Request,
+    format: str = Query("jsonl", pattern="^(jsonl|csv)$"),
+    dry_run: bool = False,
+    on_duplicate: Optional[str] = Query(None, pattern="^(skip|replace)$"),
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0)
+):
+    """
+    Bulk-load Q&A pairs from a JSONL or CSV request body.
+    Near-duplicate questions are reported as collisions; dry_run=true only returns the report.
+    """
+    body = (await request.body()).decode('utf-8-sig')
+    ingestor = KBIngestor(kb_service, threshold=threshold, on_duplicate=on_duplicate)
+    try:
+        # Parsing, duplicate detection and the index rebuild are CPU-bound
+        report = await asyncio.to_thread(ingestor.ingest_stream, body.splitlines(keepends=True), format, dry_run)
+    except (RuntimeError, FileNotFoundError) as e:
+        raise HTTPException(status_code=409, detail=f"Failed to ingest knowledge base: {str(e)}")
+    
+    if report.published and shared_state is not None:
+        shared_state.request_reload()
+    return report.to_dict()
+
+@app.get("/knowledge-base/duplicates")
+async def find_duplicate_questions(threshold: float = Query(0.8, ge=0.0, le=1.0)):
+    """Near-duplicate question groups in the loaded KB, with the merges a compaction would make"""
+    qa_pairs = kb_service.qa_pairs
+    groups = await asyncio.to_thread(NearDuplicateFinder(threshold=threshold).find, qa_pairs)
+    return {
+        "qa_pairs": len(qa_pairs),
+        "groups": [group.to_dict() for group in groups],
+        "removable": sum(len(group.merge) for group in groups)
+    }
+
+@app.post("/knowledge-base/calibrate")
+async def calibrate_threshold(
+    request: Request,
+    target_precision: float = Query(0.9, gt=0.0, le=1.0),
+    min_samples: int = Query(20, ge=1),
+    per_question: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    apply: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Fit the similarity threshold from logged chat outcomes, plus optional labeled JSONL records
+    ({"message", "expected"}) in the body. Returns the expected effect on the logged traffic;
+    apply=true stores the calibration and switches every worker to it.
+    """
+    records, issues = parse_labeled_records((await request.body()).decode('utf-8-sig').splitlines())
+    outcomes = await fetch_chat_outcomes(db, limit)
+    
+    calibrator = ThresholdCalibrator(kb_service, target_precision=target_precision, min_samples=min_samples)
+    calibrator.add_history(outcomes)
+    calibrator.add_labeled(records)
+    # Scores every sample against the KB in one batched search
+    report = await asyncio.to_thread(calibrator.fit, kb_service.similarity_threshold, per_question)
+    
+    if apply:
+        save_thresholds(calibration_key(kb_service.kb_name, kb_service.retrieval_mode), report)
+        kb_service.load_calibration()
+        if shared_state is not None:
+            shared_state.request_threshold_reload()
+    return {**report.to_dict(), "applied": apply, "issues": issues}
 
 @app.get("/config/knowledge-bases")
 async def get_available_knowledge_bases():
@@ -304,6 +750,8 @@ async def switch_knowledge_base(kb_name: str):
     """Switch to a different knowledge base"""
     try:
         kb_service.switch_knowledge_base(kb_name)
+        if shared_state is not None:
+            shared_state.publish_active_kb(kb_name)
         return {"message": f"Switched to knowledge base: {kb_name}", "qa_pairs": len(kb_service.get_all_qa_pairs())}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to switch knowledge base: {str(e)}")
@@ -314,27 +762,76 @@ async def reload_configurations():
     try:
         kb_service.reload_config()
         ai_service.reload_config()
+        if shared_state is not None:
+            shared_state.request_reload()
         return {"message": "Configurations reloaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to reload config: {str(e)}")
 
 @app.get("/config/status")
-async def get_config_status():
+async def get_config_status(request: Request):
     """Get current configuration status"""
     from config_loader import config
     
-    kb_config = config.get_knowledge_base_config()
     ai_settings = config.get_ai_settings()
+    # Computed on the first request after an index build - keep that pass off the event loop
+    index = kb_service.index
+    kb_stats = await asyncio.to_thread(lambda: index.stats)
     
-    return {
+    # Includes live counters, so the ETag is a hash of the body rather than config.version
+    return hashed_response(request, {
         "current_kb": kb_service.kb_name or "primary",
+        "config_version": config.version,
         "qa_pairs_loaded": len(kb_service.get_all_qa_pairs()),
-        "similarity_threshold": kb_config.get('similarity_threshold'),
+        "similarity_threshold": kb_service.similarity_threshold,
+        "threshold_calibration": {
+            "configured_threshold": kb_service.config_threshold,
+            "calibrated_at": kb_service.calibration.get('calibrated_at'),
+            "question_thresholds": len(kb_service.calibration.get('questions') or {})
+        } if kb_service.calibration else None,
         "ai_provider": "local_ai",
         "ai_model": ai_settings.get('model'),
         "available_kbs": kb_service.get_available_knowledge_bases(),
-        "provider_status": ai_service.get_provider_status()
-    }
+        "kb_stats": kb_stats,
+        "provider_status": ai_service.get_provider_status(),
+        "session_cache": session_cache.get_stats(),
+        "event_bus": event_bus.get_stats(),
+        "kb_batcher": kb_batcher.get_stats() if kb_batcher is not None else None,
+        "answer_cache": answer_cache.get_stats() if answer_cache is not None else None,
+        "workers": {
+            "multi_worker": shared_state is not None,
+            "pid": os.getpid(),
+            "shared_state": shared_state.state if shared_state is not None else None
+        }
+    })
+
+def collect_service_metrics():
+    """Statistics kept by the services themselves, exported at scrape time"""
+    cache = session_cache.get_stats()
+    yield ("faq_session_cache_hits_total", "counter", "Session state cache hits", [({}, cache["hits"])])
+    yield ("faq_session_cache_misses_total", "counter", "Session state cache misses", [({}, cache["misses"])])
+    yield ("faq_session_cache_entries", "gauge", "Sessions held in the state cache", [({}, cache["sessions"])])
+    yield ("faq_session_cache_hit_ratio", "gauge", "Session state cache hit ratio since start", [({}, cache["hit_rate"])])
+    
+    searches = KB_SEARCHES.value(result="hit") + KB_SEARCHES.value(result="miss")
+    yield ("faq_kb_hit_ratio", "gauge", "Share of KB searches that found an answer since start",
+           [({}, KB_SEARCHES.value(result="hit") / searches if searches else 0.0)])
+    turns = sum(CHAT_TURNS.value(source=source) for source in ("kb", "guidance", "ai"))
+    yield ("faq_ticket_rate", "gauge", "Tickets created per chat turn since start",
+           [({}, TICKETS_CREATED.value() / turns if turns else 0.0)])
+    yield ("faq_kb_qa_pairs", "gauge", "Q&A pairs in the active knowledge base", [({}, len(kb_service.qa_pairs))])
+    
+    backends = ai_service.llm_router.get_status()["backends"]
+    yield ("faq_llm_backend_outstanding", "gauge", "In-flight requests per LLM backend",
+           [({"backend": b["url"]}, b["outstanding"]) for b in backends])
+    yield ("faq_event_bus_subscribers", "gauge", "Connected /events subscribers", [({}, event_bus.get_stats()["subscribers"])])
+
+REGISTRY.register_collector(collect_service_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/config/ai-providers")
 async def get_ai_providers():
@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from metrics import BATCH_SIZE, BATCH_WAIT
+
+# handler(items) -> one result per item, in the same order
+BatchHandler = Callable[[list], Awaitable[list]]
+
+
+class MicroBatcher:
+    """
+    Groups calls that arrive within window_ms of each other into one handler call.
+    The first caller of a batch starts the window; a full batch (max_batch) is sent at once.
+    Each caller gets its own result back, or the exception if the whole batch failed.
+    """
+
+    def __init__(self, name: str, handler: Optional[BatchHandler], window_ms: float = 2.0, max_batch: int = 64):
+        self.name = name
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: List[tuple] = []  # (item, future, enqueued at)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Keep a reference, or the task can be garbage collected mid-flight
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        now = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        BATCH_SIZE.observe(len(batch), batcher=self.name)
+        for _, _, enqueued in batch:
+            BATCH_WAIT.observe(now - enqueued, batcher=self.name)
+        await self._process(batch)
+
+    async def _process(self, batch: List[tuple]):
+        """Run the handler on the whole batch and hand each caller its result"""
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():  # the caller may have given up (request cancelled)
+                future.set_result(result)
+
+    def get_stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+
+class LLMBatcher(MicroBatcher):
+    """
+    Prompts collected over a short window, then sent with at most `parallel` requests in flight
+    per backend (match OLLAMA_NUM_PARALLEL), so Ollama's parallel slots stay full without a
+    burst of requests piling up in its queue. Prompts for the same model go out back to back,
+    so a backend is not made to swap models in the middle of a batch.
+    Each caller gets its completion as soon as its own request finishes.
+    """
+
+    def __init__(self, router, window_ms: float = 5.0, max_batch: int = 32, parallel: int = 4):
+        super().__init__("llm", None, window_ms=window_ms, max_batch=max_batch)
+        self.router = router
+        self.parallel = max(1, parallel)
+        self.in_flight = 0
+        self._slots: Dict[str, asyncio.Semaphore] = {}  # backend url -> its parallel slots
+        self._slots_loop = None
+
+    @property
+    def capacity(self) -> int:
+        return self.parallel * max(1, len(self.router.backends))
+
+    def slots_for(self, backend) -> asyncio.Semaphore:
+        """The backend's own slots; taken once the router has picked the backend for a prompt"""
+        # A semaphore belongs to one event loop (tests and CLI tools run several in turn)
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = {}
+            self._slots_loop = loop
+        if backend.url not in self._slots:
+            self._slots[backend.url] = asyncio.Semaphore(self.parallel)
+        return self._slots[backend.url]
+
+    async def _process(self, batch: List[tuple]):
+        ordered = sorted(batch, key=lambda entry: self.router.model_for(entry[0][1]))
+        await asyncio.gather(*(self._send(entry) for entry in ordered))
+
+    async def _send(self, entry: tuple):
+        (prompt, task), future, _ = entry
+        if future.done():  # the caller gave up while the batch was collected
+            return
+        self.in_flight += 1
+        try:
+            result = await self.router.generate_now(prompt, task, slots_for=self.slots_for)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        finally:
+            self.in_flight -= 1
+        if not future.done():
+            future.set_result(result)
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats.update(parallel=self.parallel, capacity=self.capacity, in_flight=self.in_flight)
+        return stats
+
+
+def create_kb_batcher(kb_service) -> Optional[MicroBatcher]:
+    """
+    KB searches of concurrent /chat requests scored together with search_many, when
+    KB_BATCH_WINDOW_MS > 0 (default 0 = every request searches on its own). KB_BATCH_MAX caps a batch.
+    """
+    window_ms = float(os.getenv("KB_BATCH_WINDOW_MS", "0"))
+    if window_ms <= 0:
+        return None
+
+    async def search(queries: list) -> list:
+        return await asyncio.to_thread(kb_service.search_many, queries)
+
+    return MicroBatcher("kb", search, window_ms=window_ms, max_batch=int(os.getenv("KB_BATCH_MAX", "256")))
@@ -0,0 +1,346 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import asyncio
+import random
+import threading
+from collections import deque, Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from shared_state import STATE_DIR
+
+PROFILE_NAME = re.compile(r'^[\w.-]+\.json$')
+# Leaf frames in these modules mean the thread is waiting, not running Python code
+IDLE_MODULES = ('selectors.py', 'threading.py', 'queue.py')
+
+_current_request: ContextVar[Optional[str]] = ContextVar("profiled_request", default=None)
+
+
+class StackSampler:
+    """
+    Background thread that snapshots every thread's Python stack at a fixed interval.
+    Samples go to a bounded ring buffer; a request's profile is the slice taken while it ran.
+    Far cheaper than cProfile, since nothing runs on the request's own code path.
+    """
+
+    def __init__(self, interval: float = 0.005, max_samples: int = 50000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)  # (time, collapsed stack)
+        self._frame_labels: Dict[tuple, str] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        key = (code, frame.f_lineno)
+        label = self._frame_labels.get(key)
+        if label is None:
+            label = self._frame_labels[key] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        return label
+
+    def _run(self):
+        own_id = threading.get_ident()
+        main_id = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_id:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    # Idle worker threads are noise; an idle event loop means the request was waiting on I/O
+                    if ident == main_id:
+                        self.samples.append((now, f"{names.get(ident, 'MainThread')};(waiting for I/O)"))
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples.append((now, ';'.join(reversed(stack))))
+
+    def collapsed(self, start: float, end: float) -> Dict[str, int]:
+        """Samples between start and end as collapsed stacks (flamegraph.pl / speedscope input)"""
+        return dict(Counter(stack for at, stack in list(self.samples) if start <= at <= end))
+
+
+class ProfileStore:
+    """Profile files in a directory, oldest deleted beyond max_files"""
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, profile: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '_', profile["path"]).strip('_') or "root"
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{profile['reason']}-{profile['method']}-{slug[:40]}-{profile['duration_ms']:.0f}ms.json"
+        tmp_path = os.path.join(self.directory, f".{name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        self._prune()
+        return name
+
+    def _prune(self):
+        names = self.list()
+        for name in names[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def list(self) -> List[str]:
+        """Profile names, newest first"""
+        try:
+            return sorted((n for n in os.listdir(self.directory) if PROFILE_NAME.match(n)), reverse=True)
+        except FileNotFoundError:
+            return []
+
+    def load(self, name: str) -> Optional[dict]:
+        if not PROFILE_NAME.match(name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class SlowQueryLog:
+    """
+    SQL statements slower than threshold_ms, one JSON object per line, rotated by size.
+    Only the statement and its parameter count are kept - bound values carry chat text and contacts.
+    Entries are queued and written by a background thread, so the listener never does file I/O
+    on the event loop.
+    """
+
+    def __init__(self, path: str, threshold_ms: float = 250, max_bytes: int = 5 * 1024 * 1024, backups: int = 3):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._entries = queue.Queue(maxsize=10000)
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, statement: str, parameters, duration_ms: float):
+        entry = {
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "duration_ms": round(duration_ms, 2),
+            "request": _current_request.get(),
+            "statement": ' '.join(statement.split()),
+            "parameter_count": len(parameters) if isinstance(parameters, (list, tuple, dict)) else 0
+        }
+        try:
+            self._entries.put_nowait(entry)
+        except queue.Full:
+            return  # the writer is far behind; losing a log line beats stalling queries
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="slow-query-log", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            entries = [self._entries.get()]
+            # Whatever else is queued goes out in the same append
+            while len(entries) < 1000:
+                try:
+                    entries.append(self._entries.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(entries)
+            except OSError as e:
+                print(f"Error writing slow query log: {e}")
+            finally:
+                for _ in entries:
+                    self._entries.task_done()
+
+    def _write(self, entries: List[dict]):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'a', encoding='utf-8')
+        try:
+            for entry in entries:
+                if f.tell() >= self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, 'a', encoding='utf-8')
+                f.write(json.dumps(entry) + "\n")
+        finally:
+            f.close()
+
+    def flush(self):
+        """Wait until queued entries are written"""
+        self._entries.join()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def tail(self, limit: int = 100) -> List[dict]:
+        """Most recent entries, newest first (blocking: waits for queued entries, then reads the file)"""
+        self.flush()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = deque(f, maxlen=limit)
+        except FileNotFoundError:
+            return []
+        return [json.loads(line) for line in reversed(lines)]
+
+    def instrument(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            duration_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.record(statement, parameters, duration_ms)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling: a random sample_rate fraction of requests, plus every request
+    slower than slow_ms, is saved with the stack samples taken while it ran.
+    With concurrent requests the samples cover everything the process did in that window.
+    """
+
+    def __init__(self, app, sampler: StackSampler, store: ProfileStore, sample_rate: float = 0.0,
+                 slow_ms: float = 0.0, skip_paths=()):
+        self.app = app
+        self.sampler = sampler
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.skip_paths = tuple(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_paths):
+            await self.app(scope, receive, send)
+            return
+
+        # Normally started with the app; also covers servers that skip the startup event
+        self.sampler.start()
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        request = f"{scope['method']} {scope['path']}"
+        token = _current_request.set(request)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_request.reset(token)
+            end = time.perf_counter()
+            duration_ms = (end - start) * 1000
+            slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+            if slow or sampled:
+                # Collapsing the samples and writing the file stay off the event loop
+                await asyncio.to_thread(self._save, scope, status, start, end, duration_ms, "slow" if slow else "sampled")
+
+    def _save(self, scope, status: int, start: float, end: float, duration_ms: float, reason: str):
+        stacks = self.sampler.collapsed(start, end)
+        try:
+            name = self.store.save({
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode('latin-1'),
+                "status": status,
+                "reason": reason,
+                "duration_ms": round(duration_ms, 1),
+                "started": datetime.now().isoformat(timespec='milliseconds'),
+                "interval_ms": self.sampler.interval * 1000,
+                "samples": sum(stacks.values()),
+                "stacks": stacks
+            })
+        except OSError as e:
+            print(f"Error saving profile: {e}")
+            return
+        if reason == "slow":
+            print(f"🐢 Slow request {scope['method']} {scope['path']} took {duration_ms:.0f}ms - profile {name}")
+
+
+class Profiler:
+    """Sampler, profile store and slow query log configured together"""
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, slow_ms: float = 0.0, interval_ms: float = 5,
+                 max_files: int = 200, slow_sql_ms: float = 250):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.store = ProfileStore(directory, max_files)
+        self.sampler = StackSampler(interval_ms / 1000) if self.requests_enabled else None
+        self.slow_queries = SlowQueryLog(os.path.join(directory, "slow_queries.jsonl"), slow_sql_ms) if slow_sql_ms > 0 else None
+
+    @property
+    def requests_enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def install(self, app, engine, skip_paths=()):
+        if self.requests_enabled:
+            app.add_middleware(ProfilingMiddleware, sampler=self.sampler, store=self.store,
+                               sample_rate=self.sample_rate, slow_ms=self.slow_ms, skip_paths=skip_paths)
+        if self.slow_queries is not None:
+            self.slow_queries.instrument(engine)
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def get_status(self) -> dict:
+        return {
+            "directory": self.store.directory,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "slow_sql_ms": self.slow_queries.threshold_ms if self.slow_queries else 0,
+            "sampling": self.sampler is not None,
+            "profiles": len(self.store.list())
+        }
+
+
+def create_profiler() -> Profiler:
+    """
+    Configure from PROFILE_SAMPLE_RATE (fraction of requests, default 0), PROFILE_SLOW_MS
+    (profile every request at least this slow, default 0 = off), PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES, SLOW_SQL_MS (default 0 = off) and PROFILE_DIR.
+    """
+    return Profiler(
+        directory=os.getenv("PROFILE_DIR", os.path.join(STATE_DIR, "profiles")),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        slow_ms=float(os.getenv("PROFILE_SLOW_MS", "0")),
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        max_files=int(os.getenv("PROFILE_MAX_FILES", "200")),
+        slow_sql_ms=float(os.getenv("SLOW_SQL_MS", "0"))
+    )
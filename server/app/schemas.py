@@ -29,6 +29,7 @@ class TicketResponse(BaseModel):
     status: str
     ai_attempted_response: Optional[str]
     created_at: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class SessionState:
+    """The per-session fields every chat turn reads and writes"""
+
+    __slots__ = ('unclear_message_count', 'guidance_stage', 'has_ticket', 'expires_at')
+
+    def __init__(self, unclear_message_count: int = 0, guidance_stage: str = 'normal', has_ticket: bool = False):
+        self.unclear_message_count = unclear_message_count
+        self.guidance_stage = guidance_stage
+        self.has_ticket = has_ticket
+        self.expires_at = 0.0
+
+    @property
+    def ended(self) -> bool:
+        return self.guidance_stage == 'ended'
+
+    def as_dict(self) -> dict:
+        """Mutable copy in the shape the AI service expects"""
+        return {
+            'unclear_message_count': self.unclear_message_count,
+            'guidance_stage': self.guidance_stage
+        }
+
+
+class SessionStateCache:
+    """
+    Bounded LRU cache of session state with a TTL, keyed by session_id.
+    Write-through: callers write to the database and then update() the cache with the same
+    values, so a cached entry always matches the last committed row.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0 and self.ttl > 0
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        state = self._entries.get(session_id)
+        if state is None or state.expires_at < time.monotonic():
+            if state is not None:
+                del self._entries[session_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return state
+
+    def update(self, session_id: str, unclear_message_count: int, guidance_stage: str, has_ticket: bool = None):
+        """Store the values just written to the database (has_ticket=None keeps the cached flag)"""
+        if not self.enabled:
+            return
+        state = self._entries.get(session_id)
+        if state is None:
+            state = self._entries[session_id] = SessionState()
+        state.unclear_message_count = unclear_message_count
+        state.guidance_stage = guidance_stage
+        if has_ticket is not None:
+            state.has_ticket = has_ticket
+        state.expires_at = time.monotonic() + self.ttl
+        self._entries.move_to_end(session_id)
+
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: str = None):
+        if session_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(session_id, None)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+def create_session_cache(multi_worker: bool = False) -> SessionStateCache:
+    """
+    Configure from SESSION_CACHE_SIZE / SESSION_CACHE_TTL. Disabled by default with several
+    workers, since a session's turns may land on different workers and the cache is per process.
+    """
+    default_ttl = "0" if multi_worker else "1800"
+    return SessionStateCache(
+        max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("SESSION_CACHE_TTL", default_ttl))
+    )
@@ -0,0 +1,57 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+
+def _count_shard(args):
+    """Process pool worker: tokenize one shard into a term-count matrix"""
+    hashing, docs = args
+    return hashing.transform(docs)
+
+
+class ShardedTfidfVectorizer:
+    """
+    TF-IDF vectorizer for large KBs whose fit is spread across CPU cores.
+    Uses a stateless HashingVectorizer, so shards need no shared vocabulary: each worker
+    counts terms for its shard, the shards are stacked into one CSR matrix and IDF is fit once.
+    Drop-in for TfidfVectorizer's fit_transform / transform.
+    """
+
+    def __init__(self, lowercase: bool = True, stop_words=None, n_features: int = 2 ** 20,
+                 workers: int = 0, min_shard_size: int = 1000):
+        self.hashing = HashingVectorizer(
+            lowercase=lowercase,
+            stop_words=stop_words,
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None
+        )
+        self.tfidf = TfidfTransformer()
+        self.workers = workers or os.cpu_count() or 1
+        self.min_shard_size = min_shard_size
+
+    def _shards(self, docs: List[str]) -> List[List[str]]:
+        # A few shards per worker keeps cores busy when shards take uneven time
+        shard_size = max(self.min_shard_size, math.ceil(len(docs) / (self.workers * 4)))
+        return [docs[start:start + shard_size] for start in range(0, len(docs), shard_size)]
+
+    def count(self, docs: List[str]) -> sparse.csr_matrix:
+        """Term counts for all docs, computed shard by shard in a process pool"""
+        shards = self._shards(list(docs))
+        if self.workers > 1 and len(shards) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(shards))) as pool:
+                counts = list(pool.map(_count_shard, [(self.hashing, shard) for shard in shards]))
+        else:
+            counts = [self.hashing.transform(shard) for shard in shards]
+        if not counts:
+            return sparse.csr_matrix((0, self.hashing.n_features))
+        return sparse.vstack(counts, format='csr')
+
+    def fit_transform(self, docs: List[str]) -> sparse.csr_matrix:
+        return self.tfidf.fit_transform(self.count(docs))
+
+    def transform(self, docs: List[str]) -> sparse.csr_matrix:
+        return self.tfidf.transform(self.hashing.transform(docs))
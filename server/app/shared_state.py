@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Any
+
+try:
+    import fcntl
+except ImportError:  # Windows - single worker only
+    fcntl = None
+
+# Shared directory for cross-worker state and index caches
+STATE_DIR = os.getenv("FAQ_STATE_DIR", str(Path(__file__).parent.parent / ".state"))
+
+
+def multi_worker_enabled() -> bool:
+    """True when running several worker processes (set by run.py --workers, or manually for gunicorn)"""
+    return os.getenv("FAQ_MULTI_WORKER", "").lower() in ("1", "true", "yes")
+
+
+class FileLock:
+    """Exclusive inter-process lock on a lock file (no-op where fcntl is unavailable)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+class SharedState:
+    """
+    Small JSON state file shared by all worker processes (active KB, reload requests, calibrated thresholds).
+    Writers update it under a file lock and replace it atomically; every worker polls it
+    and applies changes published by the others.
+    """
+
+    def __init__(self, state_dir: str = STATE_DIR):
+        self.path = os.path.join(state_dir, "active_state.json")
+        self.lock_path = os.path.join(state_dir, "active_state.lock")
+        self._state = self.read()
+        self._handlers = []
+        self._poll_thread = None
+        self._poll_stop = threading.Event()
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        return self._state
+
+    def read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"generation": 0}
+
+    def _update(self, mutate: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        with FileLock(self.lock_path):
+            state = self.read()
+            mutate(state)
+            state["generation"] = state.get("generation", 0) + 1
+            state["updated_at"] = time.time()
+            state["updated_by"] = os.getpid()
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+        # This worker already applied the change itself
+        self._state = state
+        return state
+
+    def publish_active_kb(self, kb_name: str) -> Dict[str, Any]:
+        return self._update(lambda state: state.update(active_kb=kb_name))
+
+    def request_reload(self) -> Dict[str, Any]:
+        return self._update(lambda state: state.update(reload_generation=state.get("reload_generation", 0) + 1))
+
+    def request_threshold_reload(self) -> Dict[str, Any]:
+        return self._update(lambda state: state.update(thresholds_generation=state.get("thresholds_generation", 0) + 1))
+
+    def on_change(self, handler: Callable[[Dict[str, Any], Dict[str, Any]], None]):
+        """Call handler(old_state, new_state) when another worker publishes a change"""
+        self._handlers.append(handler)
+
+    def poll(self):
+        state = self.read()
+        if state.get("generation", 0) <= self._state.get("generation", 0):
+            return
+        old, self._state = self._state, state
+        for handler in self._handlers:
+            try:
+                handler(old, state)
+            except Exception as e:
+                print(f"Error applying shared state change: {e}")
+
+    def start_polling(self, interval: float = 1.0):
+        if self._poll_thread is not None:
+            return
+        self._poll_stop.clear()
+        self._poll_thread = threading.Thread(target=self._poll_loop, args=(interval,), name="shared-state", daemon=True)
+        self._poll_thread.start()
+
+    def stop_polling(self):
+        self._poll_stop.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join()
+            self._poll_thread = None
+
+    def _poll_loop(self, interval: float):
+        while not self._poll_stop.wait(interval):
+            self.poll()
@@ -0,0 +1,264 @@
+import os
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ChatMessage, Ticket
+from shared_state import STATE_DIR
+
+# Outcome labels of a scored message
+GOOD, BAD, UNKNOWN = 1, 0, -1
+
+
+def thresholds_path() -> str:
+    return os.getenv("KB_THRESHOLDS_FILE", os.path.join(STATE_DIR, "kb_thresholds.json"))
+
+
+def calibration_key(kb_name: Optional[str], retrieval_mode: str) -> str:
+    """TF-IDF and dense scores live on different scales, so each mode is calibrated on its own"""
+    return f"{kb_name or 'primary'}:{retrieval_mode}"
+
+
+def load_thresholds(path: str = None) -> Dict[str, dict]:
+    try:
+        with open(path or thresholds_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_thresholds(key: str, report: 'CalibrationReport', path: str = None):
+    """Store a calibration under its KB key, keeping the other KBs' entries"""
+    path = path or thresholds_path()
+    entries = load_thresholds(path)
+    entries[key] = {
+        "threshold": report.threshold,
+        "questions": report.question_thresholds,
+        "calibrated_at": datetime.now().isoformat(timespec='seconds'),
+        "samples": report.samples,
+        "target_precision": report.target_precision
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def parse_labeled_records(lines: Iterable[str]) -> Tuple[List[dict], List[str]]:
+    """JSONL records {"message", "expected": KB question or null}; returns (records, issues)"""
+    records, issues = [], []
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            issues.append(f"line {line_number}: invalid JSON ({e.msg})")
+            continue
+        if not isinstance(record, dict) or not (record.get('message') or record.get('question')):
+            issues.append(f"line {line_number}: missing message")
+            continue
+        if 'expected' not in record:
+            issues.append(f"line {line_number}: missing expected (use null for questions the KB should not answer)")
+            continue
+        records.append(record)
+    return records, issues
+
+
+async def fetch_chat_outcomes(db: AsyncSession, limit: int = None) -> List[Tuple[str, bool, bool]]:
+    """
+    (message, answered from KB, escalated) for logged chat turns, oldest first.
+    A turn counts as escalated when a ticket was created for it or for the next message of its session.
+    """
+    query = select(ChatMessage.session_id, ChatMessage.message, ChatMessage.is_from_kb).order_by(ChatMessage.id.desc())
+    if limit:
+        query = query.limit(limit)
+    rows = list(reversed((await db.execute(query)).all()))
+    ticket_rows = await db.execute(select(Ticket.session_id, Ticket.user_question))
+    tickets = {(session_id, question) for session_id, question in ticket_rows.all()}
+
+    outcomes = []
+    for i, (session_id, message, is_from_kb) in enumerate(rows):
+        escalated = (session_id, message) in tickets
+        if not escalated and i + 1 < len(rows) and rows[i + 1][0] == session_id:
+            escalated = (session_id, rows[i + 1][1]) in tickets
+        outcomes.append((message, bool(is_from_kb), escalated))
+    return outcomes
+
+
+def fit_threshold(scores: np.ndarray, labels: np.ndarray, target_precision: float) -> Optional[float]:
+    """
+    Lowest threshold whose KB answers reach target_precision on the labeled samples.
+    The threshold always sits on a good sample's score: without evidence below it, it is never lowered.
+    Returns None when no threshold reaches the target.
+    """
+    labeled = labels != UNKNOWN
+    scores, labels = scores[labeled], labels[labeled]
+    if not len(scores):
+        return None
+    # Highest score first; among equal scores the good ones last, so a tie group ends on a good sample
+    order = np.lexsort((labels, -scores))
+    scores, good = scores[order], labels[order] == GOOD
+    precision = np.cumsum(good) / np.arange(1, len(scores) + 1)
+    group_end = np.append(scores[1:] != scores[:-1], True)
+    valid = np.flatnonzero(group_end & good & (precision >= target_precision) & (scores > 0))
+    if not len(valid):
+        return None
+    return round(float(scores[valid[-1]]), 4)
+
+
+class CalibrationReport:
+    """A fitted threshold, the evidence behind it and its expected effect on the logged traffic"""
+
+    def __init__(self, current_threshold: float, threshold: float, target_precision: float, samples: dict,
+                 precision: dict, kb_answers: dict, question_thresholds: Dict[str, float] = None,
+                 notes: List[str] = None):
+        self.current_threshold = current_threshold
+        self.threshold = threshold
+        self.target_precision = target_precision
+        self.samples = samples
+        self.precision = precision
+        self.kb_answers = kb_answers
+        self.question_thresholds = question_thresholds or {}
+        self.notes = notes or []
+
+    @property
+    def fallback_reduction(self) -> int:
+        """Turns that would get a KB answer instead of the no-match LLM reply"""
+        return self.kb_answers["calibrated"] - self.kb_answers["current"]
+
+    def to_dict(self) -> dict:
+        total = self.samples["total"]
+        return {
+            "current_threshold": self.current_threshold,
+            "threshold": self.threshold,
+            "target_precision": self.target_precision,
+            "question_thresholds": self.question_thresholds,
+            "samples": self.samples,
+            "precision": self.precision,
+            "kb_answers": self.kb_answers,
+            "fallback_reduction": self.fallback_reduction,
+            "fallback_reduction_rate": round(self.fallback_reduction / total, 4) if total else 0.0,
+            "notes": self.notes
+        }
+
+
+class ThresholdCalibrator:
+    """
+    Fits the KB similarity threshold from outcomes instead of a guessed constant.
+    Samples are scored against the loaded KB with one batched search and labeled:
+      - logged chat turns: a KB answer that was not escalated is good, an escalated turn is bad,
+        anything else (no-match reply, no ticket) is unknown and only counts for the expected effect
+      - labeled records ({"message", "expected": KB question or null}): good when the top match
+        is the expected question, bad otherwise (null = the KB should not answer)
+    Logged turns can only confirm or raise the threshold; lowering it needs labeled records
+    that score below the current threshold.
+    """
+
+    def __init__(self, kb_service, target_precision: float = 0.9, min_samples: int = 20):
+        self.kb_service = kb_service
+        self.target_precision = target_precision
+        self.min_samples = min_samples
+        self._messages: List[str] = []
+        self._labels: List[int] = []
+        self._expected: List[Optional[str]] = []  # expected question of labeled records, '' for logged turns
+
+    def add_history(self, outcomes: Iterable[Tuple[str, bool, bool]]) -> int:
+        count = 0
+        for message, is_from_kb, escalated in outcomes:
+            if not message or not message.strip():
+                continue
+            self._messages.append(message)
+            self._labels.append(BAD if escalated else GOOD if is_from_kb else UNKNOWN)
+            self._expected.append('')
+            count += 1
+        return count
+
+    def add_labeled(self, records: Iterable[dict]) -> int:
+        count = 0
+        for record in records:
+            message = record.get('message') or record.get('question')
+            if not message or not message.strip():
+                continue
+            self._messages.append(message)
+            self._labels.append(UNKNOWN)  # resolved against the top match in fit()
+            self._expected.append(record.get('expected'))
+            count += 1
+        return count
+
+    def _score(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ids, scores = self.kb_service.top_k_many(self._messages, k=1)
+        ids, scores = ids[:, 0], scores[:, 0].astype(np.float64)
+        labels = np.array(self._labels, dtype=np.int8)
+        qa_pairs = self.kb_service.index.qa_pairs
+        for i, expected in enumerate(self._expected):
+            if expected == '':
+                continue
+            if expected is None:
+                labels[i] = BAD
+            else:
+                top = qa_pairs[ids[i]]['question'] if ids[i] >= 0 else None
+                labels[i] = GOOD if top is not None and top.strip().lower() == expected.strip().lower() else BAD
+        return ids, scores, labels
+
+    def fit(self, current_threshold: float = None, per_question: bool = False) -> CalibrationReport:
+        if current_threshold is None:
+            current_threshold = self.kb_service.similarity_threshold
+        notes = []
+        if self._messages:
+            ids, scores, labels = self._score()
+        else:
+            ids, scores, labels = np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int8)
+        labeled = labels != UNKNOWN
+
+        threshold = current_threshold
+        if labeled.sum() < self.min_samples:
+            notes.append(f"Only {int(labeled.sum())} labeled samples (need {self.min_samples}), keeping the current threshold")
+        else:
+            fitted = fit_threshold(scores, labels, self.target_precision)
+            if fitted is None:
+                notes.append(f"No threshold reaches {self.target_precision:.0%} precision, keeping the current threshold")
+            else:
+                threshold = fitted
+                if not (labeled & (labels == GOOD) & (scores < current_threshold)).any():
+                    notes.append("No good samples below the current threshold - add labeled records to consider lowering it")
+
+        question_thresholds = {}
+        thresholds = np.full(len(scores), threshold)
+        if per_question and len(scores):
+            qa_pairs = self.kb_service.index.qa_pairs
+            candidates, counts = np.unique(ids[labeled & (ids >= 0)], return_counts=True)
+            for question_id in candidates[counts >= self.min_samples]:
+                mine = ids == question_id
+                fitted = fit_threshold(scores[mine], labels[mine], self.target_precision)
+                if fitted is not None and fitted != threshold:
+                    question_thresholds[qa_pairs[question_id]['question']] = fitted
+                    thresholds[mine] = fitted
+
+        current_hits = (ids >= 0) & (scores >= current_threshold)
+        new_hits = (ids >= 0) & (scores >= thresholds)
+        return CalibrationReport(
+            current_threshold=current_threshold,
+            threshold=threshold,
+            target_precision=self.target_precision,
+            samples={
+                "total": len(scores),
+                "good": int((labels == GOOD).sum()),
+                "bad": int((labels == BAD).sum()),
+                "unknown": int((labels == UNKNOWN).sum())
+            },
+            precision={"current": self._precision(labels, current_hits), "calibrated": self._precision(labels, new_hits)},
+            kb_answers={"current": int(current_hits.sum()), "calibrated": int(new_hits.sum())},
+            question_thresholds=question_thresholds,
+            notes=notes
+        )
+
+    @staticmethod
+    def _precision(labels: np.ndarray, hits: np.ndarray) -> Optional[float]:
+        judged = hits & (labels != UNKNOWN)
+        if not judged.any():
+            return None
+        return round(float((labels[judged] == GOOD).mean()), 4)
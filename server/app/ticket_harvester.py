@@ -0,0 +1,204 @@
+import os
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy import select, or_, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Ticket
+from vector_index import normalize_rows
+
+# Sample questions kept per cluster for the reviewer
+MAX_SAMPLES = 5
+
+
+class TicketCluster:
+    """A group of closed tickets asking the same thing"""
+
+    def __init__(self, representative: str, questions: List[str] = None, ticket_ids: List[int] = None,
+                 size: int = 0, context: str = None):
+        self.representative = representative
+        self.questions = questions or []
+        self.ticket_ids = ticket_ids or []
+        self.size = size
+        self.context = context
+
+    def add(self, ticket_id: int, question: str, context: str = None):
+        self.size += 1
+        self.ticket_ids.append(ticket_id)
+        if len(self.questions) < MAX_SAMPLES and question not in self.questions:
+            self.questions.append(question)
+        if context and not self.context:
+            self.context = context
+
+    def to_dict(self) -> dict:
+        return {
+            "representative": self.representative,
+            "questions": self.questions,
+            "ticket_ids": self.ticket_ids,
+            "size": self.size,
+            "context": self.context
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TicketCluster':
+        return cls(data["representative"], data.get("questions"), data.get("ticket_ids"), data.get("size", 0), data.get("context"))
+
+
+class HarvestState:
+    """Watermark of the last processed ticket plus the clusters found so far, kept in a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark: Optional[Tuple[str, int]] = None  # (updated_at ISO string, ticket id)
+        self.clusters: List[TicketCluster] = []
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("watermark"):
+                self.watermark = tuple(data["watermark"])
+            self.clusters = [TicketCluster.from_dict(c) for c in data.get("clusters", [])]
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "watermark": list(self.watermark) if self.watermark else None,
+                "clusters": [c.to_dict() for c in self.clusters]
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+async def fetch_closed_tickets(db: AsyncSession, watermark: Optional[Tuple[str, int]], limit: int = None) -> List[Ticket]:
+    """
+    Closed tickets after the watermark, in (updated_at, id) order. Tickets never updated since
+    creation have no updated_at, so created_at stands in for it (as in the watermark itself).
+    """
+    changed_at = func.coalesce(Ticket.updated_at, Ticket.created_at)
+    query = select(Ticket).where(Ticket.status == 'closed')
+    if watermark:
+        updated_at, ticket_id = datetime.fromisoformat(watermark[0]), watermark[1]
+        query = query.where(or_(
+            changed_at > updated_at,
+            and_(changed_at == updated_at, Ticket.id > ticket_id)
+        ))
+    query = query.order_by(changed_at, Ticket.id)
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+class TicketHarvester:
+    """
+    Clusters the questions of closed tickets and proposes one KB candidate per cluster.
+    Runs incrementally: new tickets join the existing clusters from earlier runs or start new ones.
+    Questions the knowledge base already answers are skipped.
+    """
+
+    def __init__(self, kb_service=None, threshold: float = 0.4, embedder=None):
+        self.kb_service = kb_service
+        self.threshold = threshold
+        self.embedder = embedder  # None = TF-IDF similarity
+
+    def _similarities(self, representatives: List[str], questions: List[str]):
+        """Cosine similarity of each new question (rows) to every representative and new question (columns)"""
+        texts = representatives + questions
+        if self.embedder is not None:
+            vectors = normalize_rows(self.embedder.embed(texts))
+        else:
+            try:
+                # Sparse TF-IDF rows are already L2-normalized
+                vectors = TfidfVectorizer(lowercase=True, stop_words='english').fit_transform(texts)
+            except ValueError:  # Nothing but stop words
+                return np.zeros((len(questions), len(texts)), dtype=np.float32)
+        similarities = vectors[len(representatives):] @ vectors.T
+        return similarities.toarray() if hasattr(similarities, 'toarray') else similarities
+
+    def _pick_representative(self, cluster: TicketCluster):
+        """The sample question most similar to the others (medoid) stands for the cluster"""
+        if len(cluster.questions) < 3:
+            return
+        similarities = self._similarities([], cluster.questions)
+        cluster.representative = cluster.questions[int(similarities.sum(axis=1).argmax())]
+
+    def covered(self, questions: List[str]) -> List[bool]:
+        """Whether the KB already answers each question, scored in one batched search"""
+        if self.kb_service is None or not questions:
+            return [False] * len(questions)
+        return [found for _, found, _ in self.kb_service.search_many(questions)]
+
+    def harvest(self, state: HarvestState, tickets: List[Ticket]) -> dict:
+        """
+        Assign tickets to clusters (leader clustering against cluster representatives) and advance the watermark.
+        Clusters whose representative the KB now answers (e.g. an ingested candidate) are retired.
+        """
+        stats = {"tickets": len(tickets), "covered": 0, "new_clusters": 0, "clustered": 0, "retired_clusters": 0}
+        questions = [(ticket, ' '.join((ticket.user_question or '').split())) for ticket in tickets]
+        questions = [(ticket, question) for ticket, question in questions if question]
+        representatives = [c.representative for c in state.clusters]
+        covered = self.covered(representatives + [question for _, question in questions])
+
+        if any(covered[:len(representatives)]):
+            state.clusters = [c for c, done in zip(state.clusters, covered) if not done]
+            stats["retired_clusters"] = len(representatives) - len(state.clusters)
+        pending = []
+        for (ticket, question), done in zip(questions, covered[len(representatives):]):
+            if done:
+                stats["covered"] += 1
+                continue
+            pending.append((ticket, question))
+
+        if pending:
+            clusters = state.clusters
+            similarities = self._similarities([c.representative for c in clusters], [q for _, q in pending])
+            # Column of each cluster's representative in the similarity matrix; new questions follow the representatives
+            offset = len(clusters)
+            columns = list(range(offset))
+            touched = set()
+            for row, (ticket, question) in enumerate(pending):
+                best = None
+                if columns:
+                    scores = similarities[row, columns]
+                    index = int(scores.argmax())
+                    if scores[index] >= self.threshold:
+                        best = index
+                if best is None:
+                    clusters.append(TicketCluster(question))
+                    columns.append(offset + row)
+                    best = len(clusters) - 1
+                    stats["new_clusters"] += 1
+                clusters[best].add(ticket.id, question, ticket.ai_attempted_response)
+                touched.add(best)
+                stats["clustered"] += 1
+            
+            for index in touched:
+                self._pick_representative(clusters[index])
+
+        if tickets:
+            last = tickets[-1]
+            state.watermark = ((last.updated_at or last.created_at).isoformat(), last.id)
+        return stats
+
+
+def write_candidates(path: str, clusters: List[TicketCluster], min_size: int = 2) -> int:
+    """
+    One JSONL line per cluster, largest first. The answer is left empty for the reviewer;
+    once filled in, the file can be loaded with `python ingest_kb.py <file>`.
+    """
+    selected = sorted((c for c in clusters if c.size >= min_size), key=lambda c: c.size, reverse=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for cluster in selected:
+            f.write(json.dumps({
+                "question": cluster.representative,
+                "answer": "",
+                "tickets": cluster.size,
+                "ticket_ids": cluster.ticket_ids[-20:],
+                "similar_questions": cluster.questions,
+                "ai_attempted_response": cluster.context
+            }, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    return len(selected)
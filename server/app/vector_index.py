@@ -0,0 +1,74 @@
+from typing import Tuple
+import numpy as np
+
+# Rows scored per block, bounds temporary memory when scoring int8 matrices
+BLOCK_ROWS = 65536
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows into a contiguous float32 matrix (zero rows stay zero)"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of a 2-D score matrix, best first. Returns (indices, scores)"""
+    k = min(k, scores.shape[1])
+    if k == scores.shape[1]:
+        candidates = np.broadcast_to(np.arange(k), scores.shape).copy()
+    else:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class DenseIndex:
+    """
+    Exact cosine-similarity index over a contiguous float32 matrix,
+    optionally stored as int8 with a per-row scale (4x smaller).
+    """
+
+    def __init__(self, vectors: np.ndarray, quantize: bool = False):
+        vectors = normalize_rows(vectors)
+        self.dim = vectors.shape[1]
+        self.quantized = quantize
+        if quantize:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.matrix = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            self.matrix = vectors
+            self.scales = None
+
+    @classmethod
+    def from_arrays(cls, matrix: np.ndarray, scales: np.ndarray = None) -> 'DenseIndex':
+        """Wrap already-normalized (possibly memory-mapped) arrays without copying them"""
+        index = cls.__new__(cls)
+        index.matrix = matrix
+        index.scales = scales
+        index.quantized = scales is not None
+        index.dim = matrix.shape[1]
+        return index
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query row against every indexed vector (m x n)"""
+        queries = normalize_rows(np.atleast_2d(queries))
+        if not self.quantized:
+            return queries @ self.matrix.T
+
+        result = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.matrix[start:start + BLOCK_ROWS].astype(np.float32)
+            result[:, start:start + BLOCK_ROWS] = (queries @ block.T) * self.scales[start:start + BLOCK_ROWS]
+        return result
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched top-k search. Returns (indices, scores), each of shape (m, k)"""
+        return top_k(self.scores(queries), k)
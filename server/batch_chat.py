@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Answer a file of questions in bulk, for offline evaluation or replaying traffic
+
+Usage:
+    python batch_chat.py questions.jsonl --output answers.jsonl
+    python batch_chat.py questions.txt --format text --retrieval-only
+    cat replay.jsonl | python batch_chat.py - --api http://localhost:8000 --persist
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+# Add app directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    if path.endswith('.txt'):
+        return 'text'
+    return 'jsonl'
+
+
+def run_via_api(api_url: str, data: bytes, fmt: str, args, out):
+    """Stream the batch through a running server; result lines are written as they arrive"""
+    params = {
+        'format': fmt,
+        'dry_run': str(not args.persist).lower(),
+        'concurrency': args.concurrency,
+        'retrieval_only': str(args.retrieval_only).lower()
+    }
+    if args.user_contact:
+        params['user_contact'] = args.user_contact
+    url = f"{api_url.rstrip('/')}/chat/batch?{urllib.parse.urlencode(params)}"
+    request = urllib.request.Request(url, data=data, method='POST', headers={'Content-Type': 'text/plain; charset=utf-8'})
+    summary = None
+    with urllib.request.urlopen(request) as response:
+        for line in response:
+            record = json.loads(line)
+            if 'summary' in record:
+                summary = record['summary']
+            else:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return summary
+
+
+async def run_locally(data: bytes, fmt: str, args, out) -> dict:
+    """Answer with this process's KB and LLM backends; nothing is saved to the database"""
+    from knowledge_base_service import KnowledgeBaseService
+    from ai_service import AIService
+    from chat_batch import BatchChatRunner, parse_batch
+
+    items, issues = parse_batch(data.decode('utf-8-sig').splitlines(), fmt)
+    runner = BatchChatRunner(KnowledgeBaseService(args.kb), AIService(),
+                             concurrency=args.concurrency, retrieval_only=args.retrieval_only)
+    runner.summary.issues = issues
+    async for result in runner.run(items):
+        out.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+    summary = runner.summary.to_dict()
+    summary['dry_run'] = True
+    return summary
+
+
+def print_summary(summary: dict):
+    mode = "Dry run" if summary['dry_run'] else "Replay"
+    print(f"{mode}: {summary['items']} messages in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['items_per_second']}/s, KB search {summary['kb_seconds']:.2f}s) - "
+          f"{summary['kb_hits']} KB hits, {summary['tickets']} tickets, {summary['unclear']} unclear, "
+          f"{summary['errors']} errors", file=sys.stderr)
+    for issue in summary['issues']:
+        print(f"  skipped {issue}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer many chat messages at once (JSON lines out)")
+    parser.add_argument("file", help="JSONL ({\"message\", \"id\", \"session\"}) or text file, one message per line ('-' for stdin)")
+    parser.add_argument("--format", choices=['jsonl', 'text'], help="Input format (default: from the file extension)")
+    parser.add_argument("--output", "-o", help="Write results here instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=8, help="Messages answered in parallel (default: 8)")
+    parser.add_argument("--retrieval-only", action="store_true", help="Only run the KB search, no LLM calls")
+    parser.add_argument("--persist", action="store_true", help="Save sessions, messages and tickets (needs --api)")
+    parser.add_argument("--user-contact", help="Contact recorded on persisted sessions and tickets")
+    parser.add_argument("--kb", help="Knowledge base name (default: primary)")
+    parser.add_argument("--api", help="Run through a running server, e.g. http://localhost:8000")
+    args = parser.parse_args()
+
+    if args.persist and not args.api:
+        parser.error("--persist needs --api; local runs never write to the database")
+
+    fmt = detect_format(args.file, args.format)
+    if args.file == '-':
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.file, 'rb') as f:
+            data = f.read()
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.api:
+            summary = run_via_api(args.api, data, fmt, args, out)
+        else:
+            summary = asyncio.run(run_locally(data, fmt, args, out))
+    finally:
+        if args.output:
+            out.close()
+
+    if summary:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Calibrate the KB similarity threshold from logged chat outcomes and/or a labeled set
+
+Scores the logged /chat turns (and labeled records {"message", "expected": KB question or null})
+against the knowledge base, fits the lowest threshold that keeps KB answers at the target
+precision, and reports how many turns would get a KB answer instead of the no-match LLM reply.
+Nothing changes unless --apply is given.
+
+Usage:
+    python calibrate_threshold.py
+    python calibrate_threshold.py --labeled eval.jsonl --per-question --apply
+    python calibrate_threshold.py --target-precision 0.95 --api http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+# Add app directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def calibrate_via_api(api_url: str, data: bytes, args) -> dict:
+    """Calibrate on a running server's log; with --apply every worker switches to the new thresholds"""
+    params = {
+        'target_precision': args.target_precision,
+        'min_samples': args.min_samples,
+        'per_question': str(args.per_question).lower(),
+        'apply': str(args.apply).lower()
+    }
+    if args.limit:
+        params['limit'] = args.limit
+    url = f"{api_url.rstrip('/')}/knowledge-base/calibrate?{urllib.parse.urlencode(params)}"
+    request = urllib.request.Request(url, data=data, method='POST', headers={'Content-Type': 'application/x-ndjson'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+async def calibrate_locally(data: bytes, args) -> dict:
+    """Read the chat log from the database; --apply writes the thresholds file (servers load it on /config/reload)"""
+    from database import AsyncSessionLocal, engine
+    from knowledge_base_service import KnowledgeBaseService
+    from threshold_calibration import (
+        ThresholdCalibrator, calibration_key, fetch_chat_outcomes, parse_labeled_records, save_thresholds
+    )
+
+    kb_service = KnowledgeBaseService(args.kb)
+    records, issues = parse_labeled_records(data.decode('utf-8-sig').splitlines())
+    outcomes = []
+    if not args.no_history:
+        async with AsyncSessionLocal() as db:
+            outcomes = await fetch_chat_outcomes(db, args.limit)
+        await engine.dispose()
+
+    calibrator = ThresholdCalibrator(kb_service, target_precision=args.target_precision, min_samples=args.min_samples)
+    calibrator.add_history(outcomes)
+    calibrator.add_labeled(records)
+    report = calibrator.fit(per_question=args.per_question)
+    if args.apply:
+        save_thresholds(calibration_key(kb_service.kb_name, kb_service.retrieval_mode), report)
+    return {**report.to_dict(), "applied": args.apply, "issues": issues}
+
+
+def print_report(report: dict):
+    samples, kb_answers = report['samples'], report['kb_answers']
+
+    def precision(value):
+        return "n/a" if value is None else f"{value:.1%}"
+
+    print(f"Samples: {samples['total']} ({samples['good']} good, {samples['bad']} bad, {samples['unknown']} unlabeled)")
+    print(f"Threshold: {report['current_threshold']} -> {report['threshold']} "
+          f"(target precision {report['target_precision']:.0%})")
+    if report['question_thresholds']:
+        print(f"Per-question thresholds: {len(report['question_thresholds'])}")
+    print(f"KB answers: {kb_answers['current']} -> {kb_answers['calibrated']}, "
+          f"precision {precision(report['precision']['current'])} -> {precision(report['precision']['calibrated'])}")
+    print(f"Expected no-match LLM replies avoided: {report['fallback_reduction']} "
+          f"({report['fallback_reduction_rate']:.1%} of turns)")
+    for note in report['notes']:
+        print(f"⚠️  {note}")
+    for issue in report['issues'][:20]:
+        print(f"  - {issue}")
+    if report['applied']:
+        print("✅ Calibrated thresholds applied")
+    else:
+        print("Dry run - use --apply to store the calibrated thresholds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the KB similarity threshold from chat outcomes")
+    parser.add_argument("--labeled", help="JSONL file of {\"message\", \"expected\"} records ('-' for stdin)")
+    parser.add_argument("--target-precision", type=float, default=0.9, help="Share of KB answers that must be right (0-1)")
+    parser.add_argument("--min-samples", type=int, default=20, help="Labeled samples needed to fit a threshold")
+    parser.add_argument("--per-question", action="store_true", help="Also fit thresholds for individual KB questions")
+    parser.add_argument("--limit", type=int, help="Only use the most recent N chat turns")
+    parser.add_argument("--no-history", action="store_true", help="Ignore the chat log, use only --labeled (local mode)")
+    parser.add_argument("--apply", action="store_true", help="Store the calibrated thresholds")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("--kb", help="Knowledge base to calibrate (default: primary)")
+    parser.add_argument("--api", help="Calibrate on a running server instead, e.g. http://localhost:8000")
+    args = parser.parse_args()
+
+    data = b""
+    if args.labeled == '-':
+        data = sys.stdin.buffer.read()
+    elif args.labeled:
+        with open(args.labeled, 'rb') as f:
+            data = f.read()
+
+    report = calibrate_via_api(args.api, data, args) if args.api else asyncio.run(calibrate_locally(data, args))
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate questions in a knowledge base and write a compacted copy
+
+Usage:
+    python compact_kb.py                       # Report duplicate groups only
+    python compact_kb.py --output compacted.txt
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add app directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from knowledge_base_service import KnowledgeBaseService
+from kb_dedup import NearDuplicateFinder, compact, write_kb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect near-duplicate KB questions and emit a compacted KB")
+    parser.add_argument("--kb", help="Knowledge base name (default: primary)")
+    parser.add_argument("--threshold", type=float, default=0.8, help="TF-IDF cosine for two questions to count as duplicates")
+    parser.add_argument("--num-perm", type=int, default=64, help="MinHash permutations")
+    parser.add_argument("--bands", type=int, default=16, help="LSH bands (more bands = more candidate pairs)")
+    parser.add_argument("--output", help="Write the compacted KB here (.txt, .md or .jsonl)")
+    parser.add_argument("--merge-differing", action="store_true", help="Also merge groups whose answers differ (review them first)")
+    parser.add_argument("--json", action="store_true", help="Print the duplicate groups as JSON")
+    args = parser.parse_args()
+
+    kb_service = KnowledgeBaseService(args.kb)
+    qa_pairs = kb_service.qa_pairs
+    groups = NearDuplicateFinder(args.threshold, args.num_perm, args.bands).find(qa_pairs)
+
+    if args.json:
+        print(json.dumps([group.to_dict() for group in groups], indent=2, ensure_ascii=False))
+    else:
+        for group in groups:
+            flag = " (answers differ)" if group.answers_differ else ""
+            print(f"\nKeep: {group.keep['question']}{flag}")
+            for duplicate in group.merge:
+                print(f"  merge [{duplicate['similarity']:.2f}] {duplicate['question']}")
+        print(f"\n{len(groups)} duplicate groups, {sum(len(g.merge) for g in groups)} of {len(qa_pairs)} questions can be merged")
+
+    if args.output:
+        compacted = compact(qa_pairs, groups, merge_differing=args.merge_differing)
+        write_kb(args.output, compacted)
+        print(f"✅ Wrote {len(compacted)} Q&A pairs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Harvest closed tickets into knowledge base candidates
+
+Clusters the questions of tickets closed since the last run and writes one candidate per
+cluster (largest first) to a JSONL file. Fill in the answers, then load them with ingest_kb.py.
+
+Usage:
+    python harvest_tickets.py
+    python harvest_tickets.py --min-size 3 --output kb_candidates.jsonl
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add app directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import AsyncSessionLocal, engine
+from shared_state import STATE_DIR
+from ticket_harvester import HarvestState, TicketHarvester, fetch_closed_tickets, write_candidates
+
+
+async def harvest(args):
+    from config_loader import config
+    from knowledge_base_service import KnowledgeBaseService
+    from embedding_service import create_embedder
+
+    state = HarvestState(args.state)
+    kb_service = None if args.include_covered else KnowledgeBaseService(args.kb)
+    embedder = create_embedder(config.get_retrieval_settings().get('embeddings', {})) if args.embeddings else None
+    harvester = TicketHarvester(kb_service, threshold=args.threshold, embedder=embedder)
+
+    async with AsyncSessionLocal() as db:
+        tickets = await fetch_closed_tickets(db, None if args.full else state.watermark, args.limit)
+    await engine.dispose()
+
+    if args.full:
+        state.clusters = []
+    stats = harvester.harvest(state, tickets)
+    state.save()
+    written = write_candidates(args.output, state.clusters, args.min_size)
+
+    print(f"Processed {stats['tickets']} closed tickets: {stats['covered']} already answered by the KB, "
+          f"{stats['clustered']} clustered ({stats['new_clusters']} new clusters)")
+    if stats['retired_clusters']:
+        print(f"Retired {stats['retired_clusters']} clusters the KB now answers")
+    print(f"✅ Wrote {written} candidates (clusters with at least {args.min_size} tickets) to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster closed tickets into knowledge base candidates")
+    parser.add_argument("--output", default="kb_candidates.jsonl", help="Candidate JSONL file for review")
+    parser.add_argument("--state", default=os.path.join(STATE_DIR, "ticket_harvest.json"), help="Incremental state file")
+    parser.add_argument("--threshold", type=float, default=0.4, help="Similarity needed to join a cluster (0-1)")
+    parser.add_argument("--min-size", type=int, default=2, help="Only write clusters with at least this many tickets")
+    parser.add_argument("--limit", type=int, help="Process at most this many tickets per run")
+    parser.add_argument("--embeddings", action="store_true", help="Cluster with the configured embedding model instead of TF-IDF")
+    parser.add_argument("--include-covered", action="store_true", help="Keep questions the KB already answers")
+    parser.add_argument("--kb", help="Knowledge base to check coverage against (default: primary)")
+    parser.add_argument("--full", action="store_true", help="Ignore the saved state and re-cluster every closed ticket")
+    args = parser.parse_args()
+
+    asyncio.run(harvest(args))
+
+
+if __name__ == "__main__":
+    main()
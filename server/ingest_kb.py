@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bulk knowledge base ingestion from JSONL or CSV files
+
+Usage:
+    python ingest_kb.py updates.jsonl --dry-run
+    python ingest_kb.py updates.csv --on-duplicate replace
+    cat updates.jsonl | python ingest_kb.py - --format jsonl --api http://localhost:8000
+"""
+
+import argparse
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+# Add app directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def ingest_via_api(api_url: str, data: bytes, fmt: str, args) -> dict:
+    """Send the batch to a running server, which publishes it to all workers"""
+    params = {'format': fmt, 'dry_run': str(args.dry_run).lower()}
+    if args.on_duplicate:
+        params['on_duplicate'] = args.on_duplicate
+    if args.threshold is not None:
+        params['threshold'] = args.threshold
+    url = f"{api_url.rstrip('/')}/knowledge-base/ingest?{urllib.parse.urlencode(params)}"
+    request = urllib.request.Request(url, data=data, method='POST', headers={'Content-Type': 'text/plain; charset=utf-8'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def ingest_locally(data: bytes, fmt: str, args) -> dict:
+    """Write straight to the KB files (a running server picks them up on POST /config/reload)"""
+    from knowledge_base_service import KnowledgeBaseService
+    from kb_ingest import KBIngestor
+
+    kb_service = KnowledgeBaseService(args.kb)
+    ingestor = KBIngestor(kb_service, threshold=args.threshold, on_duplicate=args.on_duplicate)
+    lines = data.decode('utf-8-sig').splitlines(keepends=True)
+    return ingestor.ingest_stream(lines, fmt, dry_run=args.dry_run, source=args.file).to_dict()
+
+
+def print_report(report: dict):
+    summary = report['summary']
+    mode = "Dry run" if report['dry_run'] else "Ingestion"
+    print(f"{mode}: {summary['received']} pairs received, {summary['added']} new, "
+          f"{summary['replaced']} replaced, {summary['unchanged']} unchanged, "
+          f"{summary['collisions']} collisions, {summary['issues']} invalid")
+
+    if report['collisions']:
+        print("\nCollisions:")
+        for collision in report['collisions']:
+            print(f"  [{collision['against']} {collision['similarity']:.2f}] {collision['question']!r} ~ {collision['existing_question']!r}")
+    if report['issues']:
+        print("\nInvalid entries:")
+        for issue in report['issues']:
+            print(f"  {issue}")
+
+    if report['published']:
+        print(f"\n✅ Published to {report['target']}")
+    elif not report['dry_run']:
+        print("\nNothing to publish")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load Q&A pairs into the knowledge base")
+    parser.add_argument("file", help="JSONL or CSV file ('-' for stdin)")
+    parser.add_argument("--format", choices=['jsonl', 'csv'], help="Input format (default: from the file extension)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--on-duplicate", choices=['skip', 'replace'], help="What to do with questions already in the KB")
+    parser.add_argument("--threshold", type=float, help="Near-duplicate similarity threshold (0-1)")
+    parser.add_argument("--kb", help="Knowledge base name (default: primary)")
+    parser.add_argument("--api", help="Ingest through a running server, e.g. http://localhost:8000")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args()
+
+    fmt = detect_format(args.file, args.format)
+    if args.file == '-':
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.file, 'rb') as f:
+            data = f.read()
+
+    report = ingest_via_api(args.api, data, fmt, args) if args.api else ingest_locally(data, fmt, args)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 import uvicorn
+import argparse
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the FAQ system API server")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="Number of worker processes (default: WEB_CONCURRENCY or 1)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Workers share the KB index cache and active KB through server/.state
+        os.environ["FAQ_MULTI_WORKER"] = "1"
+
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=args.workers == 1,
+        workers=args.workers,
         log_level="info"
-    )
\ No newline at end of file
+    )
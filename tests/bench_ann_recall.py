@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+ANN recall@k benchmark - IVF index vs exact search
+
+Usage:
+    python tests/bench_ann_recall.py                       # 200k x 128-dim synthetic vectors
+    python tests/bench_ann_recall.py --n 500000 --k 5 --nprobe 1 4 8 16 32
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from ann_index import IVFIndex
+from vector_index import DenseIndex
+
+
+def synthetic_vectors(n, dim, clusters, seed=0):
+    """Gaussian mixture - FAQ embeddings are strongly clustered by topic"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall@k vs exact search")
+    parser.add_argument("--n", type=int, default=200000, help="Number of indexed vectors")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=500, help="Topics in the synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = auto (4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print(f"🧪 IVF benchmark: n={args.n} dim={args.dim} k={args.k}")
+    vectors = synthetic_vectors(args.n, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.n, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    exact_index = DenseIndex(vectors)
+    exact_ids, _ = exact_index.search(queries, args.k)
+    start = time.perf_counter()
+    for query in queries:
+        exact_index.search(query, args.k)
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors, nlist=args.nlist)
+    print(f"Build: {time.perf_counter() - start:.1f}s (nlist={index.nlist})")
+    print(f"Exact search: {exact_ms:.2f} ms/query")
+    print()
+    print(f"{'nprobe':>6} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        approx_ids = np.vstack([index.search(query, args.k, nprobe=nprobe)[0] for query in queries])
+        ms = (time.perf_counter() - start) * 1000 / args.queries
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx_ids, exact_ids))
+        recall = hits / (args.queries * args.k)
+        print(f"{nprobe:>6} {recall:>10.3f} {ms:>10.2f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for /chat - replays a mix of conversations at fixed concurrency
+against the app (in-process, on a scratch SQLite database) with a stub Ollama server.
+
+Reports throughput, p50/p95/p99 latency and database time per request, and writes the
+results as JSON so runs can be compared for regressions.
+
+Usage:
+    python tests/bench_load.py                                       # 400 requests, concurrency 16
+    python tests/bench_load.py --requests 2000 --concurrency 64 --latency 800 --failure-rate 0.02
+    python tests/bench_load.py --mix kb=0.6,miss=0.2,escalation=0.1,guidance=0.1
+    python tests/bench_load.py --output after.json --compare before.json   # exit 1 on regression
+    python tests/bench_load.py --url http://localhost:8000           # against a running server (no DB time)
+    python tests/bench_load.py --kb-batch-window 2                   # micro-batch concurrent KB searches
+    python tests/bench_load.py --stub-parallel 4 --stub-swap-ms 300 --llm-batching   # LLM micro-batching
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import contextvars
+import subprocess
+import urllib.request
+from collections import Counter, defaultdict
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+STUB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_ollama.py')
+
+MISS_QUESTIONS = [
+    "Can you recommend a good restaurant close to the dealership for lunch?",
+    "What is the population of the largest city in Australia these days?",
+    "Could you explain how photosynthesis works in desert plants?",
+    "Which football team won the championship in the last season?",
+    "Is it going to rain this weekend where the service center is located?",
+    "Please suggest a good book to read while I wait for my appointment",
+]
+ESCALATION_MESSAGES = [
+    "I want to speak to a human representative about my last visit",
+    "Please transfer me to a manager, the repair was not done properly",
+    "Let me talk to customer service right now about my invoice",
+    "I have a complaint about the service and need a supervisor",
+]
+UNCLEAR_MESSAGES = ["hmm", "what?", "not sure", "anything", "idk", "something"]
+GUIDANCE_CHOICES = ["create_ticket", "end_chat"]
+
+SCENARIOS = ('kb', 'miss', 'escalation', 'guidance')
+DEFAULT_MIX = "kb=0.5,miss=0.2,escalation=0.1,guidance=0.2"
+
+# Per-request database time, attributed through the request's context
+_db_time = contextvars.ContextVar("db_time", default=None)
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+def build_conversations(count: int, mix: dict, kb_questions: list, seed: int) -> list:
+    """Conversations (scenario, messages) adding up to roughly `count` requests"""
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    conversations, total = [], 0
+    while total < count:
+        scenario = rng.choices(names, weights)[0]
+        if scenario == 'kb' and kb_questions:
+            question = rng.choice(kb_questions)
+            # Users rarely type the exact KB wording
+            messages = [question.lower().rstrip('?') if rng.random() < 0.5 else question]
+        elif scenario == 'escalation':
+            messages = [rng.choice(ESCALATION_MESSAGES)]
+        elif scenario == 'guidance':
+            # Three unclear messages lead to the ticket / end-chat choice
+            messages = rng.sample(UNCLEAR_MESSAGES, 3) + [rng.choice(GUIDANCE_CHOICES)]
+        else:
+            messages = [rng.choice(MISS_QUESTIONS)]
+        conversations.append((scenario, messages))
+        total += len(messages)
+    return conversations
+
+
+def parse_server_timing(header: str) -> dict:
+    """'kb;dur=1.2, llm;dur=300.5' -> {'kb': 1.2, 'llm': 300.5}"""
+    stages = {}
+    for entry in header.split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur' and name:
+                stages[name] = float(value)
+    return stages
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def latency_summary(latencies: list) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(args) -> tuple:
+    """Run the stub Ollama in its own process so it doesn't compete with the app for the GIL"""
+    port = free_port()
+    command = [sys.executable, STUB_SCRIPT, "--port", str(port), "--latency", str(args.latency),
+               "--jitter", str(args.jitter), "--failure-rate", str(args.failure_rate), "--seed", str(args.seed),
+               "--parallel", str(args.stub_parallel), "--swap-ms", str(args.stub_swap_ms)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/api/tags", timeout=1).close()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Stub Ollama server did not start")
+
+
+def stub_stats(url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{url}/stats", timeout=2) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except OSError:
+        return {}
+
+
+def instrument_engine(engine):
+    """Time every statement; the time is charged to the request that issued it"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        timing = _db_time.get()
+        if timing is not None:
+            timing[0] += elapsed
+            timing[1] += 1
+
+
+async def setup_app(db_path: str):
+    """In-process app on a scratch database, mirroring the production SQLite settings"""
+    from httpx import AsyncClient
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    import main
+    import database
+    import models  # noqa: F401 - registers the tables
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    event.listen(engine.sync_engine, "connect", database._set_sqlite_pragmas)
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+
+    async def override_get_db():
+        async with SessionLocal() as session:
+            yield session
+
+    main.app.dependency_overrides[database.get_db] = override_get_db
+    client = AsyncClient(app=main.app, base_url="http://bench", timeout=120)
+    kb_questions = [qa['question'] for qa in main.kb_service.qa_pairs]
+    return client, engine, kb_questions
+
+
+async def run_load(client, conversations: list, concurrency: int) -> dict:
+    """`concurrency` virtual users, each playing whole conversations in order"""
+    queue = asyncio.Queue()
+    for conversation in conversations:
+        queue.put_nowait(conversation)
+    records = []
+
+    async def send(scenario, message, session_id, turn):
+        timing = [0.0, 0]
+        token = _db_time.set(timing)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={
+                "message": message, "session_id": session_id, "user_contact": "bench@example.com"
+            })
+            ok = response.status_code == 200
+            stages = parse_server_timing(response.headers.get("server-timing", ""))
+            body = response.json() if ok else {"error": f"HTTP {response.status_code}: {response.text[:200]}"}
+        except Exception as e:
+            ok, body, stages = False, {"error": repr(e)}, {}
+        finally:
+            _db_time.reset(token)
+        records.append({
+            "scenario": scenario,
+            "turn": turn,
+            "ok": ok,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "db_ms": timing[0],
+            "queries": timing[1],
+            "stages": stages,
+            "is_from_kb": body.get("is_from_kb", False),
+            "ticket_created": body.get("ticket_created", False),
+            "chat_ended": body.get("chat_ended", False),
+            "error": body.get("error")
+        })
+        return body.get("session_id", session_id)
+
+    async def user():
+        while not queue.empty():
+            scenario, messages = queue.get_nowait()
+            session_id = None
+            for turn, message in enumerate(messages):
+                session_id = await send(scenario, message, session_id, turn)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return {"records": records, "elapsed": time.perf_counter() - start}
+
+
+def summarize(run: dict, measure_db: bool) -> dict:
+    records = run["records"]
+    ok = [r for r in records if r["ok"]]
+    by_scenario = defaultdict(list)
+    for record in ok:
+        by_scenario[record["scenario"]].append(record)
+
+    summary = {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_types": dict(Counter(r["error"] for r in records if not r["ok"]).most_common(5)),
+        "elapsed_s": round(run["elapsed"], 3),
+        "throughput_rps": round(len(ok) / run["elapsed"], 2) if run["elapsed"] else 0.0,
+        "latency": latency_summary([r["latency_ms"] for r in ok]),
+        "outcomes": {
+            "kb_answers": sum(r["is_from_kb"] for r in ok),
+            "tickets": sum(r["ticket_created"] for r in ok),
+            "ended": sum(r["chat_ended"] for r in ok)
+        },
+        "scenarios": {
+            name: {**latency_summary([r["latency_ms"] for r in group]), "kb_answers": sum(r["is_from_kb"] for r in group)}
+            for name, group in sorted(by_scenario.items())
+        }
+    }
+    # Mean time per request in each stage the app reported (Server-Timing)
+    stage_totals = defaultdict(float)
+    for record in ok:
+        for stage, ms in record["stages"].items():
+            stage_totals[stage] += ms
+    if stage_totals:
+        summary["stages_mean_ms"] = {stage: round(total / len(ok), 2) for stage, total in sorted(stage_totals.items())}
+    if measure_db and ok:
+        db_times = sorted(r["db_ms"] for r in ok)
+        summary["db"] = {
+            "mean_ms": round(sum(db_times) / len(db_times), 2),
+            "p95_ms": round(percentile(db_times, 95), 2),
+            "queries_per_request": round(sum(r["queries"] for r in ok) / len(ok), 2),
+            "share_of_latency": round(sum(db_times) / max(sum(r["latency_ms"] for r in ok), 1e-9), 4)
+        }
+    return summary
+
+
+# (metric path, True if higher is better)
+COMPARED_METRICS = [
+    (("throughput_rps",), True),
+    (("latency", "p50_ms"), False),
+    (("latency", "p95_ms"), False),
+    (("latency", "p99_ms"), False),
+    (("db", "mean_ms"), False),
+    (("db", "queries_per_request"), False),
+]
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics that got worse than the baseline by more than `tolerance` (relative)"""
+    regressions = []
+    print()
+    print(f"{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = baseline.get("summary", {}), current["summary"]
+        for key in path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = " ❌" if worse > tolerance else ""
+        name = '.'.join(path)
+        print(f"{name:<28} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{flag}")
+        if worse > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def print_summary(summary: dict):
+    latency = summary["latency"]
+    print(f"Requests: {summary['requests']} ({summary['errors']} errors) in {summary['elapsed_s']:.1f}s")
+    for error, count in summary["error_types"].items():
+        print(f"  ❌ {count}x {error}")
+    print(f"Throughput: {summary['throughput_rps']:.1f} req/s")
+    print(f"Latency: p50 {latency['p50_ms']:.1f}ms  p95 {latency['p95_ms']:.1f}ms  "
+          f"p99 {latency['p99_ms']:.1f}ms  max {latency['max_ms']:.1f}ms")
+    if "db" in summary:
+        db = summary["db"]
+        print(f"DB: {db['mean_ms']:.2f}ms/request (p95 {db['p95_ms']:.2f}ms), "
+              f"{db['queries_per_request']:.1f} queries/request, {db['share_of_latency']:.1%} of latency")
+    if "stages_mean_ms" in summary:
+        print("Stages: " + "  ".join(f"{stage} {ms:.1f}ms" for stage, ms in summary["stages_mean_ms"].items()))
+    outcomes = summary["outcomes"]
+    print(f"Outcomes: {outcomes['kb_answers']} KB answers, {outcomes['tickets']} tickets, {outcomes['ended']} ended chats")
+    print()
+    print(f"{'scenario':<12} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in summary["scenarios"].items():
+        print(f"{name:<12} {stats['count']:>8} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    if args.url:
+        from httpx import AsyncClient
+        client, engine = AsyncClient(base_url=args.url, timeout=120), None
+        kb = (await client.get("/knowledge-base")).json()
+        kb_questions = [qa['question'] for qa in kb.get("qa_pairs", [])]
+    else:
+        client, engine, kb_questions = await setup_app(args.db)
+
+    try:
+        if args.warmup:
+            await run_load(client, build_conversations(args.warmup, mix, kb_questions, args.seed + 1), args.concurrency)
+        conversations = build_conversations(args.requests, mix, kb_questions, args.seed)
+        result = await run_load(client, conversations, args.concurrency)
+    finally:
+        await client.aclose()
+        if engine is not None:
+            await engine.dispose()
+
+    return {
+        "summary": summarize(result, measure_db=engine is not None),
+        "scenario_counts": dict(Counter(scenario for scenario, _ in conversations))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /chat load benchmark with a stub Ollama")
+    parser.add_argument("--requests", type=int, default=400, help="Measured /chat requests (whole conversations)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights: kb, miss, escalation, guidance")
+    parser.add_argument("--latency", type=float, default=300.0, help="Stub generate latency (ms)")
+    parser.add_argument("--jitter", type=float, default=100.0, help="Stub latency jitter (ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of stub requests that fail")
+    parser.add_argument("--stub-parallel", type=int, default=0, help="Stub parallel slots, like OLLAMA_NUM_PARALLEL (0 = unlimited)")
+    parser.add_argument("--stub-swap-ms", type=float, default=0.0, help="Stub model swap delay (ms)")
+    parser.add_argument("--ollama-url", help="Use this Ollama (or stub) instead of starting one")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--db", help="Scratch SQLite file (default: a temp file)")
+    parser.add_argument("--kb-batch-window", type=float, default=0.0, help="KB_BATCH_WINDOW_MS for the in-process app")
+    parser.add_argument("--llm-batching", action="store_true", help="LLM_BATCHING=1 for the in-process app")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression (default 10%%)")
+    args = parser.parse_args()
+
+    stub = None
+    ollama_url = args.ollama_url
+    if not args.url and not ollama_url:
+        stub, ollama_url = start_stub(args)
+    if ollama_url:
+        # Must be set before the app (and its LLM router) is imported
+        os.environ["OLLAMA_BACKENDS"] = ollama_url
+    os.environ.setdefault("CONFIG_WATCH_INTERVAL", "0")
+    if args.kb_batch_window:
+        os.environ["KB_BATCH_WINDOW_MS"] = str(args.kb_batch_window)
+    if args.llm_batching:
+        os.environ["LLM_BATCHING"] = "1"
+
+    scratch = None
+    if not args.url and not args.db:
+        scratch = tempfile.TemporaryDirectory()
+        args.db = os.path.join(scratch.name, "bench.db")
+
+    print(f"🧪 Load benchmark: {args.requests} requests, concurrency {args.concurrency}, mix {args.mix}")
+    if stub:
+        print(f"Stub Ollama: {ollama_url} (latency {args.latency:.0f}±{args.jitter:.0f}ms, "
+              f"failure rate {args.failure_rate:.0%})")
+    try:
+        results = asyncio.run(run(args))
+        if ollama_url:
+            results["ollama_calls"] = stub_stats(ollama_url)
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait()
+        if scratch:
+            scratch.cleanup()
+
+    results["config"] = {
+        key: getattr(args, key) for key in
+        ("requests", "concurrency", "mix", "latency", "jitter", "failure_rate", "stub_parallel", "stub_swap_ms",
+         "kb_batch_window", "llm_batching", "seed")
+    }
+    results["config"]["target"] = args.url or "in-process"
+    results["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    print()
+    print_summary(results["summary"])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark and regression guard for KnowledgeBaseService
+
+Synthesizes automotive FAQ knowledge bases of growing size, then measures index build time,
+index memory, per-query latency, query throughput and top-1/top-k accuracy on labelled
+paraphrased queries (plus the false-match rate on off-topic queries). Exits with status 1
+when a result crosses its limit, so it can gate retrieval changes.
+
+Usage:
+    python tests/bench_retrieval.py                                   # 1k, 10k, 100k and 1M pairs
+    python tests/bench_retrieval.py --sizes 1000 10000 --queries 200  # quick run
+    python tests/bench_retrieval.py --mode hybrid                     # offline hashing embeddings
+    python tests/bench_retrieval.py --output results.json --limits my_limits.json
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from knowledge_base_service import KnowledgeBaseService
+
+# Slots for the synthetic questions - about 1.1M distinct combinations
+TEMPLATES = [
+    "How do I {action} the {part} on a {year} {make} {model}?",
+    "How much does it cost to {action} the {part} of a {make} {model} from {year}?",
+    "When should I {action} the {part} in my {year} {make} {model}?",
+]
+ACTIONS = ["replace", "inspect", "clean", "repair", "adjust", "lubricate",
+           "calibrate", "reset", "test", "upgrade", "flush", "tighten"]
+PARTS = ["brake pads", "air filter", "cabin filter", "spark plugs", "timing belt", "battery",
+         "wiper blades", "coolant", "transmission fluid", "alternator", "fuel pump", "headlights",
+         "tire sensors", "serpentine belt", "oxygen sensor", "radiator", "starter motor", "clutch",
+         "shock absorbers", "wheel bearings", "catalytic converter", "thermostat", "power steering",
+         "cruise control", "infotainment screen"]
+VEHICLES = [("toyota", ["camry", "corolla", "rav4", "highlander"]), ("honda", ["civic", "accord", "pilot", "odyssey"]),
+            ("ford", ["focus", "fusion", "explorer", "mustang"]), ("chevrolet", ["malibu", "equinox", "tahoe", "silverado"]),
+            ("nissan", ["altima", "sentra", "rogue", "murano"]), ("hyundai", ["elantra", "sonata", "tucson", "kona"]),
+            ("kia", ["optima", "sorento", "soul", "sportage"]), ("subaru", ["outback", "forester", "impreza", "legacy"]),
+            ("mazda", ["miata", "cx5", "cx9", "mazda3"]), ("volkswagen", ["jetta", "passat", "tiguan", "golf"]),
+            ("bmw", ["x3", "x5", "m3", "i4"]), ("audi", ["a4", "a6", "q5", "q7"])]
+MODELS = [(make, model) for make, models in VEHICLES for model in models]
+YEARS = [str(year) for year in range(2000, 2025)]
+SYNONYMS = {"replace": "swap", "inspect": "check", "repair": "fix", "clean": "wash", "test": "diagnose"}
+
+OFF_TOPIC = [
+    "What is the capital city of Portugal?",
+    "Can you recommend a good pasta recipe for dinner tonight?",
+    "Who won the world chess championship last year?",
+    "How do I reset my email password?",
+    "What time does the museum open on Sundays?",
+    "Explain the rules of cricket to a beginner",
+    "Is it safe to travel to the mountains in winter?",
+    "Which programming language should I learn first?",
+]
+
+# Limits per KB size (TF-IDF mode); results past a limit fail the run. Build/latency limits leave room for slower machines.
+DEFAULT_LIMITS = {
+    "1000": {"min_top1": 0.95, "min_topk": 0.98, "max_false_match": 0.1, "max_p95_ms": 5, "max_build_s": 5},
+    "10000": {"min_top1": 0.95, "min_topk": 0.98, "max_false_match": 0.1, "max_p95_ms": 15, "max_build_s": 10},
+    "100000": {"min_top1": 0.90, "min_topk": 0.97, "max_false_match": 0.1, "max_p95_ms": 100, "max_build_s": 30},
+    "1000000": {"min_top1": 0.80, "min_topk": 0.88, "max_false_match": 0.1, "max_p95_ms": 1000, "max_build_s": 120},
+}
+
+
+def combination(i: int) -> dict:
+    """The i-th slot combination (mixed-radix decoding), so any subset is distinct and reproducible"""
+    i, year = divmod(i, len(YEARS))
+    i, vehicle = divmod(i, len(MODELS))
+    i, part = divmod(i, len(PARTS))
+    template, action = divmod(i, len(ACTIONS))
+    make, model = MODELS[vehicle]
+    return {"template": template, "action": ACTIONS[action], "part": PARTS[part],
+            "make": make, "model": model, "year": YEARS[year]}
+
+
+def total_combinations() -> int:
+    return len(TEMPLATES) * len(ACTIONS) * len(PARTS) * len(MODELS) * len(YEARS)
+
+
+def render_pair(slots: dict) -> dict:
+    question = TEMPLATES[slots["template"]].format(**{**slots, "make": slots["make"].title(), "model": slots["model"].title()})
+    answer = (f"For the {slots['year']} {slots['make'].title()} {slots['model'].title()}, "
+              f"{slots['action']} the {slots['part']} following the service manual schedule.")
+    return {"question": question, "answer": answer}
+
+
+def paraphrase(slots: dict, rng: random.Random) -> str:
+    """How a user would actually type it: other wording, word order, maybe a synonym"""
+    action = SYNONYMS.get(slots["action"], slots["action"]) if rng.random() < 0.3 else slots["action"]
+    forms = [
+        f"{action} {slots['part']} {slots['make']} {slots['model']} {slots['year']}",
+        f"need to {action} my {slots['part']}, it's a {slots['year']} {slots['model']}",
+        f"{slots['make']} {slots['model']} {slots['year']} {slots['part']} {action} how",
+    ]
+    return rng.choice(forms)
+
+
+def synthesize(size: int, path: str, queries: int, seed: int):
+    """Write a JSONL KB of `size` pairs; returns labelled (query, answer) pairs drawn from it"""
+    rng = random.Random(seed)
+    picks = rng.sample(range(total_combinations()), size)
+    labelled = []
+    query_positions = set(rng.sample(range(size), min(queries, size)))
+    with open(path, 'w', encoding='utf-8') as f:
+        for position, i in enumerate(picks):
+            slots = combination(i)
+            pair = render_pair(slots)
+            f.write(json.dumps(pair) + "\n")
+            if position in query_positions:
+                labelled.append((paraphrase(slots, rng), pair["answer"]))
+    return labelled
+
+
+def index_megabytes(service: KnowledgeBaseService) -> float:
+    matrix = service.tfidf_matrix
+    total = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    dense_index = service.dense_index
+    if dense_index is not None:
+        # DenseIndex keeps one matrix (plus int8 scales); IVF keeps centroids and per-list vectors
+        arrays = [getattr(dense_index, name, None) for name in ("matrix", "scales", "centroids")]
+        arrays += getattr(dense_index, "list_vectors", []) + getattr(dense_index, "list_ids", [])
+        total += sum(array.nbytes for array in arrays if array is not None)
+    return total / 1e6
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def evaluate(service: KnowledgeBaseService, labelled: list, k: int) -> dict:
+    """
+    Latency of search_knowledge_base, throughput of the batched search_many, and
+    top-1 / top-k accuracy of the ranking behind them
+    """
+    latencies, top1, found = [], 0, 0
+    index = service.index
+    answers = [qa['answer'] for qa in index.qa_pairs]
+
+    start = time.perf_counter()
+    for query, expected in labelled:
+        query_start = time.perf_counter()
+        answer, is_found, _ = service.search_knowledge_base(query)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+        found += is_found
+        top1 += is_found and answer == expected
+    elapsed = time.perf_counter() - start
+
+    queries = [query for query, _ in labelled]
+    start = time.perf_counter()
+    service.search_many(queries)
+    batch_elapsed = time.perf_counter() - start
+
+    # Ranking quality, independent of the threshold
+    top_ids, _ = service.top_k_many(queries, k)
+    topk = sum(any(i >= 0 and answers[i] == expected for i in row)
+               for row, (_, expected) in zip(top_ids.tolist(), labelled))
+
+    false_matches = sum(service.search_knowledge_base(query)[1] for query in OFF_TOPIC)
+    latencies.sort()
+    return {
+        "queries": len(labelled),
+        "top1": round(top1 / len(labelled), 4),
+        "topk": round(topk / len(labelled), 4),
+        "found_rate": round(found / len(labelled), 4),
+        "false_match": round(false_matches / len(OFF_TOPIC), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "qps": round(len(labelled) / elapsed, 1),
+        "batch_qps": round(len(labelled) / batch_elapsed, 1)
+    }
+
+
+def run_size(size: int, args, workdir: str) -> dict:
+    kb_path = os.path.join(workdir, f"synthetic_{size}.jsonl")
+    labelled = synthesize(size, kb_path, args.queries, args.seed)
+
+    config.get_knowledge_base_sources = lambda kb_name=None: [kb_path]
+    config.get_knowledge_base_path = lambda kb_name=None: kb_path
+
+    gc.collect()
+    start = time.perf_counter()
+    service = KnowledgeBaseService()
+    build_s = time.perf_counter() - start
+
+    result = {
+        "size": size,
+        "build_s": round(build_s, 3),
+        "index_mb": round(index_megabytes(service), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **evaluate(service, labelled, args.k)
+    }
+    os.remove(kb_path)
+    return result
+
+
+def check_limits(result: dict, limits: dict) -> list:
+    failures = []
+    checks = [("min_top1", "top1", min), ("min_topk", "topk", min), ("max_false_match", "false_match", max),
+              ("max_p95_ms", "p95_ms", max), ("max_build_s", "build_s", max)]
+    for limit_name, metric, kind in checks:
+        if limit_name not in limits:
+            continue
+        value, limit = result[metric], limits[limit_name]
+        if (kind is min and value < limit) or (kind is max and value > limit):
+            failures.append(f"{result['size']}: {metric} {value} vs {limit_name} {limit}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KB retrieval speed / accuracy benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=500, help="Labelled queries per KB size")
+    parser.add_argument("--k", type=int, default=5, help="k for top-k accuracy")
+    parser.add_argument("--mode", choices=["tfidf", "dense", "hybrid"], help="Override retrieval mode (hashing embeddings)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--limits", help="JSON file with per-size limits (keys as in DEFAULT_LIMITS)")
+    parser.add_argument("--no-limits", action="store_true", help="Report only, never fail")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    if args.mode:
+        # Offline embeddings so dense/hybrid runs need no model server
+        retrieval = dict(config.get_retrieval_settings())
+        retrieval.update(mode=args.mode, embeddings={"provider": "hashing", "dim": 256})
+        config.get_retrieval_settings = lambda: retrieval
+
+    limits = DEFAULT_LIMITS
+    if args.limits:
+        with open(args.limits, 'r', encoding='utf-8') as f:
+            limits = json.load(f)
+
+    mode = args.mode or config.get_retrieval_settings().get('mode', 'tfidf')
+    if mode != 'tfidf' and not args.limits:
+        # The accuracy limits are calibrated for TF-IDF; the hashing embedder is only a stand-in
+        limits = {size: {name: value for name, value in size_limits.items() if not name.startswith('min_')}
+                  for size, size_limits in limits.items()}
+    print(f"🧪 Retrieval benchmark: mode={mode} sizes={args.sizes} queries={args.queries} k={args.k}")
+    results, failures = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sorted(args.sizes):
+            if size > total_combinations():
+                print(f"Skipping {size}: only {total_combinations()} distinct synthetic questions")
+                continue
+            result = run_size(size, args, workdir)
+            results.append(result)
+            if not args.no_limits:
+                failures.extend(check_limits(result, limits.get(str(size), {})))
+
+    print()
+    print(f"{'size':>9} {'build s':>8} {'index MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'batch qps':>9} "
+          f"{'top1':>6} {'top' + str(args.k):>6} {'false':>6}")
+    for r in results:
+        print(f"{r['size']:>9} {r['build_s']:>8.2f} {r['index_mb']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['qps']:>8.0f} {r['batch_qps']:>9.0f} {r['top1']:>6.1%} {r['topk']:>6.1%} {r['false_match']:>6.1%}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"mode": mode, "k": args.k, "seed": args.seed, "results": results,
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if failures:
+        print("\n❌ Limits exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\n✅ All results within limits")
+
+
+if __name__ == "__main__":
+    main()
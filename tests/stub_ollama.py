@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Stub Ollama server for benchmarks - answers /api/generate, /api/embed and /api/tags
+with configurable latency, streaming and failure rate, without loading a model.
+Optionally models Ollama's parallel slots (OLLAMA_NUM_PARALLEL: extra requests queue) and
+the cost of swapping the loaded model when consecutive requests ask for different models.
+
+Usage:
+    python tests/stub_ollama.py                                  # port 11435, 300ms +- 100ms
+    python tests/stub_ollama.py --latency 800 --jitter 200 --failure-rate 0.05
+    python tests/stub_ollama.py --parallel 4 --swap-ms 500
+    OLLAMA_BACKENDS=http://localhost:11435 python server/run.py   # point the app at it
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from aiohttp import web
+
+# The intent-detection prompt asks for YES/NO about this message
+INTENT_MESSAGE = re.compile(r'Answer: YES or NO only')
+QUOTED_MESSAGE = re.compile(r'"([^"]*)"')
+HUMAN_WORDS = ('human', 'manager', 'supervisor', 'representative', 'escalate', 'transfer me')
+
+CANNED_RESPONSE = (
+    "Thanks for your question! Based on what we have on file, here is what you need to know. "
+    "Let me know if there is anything else I can help you with."
+)
+
+
+class StubSettings:
+    def __init__(self, latency: float = 300.0, jitter: float = 100.0, failure_rate: float = 0.0,
+                 token_delay: float = 5.0, embed_latency: float = 10.0, dim: int = 384, seed: int = None,
+                 parallel: int = 0, swap_ms: float = 0.0):
+        self.latency = latency            # Mean /api/generate latency in ms
+        self.jitter = jitter              # Uniform +- jitter in ms
+        self.failure_rate = failure_rate  # Fraction of requests answered with HTTP 500
+        self.token_delay = token_delay    # ms between streamed chunks when "stream": true
+        self.embed_latency = embed_latency
+        self.dim = dim
+        self.random = random.Random(seed)
+        self.parallel = parallel          # Requests generated at once (0 = unlimited); the rest queue
+        self.swap_ms = swap_ms            # Delay when a request needs a different model than the loaded one
+
+
+class StubStats:
+    def __init__(self):
+        self.generate = 0
+        self.intent = 0
+        self.embed = 0
+        self.failures = 0
+        self.swaps = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.loaded_model = None
+        self.started = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "generate": self.generate,
+            "intent": self.intent,
+            "embed": self.embed,
+            "failures": self.failures,
+            "swaps": self.swaps,
+            "peak_queued": self.peak_queued,
+            "uptime": round(time.time() - self.started, 1)
+        }
+
+
+def reply_for(prompt: str) -> str:
+    """Deterministic answer shaped like the real model's: YES/NO for intent checks, prose otherwise"""
+    if INTENT_MESSAGE.search(prompt):
+        quoted = QUOTED_MESSAGE.search(prompt)
+        message = (quoted.group(1) if quoted else prompt).lower()
+        return "YES" if any(word in message for word in HUMAN_WORDS) else "NO"
+    return f"<think>Answering the customer.</think>{CANNED_RESPONSE}"
+
+
+def hashed_embedding(text: str, dim: int) -> list:
+    """Stable pseudo-embedding: bag of hashed words, so similar texts get similar vectors"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode('utf-8')).digest()
+        vector[int.from_bytes(digest[:4], 'little') % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def create_app(settings: StubSettings) -> web.Application:
+    stats = StubStats()
+    slots = asyncio.Semaphore(settings.parallel) if settings.parallel > 0 else None
+
+    async def delay(mean_ms: float, jitter_ms: float = 0.0):
+        jitter_ms = min(jitter_ms, mean_ms)
+        await asyncio.sleep(max(settings.random.uniform(mean_ms - jitter_ms, mean_ms + jitter_ms), 0.0) / 1000)
+
+    async def generate(request: web.Request):
+        payload = await request.json()
+        prompt = payload.get("prompt", "")
+        model = payload.get("model", "stub")
+        stats.generate += 1
+        if INTENT_MESSAGE.search(prompt):
+            stats.intent += 1
+
+        if slots is not None:
+            stats.queued += 1
+            stats.peak_queued = max(stats.peak_queued, stats.queued)
+            await slots.acquire()
+            stats.queued -= 1
+        try:
+            if settings.swap_ms and model != stats.loaded_model:
+                stats.swaps += 1
+                stats.loaded_model = model
+                await delay(settings.swap_ms)
+            await delay(settings.latency, settings.jitter)
+        finally:
+            if slots is not None:
+                slots.release()
+        if settings.random.random() < settings.failure_rate:
+            stats.failures += 1
+            return web.json_response({"error": "stub failure"}, status=500)
+
+        text = reply_for(prompt)
+        if not payload.get("stream", True):
+            return web.json_response({"model": model, "response": text, "done": True})
+
+        # Ollama streams one JSON object per line, ending with done=true
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for token in re.findall(r'\S+\s*', text):
+            await response.write((json.dumps({"model": model, "response": token, "done": False}) + "\n").encode())
+            await delay(settings.token_delay)
+        await response.write((json.dumps({"model": model, "response": "", "done": True}) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def embed(request: web.Request):
+        payload = await request.json()
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        stats.embed += 1
+        await delay(settings.embed_latency)
+        return web.json_response({
+            "model": payload.get("model", "stub"),
+            "embeddings": [hashed_embedding(text, settings.dim) for text in inputs]
+        })
+
+    async def tags(request: web.Request):
+        return web.json_response({"models": [{"name": "stub:latest"}]})
+
+    async def get_stats(request: web.Request):
+        return web.json_response(stats.to_dict())
+
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    app.router.add_post("/api/embed", embed)
+    app.router.add_get("/api/tags", tags)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=300.0, help="Mean generate latency (ms)")
+    parser.add_argument("--jitter", type=float, default=100.0, help="Uniform latency jitter (ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--token-delay", type=float, default=5.0, help="Delay between streamed chunks (ms)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--parallel", type=int, default=0, help="Parallel generate slots, like OLLAMA_NUM_PARALLEL (0 = unlimited)")
+    parser.add_argument("--swap-ms", type=float, default=0.0, help="Model swap delay when the requested model changes (ms)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.jitter, args.failure_rate, args.token_delay, dim=args.dim, seed=args.seed,
+                            parallel=args.parallel, swap_ms=args.swap_ms)
+    print(f"🧪 Stub Ollama on http://{args.host}:{args.port} "
+          f"(latency {args.latency:.0f}±{args.jitter:.0f}ms, failure rate {args.failure_rate:.0%})")
+    web.run_app(create_app(settings), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+IVF approximate nearest neighbour index tests
+"""
+
+import sys
+import os
+import numpy as np
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from ann_index import IVFIndex, chain_fingerprint
+from config_loader import config
+from knowledge_base_service import KnowledgeBaseService
+from vector_index import DenseIndex
+
+
+def clustered_vectors(n=3000, dim=32, clusters=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.3 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def recall_at_k(index, vectors, queries, k):
+    exact, _ = DenseIndex(vectors).search(queries, k)
+    approx, _ = index.search(queries, k)
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    return hits / (len(queries) * k)
+
+
+def test_recall_improves_with_nprobe():
+    vectors = clustered_vectors()
+    queries = vectors[:100] + 0.05
+    index = IVFIndex.build(vectors, nlist=40, nprobe=1)
+    assert len(index) == len(vectors)
+
+    low = recall_at_k(index, vectors, queries, 10)
+    index.nprobe = 40  # probing every list is exact search
+    full = recall_at_k(index, vectors, queries, 10)
+    assert full == 1.0
+    assert low <= full
+
+
+def test_save_load_and_incremental_add(tmp_path):
+    vectors = clustered_vectors(n=500)
+    index = IVFIndex.build(vectors[:400], nlist=10, nprobe=10, fingerprint="fp")
+    index.add(vectors[400:])
+    assert len(index) == 500
+
+    path = str(tmp_path / "kb.txt.model.ivf.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.fingerprint == "fp" and loaded.nprobe == 10 and len(loaded) == 500
+
+    ids, scores = loaded.search(vectors[450:455], k=1)
+    assert list(ids[:, 0]) == list(range(450, 455))
+    assert np.all(scores[:, 0] > 0.99)
+
+
+def test_chain_fingerprint_is_incremental():
+    assert chain_fingerprint(chain_fingerprint("m", ["a", "b"]), ["c"]) == chain_fingerprint("m", ["a", "b", "c"])
+    assert chain_fingerprint("m", ["a", "b"]) != chain_fingerprint("m", ["b", "a"])
+
+
+def test_knowledge_base_uses_ann_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'get_retrieval_settings', lambda: {
+        'mode': 'dense',
+        'embeddings': {'provider': 'hashing', 'dim': 256},
+        'ann': {'enabled': True, 'min_vectors': 10, 'nlist': 4, 'nprobe': 4},
+    })
+    monkeypatch.setattr(KnowledgeBaseService, '_ann_index_path', lambda self, model: str(tmp_path / "kb.ivf.npz"))
+
+    kb = KnowledgeBaseService()
+    assert isinstance(kb.dense_index, IVFIndex)
+    assert os.path.exists(tmp_path / "kb.ivf.npz")
+
+    kb.add_qa_pair("Can I pay for an oil change with a gift card?", "Yes, gift cards are accepted.")
+    assert len(kb.dense_index) == len(kb.qa_pairs)
+    answer, found, _ = kb.search_knowledge_base("Can I pay for an oil change with a gift card?")
+    assert found and answer == "Yes, gift cards are accepted."
+
+    # A rebuild picks the saved index back up instead of re-embedding and re-clustering
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("index should be loaded from disk")
+    monkeypatch.setattr(IVFIndex, 'build', no_rebuild)
+    loaded = kb._build_dense_index(kb.index.embedder, [qa['question'] for qa in kb.qa_pairs])
+    assert isinstance(loaded, IVFIndex) and len(loaded) == len(kb.qa_pairs)
+
+
+def test_questions_outside_the_ann_candidates_never_win(monkeypatch, tmp_path):
+    for mode in ('dense', 'hybrid'):
+        monkeypatch.setattr(config, 'get_retrieval_settings', lambda: {
+            'mode': mode,
+            'embeddings': {'provider': 'hashing', 'dim': 256},
+            'ann': {'enabled': True, 'min_vectors': 10, 'nlist': 4, 'nprobe': 1, 'candidates': 2},
+        })
+        monkeypatch.setattr(KnowledgeBaseService, '_ann_index_path', lambda self, model: str(tmp_path / f"{mode}.ivf.npz"))
+        kb = KnowledgeBaseService()
+        question = kb.qa_pairs[5]['question']
+
+        # The only candidates have negative cosines; the exact question (best TF-IDF match) is not among them
+        def search(query_vectors, k):
+            return np.array([[1, 2]] * len(query_vectors)), np.array([[-0.1, -0.3]] * len(query_vectors), dtype=np.float32)
+        monkeypatch.setattr(kb.index.dense_index, 'search', search)
+
+        scores = kb._dense_scores_many(kb.index, [question])[0]
+        assert np.isneginf(np.delete(scores, [1, 2])).all()
+        ids, top_scores = kb.top_k_many([question], k=3)
+        assert ids[0].tolist() == [1, 2, -1] and top_scores[0, 2] == 0
+        answer, found, score = kb.search_knowledge_base(question)
+        assert not found and np.isfinite(score)
+        assert [found for _, found, _ in kb.search_many([question])] == [False]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Answer cache tests - key normalization, LRU/TTL, the shared SQLite tier and cached /chat turns
+"""
+
+import sys
+import os
+import json
+import time
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from answer_cache import AnswerCache, CachedAnswer, SharedAnswerStore
+
+STATE = {'guidance_stage': 'normal', 'unclear_message_count': 0}
+
+
+def answer(text="Use a gauge."):
+    return CachedAnswer(text, True, False, False, 'normal', 0)
+
+
+def test_keys():
+    key = AnswerCache.key("How do I  check tire pressure?", STATE, "v1")
+    assert key == AnswerCache.key("how do i check tire PRESSURE?", STATE, "v1")
+    assert key != AnswerCache.key("how do i check tire pressure?", STATE, "v2")
+    assert key != AnswerCache.key("how do i check tire pressure?", {**STATE, 'unclear_message_count': 1}, "v1")
+
+
+def test_lru_and_ttl():
+    cache = AnswerCache(max_entries=2, ttl=60)
+    for name in "abc":
+        cache.put(name, answer(name))
+    assert cache.get("a") is None and cache.get("c").response == "c"
+
+    cache.ttl = 0.01
+    cache.put("d", answer())
+    time.sleep(0.02)
+    assert cache.get("d") is None
+    assert cache.get_stats()["hits"] == {"lru": 1, "shared": 0} and cache.misses == 2
+
+
+def test_shared_tier_between_workers(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    worker1 = AnswerCache(max_entries=10, ttl=60, shared=SharedAnswerStore(path))
+    worker2 = AnswerCache(max_entries=10, ttl=60, shared=SharedAnswerStore(path))
+    worker1.put("k", CachedAnswer("Hello!", False, False, False, 'normal', 0))
+
+    hit = worker2.get("k")
+    assert hit.response == "Hello!" and worker2.hits["shared"] == 1
+    # Promoted to the in-process tier
+    assert worker2.get("k") is not None and worker2.hits["lru"] == 1
+
+    # Shared-only cache (no in-process entries)
+    shared_only = AnswerCache(max_entries=0, ttl=60, shared=SharedAnswerStore(path))
+    assert shared_only.get("k").response == "Hello!"
+    for cache in (worker1, worker2, shared_only):
+        cache.shared.close()
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'answer_cache_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    monkeypatch.setattr(main, 'answer_cache', AnswerCache(max_entries=100, ttl=60))
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_repeated_message_skips_kb_and_llm(client, monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, task='default'):
+        prompts.append(task)
+        return "NO" if task == 'intent' else "Check the pressure when the tires are cold."
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', fake_generate)
+    monkeypatch.setattr(main.ai_service, 'cache_llm_answers', True)
+    searches = []
+    real_search = main.kb_service.search_knowledge_base
+    monkeypatch.setattr(main.kb_service, 'search_knowledge_base', lambda q, *a: searches.append(q) or real_search(q, *a))
+    question = main.kb_service.qa_pairs[0]['question']
+
+    first = await client.post("/chat", json={"message": question})
+    second = await client.post("/chat", json={"message": f"  {question.upper()} "})
+    assert first.json()["response"] == second.json()["response"]
+    assert second.json()["is_from_kb"] is True
+    assert len(searches) == 1 and prompts == ['intent', 'default']
+    assert "kb;" not in second.headers["server-timing"]
+    assert main.answer_cache.hits["lru"] == 1
+
+
+@pytest.mark.asyncio
+async def test_guidance_state_is_part_of_the_key(client, monkeypatch):
+    async def fake_generate(prompt, task='default'):
+        return "NO"
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', fake_generate)
+    session_id = (await client.post("/chat", json={"message": "help"})).json()["session_id"]
+    second = await client.post("/chat", json={"message": "help", "session_id": session_id})
+    # Same message, but the second turn is further along in the guidance flow
+    assert "still not quite sure" in second.json()["response"]
+
+    # A new session repeats the first turn, from the cache
+    fresh = await client.post("/chat", json={"message": "help"})
+    assert "be more specific" in fresh.json()["response"] and main.answer_cache.hits["lru"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_failures_are_not_cached(client, monkeypatch):
+    async def failing_generate(prompt, task='default'):
+        return None
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', failing_generate)
+    message = "Tell me something about the history of the company founders please"
+    await client.post("/chat", json={"message": message})
+    await client.post("/chat", json={"message": message})
+    assert main.answer_cache.get_stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_kb_answer_is_cached_while_the_llm_is_down(client, monkeypatch):
+    prompts = []
+
+    async def failing_generate(prompt, task='default'):
+        prompts.append(task)
+        return None
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', failing_generate)
+    question = main.kb_service.qa_pairs[0]['question']
+    first = await client.post("/chat", json={"message": question})
+    calls = len(prompts)
+    second = await client.post("/chat", json={"message": question})
+    # The rendered KB answer is deterministic: the repeat neither searches nor waits for the LLM again
+    assert first.json()["is_from_kb"] is True and second.json()["response"] == first.json()["response"]
+    assert main.answer_cache.hits["lru"] == 1 and len(prompts) == calls
+
+
+@pytest.mark.asyncio
+async def test_llm_text_is_cached_only_on_request(client, monkeypatch):
+    async def fake_generate(prompt, task='default'):
+        return "NO" if task == 'intent' else "Some free-form advice."
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', fake_generate)
+    question = main.kb_service.qa_pairs[0]['question']
+    await client.post("/chat", json={"message": question})
+    await client.post("/chat", json={"message": "Tell me something about the history of the company founders please"})
+    assert main.answer_cache.get_stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_calibrated_threshold_changes_the_key(client, monkeypatch, tmp_path):
+    async def fake_generate(prompt, task='default'):
+        return "NO" if task == 'intent' else "Here you go."
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', fake_generate)
+    monkeypatch.setattr(main.ai_service, 'cache_llm_answers', True)
+    thresholds_file = tmp_path / "kb_thresholds.json"
+    monkeypatch.setenv("KB_THRESHOLDS_FILE", str(thresholds_file))
+    question = main.kb_service.qa_pairs[0]['question']
+    assert (await client.post("/chat", json={"message": question})).json()["is_from_kb"] is True
+
+    # Applying a calibration that rejects every match must not serve the cached KB answer
+    thresholds_file.write_text(json.dumps({f"primary:{main.kb_service.retrieval_mode}": {"threshold": 1.01, "questions": {}}}))
+    main.kb_service.load_calibration()
+    try:
+        again = await client.post("/chat", json={"message": question})
+        assert again.json()["is_from_kb"] is False
+        assert main.answer_cache.hits["lru"] == 0
+    finally:
+        thresholds_file.unlink()
+        main.kb_service.load_calibration()
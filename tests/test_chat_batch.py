@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Batch chat tests - vectorized KB search, batch parsing, the worker pool and the /chat/batch endpoint
+"""
+
+import sys
+import os
+import json
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from models import ChatSession, ChatMessage, Ticket
+from chat_batch import BatchChatRunner, parse_batch
+
+QUERIES = [
+    "how do i check my tire pressure",
+    "when should the oil be changed",
+    "what's the weather like on mars",
+    "",
+    "financing",
+]
+
+
+def test_search_many_matches_single_search():
+    kb = main.kb_service
+    queries = QUERIES + [qa['question'] for qa in kb.qa_pairs[:20]]
+    for (answer, found, score), query in zip(kb.search_many(queries), queries):
+        single_answer, single_found, single_score = kb.search_knowledge_base(query)
+        assert found == single_found
+        assert score == pytest.approx(single_score, abs=1e-5)
+        if found:
+            assert answer == single_answer
+    assert kb.search_many([]) == []
+
+
+def test_parse_batch():
+    lines = [
+        '{"id": 7, "message": "Where is my order?"}',
+        '{"question": "Do you ship abroad?", "session": "a"}',
+        '"just a string"',
+        '',
+        '{"id": 8}',
+        'not json',
+    ]
+    items, issues = parse_batch(lines, 'jsonl')
+    assert [(i.index, i.id, i.message, i.session) for i in items] == [
+        (0, "7", "Where is my order?", None),
+        (1, None, "Do you ship abroad?", "a"),
+        (2, None, "just a string", None),
+    ]
+    assert len(issues) == 2 and issues[0].startswith("line 5")
+
+    items, issues = parse_batch(["hello", "  ", "bye"], 'text')
+    assert [i.message for i in items] == ["hello", "bye"] and not issues
+    with pytest.raises(ValueError):
+        parse_batch([], 'csv')
+
+
+class FakeAIService:
+    """Unclear messages advance the guidance stage, like the real service; tracks parallelism"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def generate_response(self, message, kb_answer, kb_found, session_state):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if message == "boom":
+            raise RuntimeError("backend down")
+        if kb_found:
+            return kb_answer, False, False
+        session_state['unclear_message_count'] += 1
+        session_state['guidance_stage'] = 'guiding'
+        return f"guidance {session_state['unclear_message_count']}", False, True
+
+    def should_create_ticket(self, message, response, kb_found):
+        return "human" in message
+
+
+def test_runner_pool_and_conversations():
+    ai = FakeAIService()
+    lines = [json.dumps({"message": m}) for m in ["boom", "human please"] + ["hmm"] * 10]
+    lines += [json.dumps({"message": "hmm", "session": "s"})] * 3
+    items, _ = parse_batch(lines, 'jsonl')
+    runner = BatchChatRunner(main.kb_service, ai, concurrency=4)
+
+    async def collect():
+        return [result async for result in runner.run(items)]
+
+    results = asyncio.run(collect())
+    assert sorted(r.index for r in results) == list(range(len(items)))
+    assert ai.peak == 4
+    by_index = {r.index: r for r in results}
+    assert by_index[0].error == "RuntimeError: backend down"
+    assert by_index[1].needs_ticket
+    # Items of one session share its state, in input order; the others start fresh
+    assert [by_index[i].response for i in (12, 13, 14)] == ["guidance 1", "guidance 2", "guidance 3"]
+    assert by_index[5].response == "guidance 1"
+    assert runner.summary.items == 15 and runner.summary.errors == 1 and runner.summary.tickets == 1
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'batch_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    # Streaming responses open their own session
+    monkeypatch.setattr(main, 'AsyncSessionLocal', TestSessionLocal)
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        ac.session_factory = TestSessionLocal
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+async def count(client, model):
+    async with client.session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(model))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint(client, monkeypatch):
+    monkeypatch.setattr(main, 'ai_service', FakeAIService())
+    question = main.kb_service.qa_pairs[0]['question']
+    body = "\n".join([question, "hmm", "I need a human"])
+
+    response = await client.post("/chat/batch?format=text", content=body)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert lines[-1]["summary"]["items"] == 3 and lines[-1]["summary"]["dry_run"]
+    assert {line["index"]: line["is_from_kb"] for line in lines[:-1]} == {0: True, 1: False, 2: False}
+    assert await count(client, ChatSession) == 0
+
+    response = await client.post("/chat/batch?format=text&dry_run=false&user_contact=eval@example.com", content=body)
+    summary = response.text.splitlines()[-1]
+    assert json.loads(summary)["summary"]["dry_run"] is False
+    assert (await count(client, ChatSession), await count(client, ChatMessage), await count(client, Ticket)) == (3, 3, 1)
+
+    monkeypatch.setenv("BATCH_MAX_ITEMS", "2")
+    assert (await client.post("/chat/batch?format=text", content=body)).status_code == 413
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Chat history tests - cursor pagination and NDJSON streaming
+"""
+
+import sys
+import os
+import json
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from models import ChatSession, ChatMessage, Ticket
+
+SESSION_ID = "history-session"
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'history_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with TestSessionLocal() as db:
+        db.add(ChatSession(session_id=SESSION_ID, user_contact="a@example.com", guidance_stage="guiding"))
+        db.add(Ticket(session_id=SESSION_ID, user_question="help"))
+        db.add_all([ChatMessage(session_id=SESSION_ID, message=f"q{i}", response=f"a{i}") for i in range(25)])
+        await db.commit()
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    # Small pages so streaming spans several queries
+    monkeypatch.setattr(main, 'HISTORY_STREAM_PAGE', 10)
+    # Streaming responses open their own session
+    monkeypatch.setattr(main, 'AsyncSessionLocal', TestSessionLocal)
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_full_history_keeps_response_shape(client):
+    data = (await client.get(f"/chat/history/{SESSION_ID}")).json()
+    assert data["session_info"] == {
+        "session_id": SESSION_ID, "is_active": True, "has_ticket": True, "guidance_stage": "guiding"
+    }
+    assert [m["message"] for m in data["messages"]] == [f"q{i}" for i in range(25)]
+    assert data["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_pages_backwards_with_cursor(client):
+    seen = []
+    before = None
+    while True:
+        params = {"limit": 10} if before is None else {"limit": 10, "before": before}
+        data = (await client.get(f"/chat/history/{SESSION_ID}", params=params)).json()
+        seen = [m["message"] for m in data["messages"]] + seen
+        before = data["next_cursor"]
+        if before is None:
+            break
+    assert seen == [f"q{i}" for i in range(25)]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream(client):
+    response = await client.get(f"/chat/history/{SESSION_ID}", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["session_info"]["has_ticket"] is True
+    assert [line["message"] for line in lines[1:]] == [f"q{i}" for i in range(25)]
+
+
+@pytest.mark.asyncio
+async def test_unknown_session(client):
+    data = (await client.get("/chat/history/missing")).json()
+    assert data["messages"] == [] and data["session_info"]["guidance_stage"] == "normal"
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Config hot-reload tests - atomic snapshot swap, validation, per-section subscribers
+"""
+
+import sys
+import os
+import time
+import shutil
+import pytest
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import ConfigLoader, config
+from knowledge_base_service import KnowledgeBaseService
+from ai_service import LocalAIService
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'server', 'config')
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    shutil.copytree(CONFIG_DIR, tmp_path / "config")
+    return tmp_path / "config"
+
+
+@pytest.fixture
+def live_config(config_dir, monkeypatch):
+    """Point the global config at a scratch copy of the config directory"""
+    monkeypatch.setattr(config, 'config_dir', config_dir)
+    config.reload_configs()
+    yield config_dir
+    monkeypatch.undo()
+    config.reload_configs()
+
+
+def edit(path, old, new):
+    text = path.read_text()
+    assert old in text
+    path.write_text(text.replace(old, new))
+
+
+def test_snapshot_is_immutable(config_dir):
+    loader = ConfigLoader(str(config_dir))
+    with pytest.raises(TypeError):
+        loader.get_knowledge_base_config()['similarity_threshold'] = 0.1
+    assert isinstance(loader.get_no_match_responses(), tuple)
+
+
+def test_reload_reports_changed_sections_and_version(config_dir):
+    loader = ConfigLoader(str(config_dir))
+    version = loader.version
+    assert loader.reload_configs() == set()
+
+    edit(config_dir / "ai_prompts_config.yaml", '- "refund"', '- "refund"\n    - "chargeback"')
+    assert loader.reload_configs() == {'ticket_logic'}
+    assert loader.version != version
+    assert "chargeback" in loader.get_ticket_logic()['urgent_user_keywords']
+
+
+def test_invalid_config_keeps_previous_snapshot(config_dir):
+    loader = ConfigLoader(str(config_dir))
+    snapshot = loader.snapshot
+    edit(config_dir / "knowledge_base_config.yaml", "similarity_threshold: 0.5", "similarity_threshold: 7")
+    with pytest.raises(ValueError):
+        loader.reload_configs()
+    assert loader.snapshot is snapshot
+
+
+def test_subscribers_only_see_their_sections(config_dir):
+    loader = ConfigLoader(str(config_dir))
+    calls = []
+    loader.subscribe(lambda old, new: calls.append('kb'), ['knowledge_base'])
+    loader.subscribe(lambda old, new: calls.append('ai'), ['ai_settings', 'ticket_logic'])
+
+    edit(config_dir / "ai_prompts_config.yaml", "max_retries: 2", "max_retries: 3")
+    loader.reload_configs()
+    assert calls == ['ai']
+
+
+def test_watcher_picks_up_changes(config_dir):
+    loader = ConfigLoader(str(config_dir))
+    loader.start_watching(interval=0.05)
+    try:
+        edit(config_dir / "knowledge_base_config.yaml", "similarity_threshold: 0.5", "similarity_threshold: 0.4")
+        deadline = time.time() + 5
+        while loader.get_similarity_threshold() != 0.4 and time.time() < deadline:
+            time.sleep(0.05)
+        assert loader.get_similarity_threshold() == 0.4
+    finally:
+        loader.stop_watching()
+
+
+def test_services_rebuild_only_what_changed(live_config):
+    kb = KnowledgeBaseService()
+    ai = LocalAIService()
+    index = kb.index
+
+    # Threshold tweak: applied without re-indexing
+    edit(live_config / "knowledge_base_config.yaml", "similarity_threshold: 0.5", "similarity_threshold: 0.45")
+    config.reload_configs()
+    assert kb.similarity_threshold == 0.45
+    assert kb.index is index
+
+    # TF-IDF settings change: new index swapped in
+    edit(live_config / "knowledge_base_config.yaml", "max_features: 1000", "max_features: 500")
+    config.reload_configs()
+    assert kb.index is not index
+    assert len(kb.qa_pairs) == len(index.qa_pairs)
+
+    # Prompts and keywords reach the AI service
+    edit(live_config / "ai_prompts_config.yaml", "User question: {user_message}\n\n", "Customer question: {user_message}\n\n")
+    edit(live_config / "ai_prompts_config.yaml", '- "refund"', '- "refund"\n    - "chargeback"')
+    config.reload_configs()
+    assert "Customer question" in ai.prompts['no_knowledge_base_match']['user_prompt_template']
+    assert ai._check_needs_ticket_robust("Sure.", "I want a chargeback")
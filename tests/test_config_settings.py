@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Typed config snapshot tests - precompiled keywords and pre-parsed templates
+"""
+
+import sys
+import os
+import dataclasses
+import pytest
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from config_settings import MessageTemplate, RuntimeSettings, TicketSettings
+from ai_service import LocalAIService
+
+
+def test_template_matches_str_format():
+    for source in ["Ticket #{ticket_id} created.", "{ticket_id:05d} / {ticket_id!r}", "No fields {{here}}"]:
+        template = MessageTemplate(source)
+        assert template.render(ticket_id=42) == source.format(ticket_id=42)
+
+
+def test_keyword_patterns_match_substring_semantics():
+    ticket = TicketSettings.from_config({
+        'response_keywords': ["NEEDS_HUMAN_FOLLOWUP", "contact customer service"],
+        'urgent_user_keywords': ["Refund", "warranty claim", "claim"],
+    })
+    assert ticket.urgent_user_keywords == ("refund", "warranty claim", "claim")
+    for message, expected in [("I want a REFUND", True), ("my warranty claims", True), ("hello", False)]:
+        assert bool(ticket.urgent_pattern.search(message.lower())) == expected
+    # Response keywords stay case-sensitive, as before
+    assert ticket.response_pattern.search("Please contact customer service.")
+    assert not ticket.response_pattern.search("Please Contact Customer Service.")
+
+    empty = TicketSettings.from_config({})
+    assert empty.urgent_pattern is None and empty.response_pattern is None
+
+
+def test_settings_are_frozen_slotted_dataclasses():
+    settings = config.settings
+    assert isinstance(settings, RuntimeSettings)
+    assert settings.kb.similarity_threshold == config.get_similarity_threshold()
+    assert not hasattr(settings.ticket, '__dict__')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.kb.similarity_threshold = 0.1
+
+
+def test_ai_service_uses_snapshot():
+    ai = LocalAIService()
+    assert ai._check_needs_ticket_robust("Sure thing.", "This is a warranty claim")
+    assert ai._check_needs_ticket_robust("You should contact customer service.", "hi")
+    assert not ai._check_needs_ticket_robust("Sure thing.", "How do I check tire pressure?")
+    assert ai.get_ticket_created_message(7) == config.get_response_templates()['ticket_created'].format(ticket_id=7)
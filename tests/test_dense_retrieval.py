@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Dense / hybrid retrieval tests (uses the offline hashing embedder)
+"""
+
+import sys
+import os
+import numpy as np
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from embedding_service import HashingEmbedder
+from knowledge_base_service import KnowledgeBaseService
+from vector_index import DenseIndex, top_k
+
+
+def test_top_k_matches_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.random((4, 50)).astype(np.float32)
+    indices, values = top_k(scores, 5)
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    assert np.array_equal(indices, expected)
+    assert np.allclose(values, np.take_along_axis(scores, expected, axis=1))
+
+
+def test_dense_index_exact_and_int8():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((200, 32)).astype(np.float32)
+    queries = vectors[:10] + 0.01 * rng.standard_normal((10, 32)).astype(np.float32)
+
+    exact = DenseIndex(vectors)
+    assert exact.matrix.dtype == np.float32 and exact.matrix.flags['C_CONTIGUOUS']
+    indices, scores = exact.search(queries, k=3)
+    assert list(indices[:, 0]) == list(range(10))
+    assert np.all(scores[:, 0] > 0.99)
+
+    quantized = DenseIndex(vectors, quantize=True)
+    assert quantized.matrix.dtype == np.int8
+    q_indices, q_scores = quantized.search(queries, k=3)
+    assert list(q_indices[:, 0]) == list(range(10))
+    assert np.allclose(q_scores[:, 0], scores[:, 0], atol=0.02)
+
+
+def test_hashing_embedder_is_deterministic():
+    embedder = HashingEmbedder(dim=64)
+    a = embedder.embed(["How do I change my oil?"])
+    b = embedder.embed(["how do i change my oil"])
+    assert a.shape == (1, 64)
+    assert np.array_equal(a, b)
+
+
+def test_hybrid_mode_knowledge_base(monkeypatch):
+    monkeypatch.setattr(config, 'get_retrieval_settings', lambda: {
+        'mode': 'hybrid',
+        'hybrid_weight': 0.5,
+        'embeddings': {'provider': 'hashing', 'dim': 512},
+    })
+    kb = KnowledgeBaseService()
+    assert kb.dense_index is not None
+    assert len(kb.dense_index) == len(kb.qa_pairs)
+    assert not kb.search_is_blocking
+
+    question = kb.qa_pairs[0]['question']
+    answer, found, score = kb.search_knowledge_base(question)
+    assert found
+    assert answer == kb.qa_pairs[0]['answer']
+    assert score > 0.99
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Event bus / server-push tests - topic filtering, replay, slow subscribers, SSE stream
+"""
+
+import sys
+import os
+import json
+import time
+import sqlite3
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from event_bus import EventBus, SharedLogBackend
+from database import Base, get_db
+import main
+
+
+@pytest.mark.asyncio
+async def test_topic_filtering_and_prefixes():
+    bus = EventBus()
+    tickets = bus.subscribe(["tickets"])
+    sessions = bus.subscribe(["session:*"])
+
+    bus.publish("ticket_created", "tickets", {"id": 1})
+    bus.publish("chat_message", "session:abc", {"message": "hi"})
+
+    assert (await tickets.get(timeout=0.1)).data == {"id": 1}
+    assert await tickets.get(timeout=0.01) is None
+    assert (await sessions.get(timeout=0.1)).topic == "session:abc"
+
+    tickets.close()
+    bus.publish("ticket_created", "tickets", {"id": 2})
+    assert tickets.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_replay_and_slow_subscriber():
+    bus = EventBus(max_queue=2)
+    for i in range(5):
+        bus.publish("ticket_updated", "tickets", {"id": i})
+
+    resumed = bus.subscribe(["tickets"], last_event_id=3)
+    assert [(await resumed.get(timeout=0.1)).id for _ in range(2)] == [4, 5]
+
+    slow = bus.subscribe(["tickets"])
+    for i in range(3):
+        bus.publish("ticket_updated", "tickets", {"id": i})
+    assert slow.dropped == 1 and slow.queue.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_shared_log_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    worker_a = EventBus(SharedLogBackend(path, poll_interval=0.01))
+    worker_b = EventBus(SharedLogBackend(path, poll_interval=0.01))
+    on_b = worker_b.subscribe(["tickets"])
+
+    first = worker_a.publish("ticket_created", "tickets", {"id": 1})
+    worker_a.backend.flush()
+    second = worker_b.publish("ticket_updated", "tickets", {"id": 1, "status": "closed"})
+    worker_b.backend.flush()
+    # Ids come from the shared log, so they are unique across workers
+    assert (first.id, second.id) == (1, 2)
+    received = [await on_b.get(timeout=1) for _ in range(2)]
+    assert sorted(event.id for event in received) == [1, 2]
+    assert await on_b.get(timeout=0.05) is None  # own events are not delivered twice
+
+    # A client reconnecting to the other worker gets what it missed
+    resumed = worker_a.subscribe(["tickets"], last_event_id=1)
+    assert (await resumed.get(timeout=0.1)).data == {"id": 1, "status": "closed"}
+    on_b.close()
+    resumed.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_log_writes_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    bus = EventBus(SharedLogBackend(path, poll_interval=0.01))
+    local = bus.subscribe(["tickets"])
+    # Another process holds the write lock: publishing must not wait for it
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    started = time.perf_counter()
+    bus.publish("ticket_created", "tickets", {"id": 1})
+    assert time.perf_counter() - started < 0.1
+    assert await local.get(timeout=0.05) is None
+
+    blocker.execute("COMMIT")
+    blocker.close()
+    event = await local.get(timeout=2)
+    assert event.data == {"id": 1} and event.id == 1
+    local.close()
+
+
+class FakeRequest:
+    def __init__(self, polls):
+        self.polls = polls
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+
+@pytest.mark.asyncio
+async def test_wildcard_topics_need_the_debug_token(monkeypatch):
+    monkeypatch.setenv("DEBUG_TOKEN", "s3cret")
+    async with AsyncClient(app=main.app, base_url="http://test") as client:
+        for topics in ("*", "session:*", "tickets,sessions:*"):
+            assert (await client.get("/events", params={"topics": topics})).status_code == 403
+        response = await client.get("/events", params={"topics": "session:*"}, headers={"X-Debug-Token": "wrong"})
+        assert response.status_code == 403
+
+    monkeypatch.setattr(main, 'event_bus', EventBus())
+    response = await main.stream_events(FakeRequest(polls=0), topics="session:*", last_event_id=None, x_debug_token="s3cret")
+    assert response.media_type == "text/event-stream"
+    # Exact topics need no token
+    response = await main.stream_events(FakeRequest(polls=0), topics="tickets,session:abc", last_event_id=None, x_debug_token=None)
+    assert response.media_type == "text/event-stream"
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_format(monkeypatch):
+    bus = EventBus()
+    monkeypatch.setattr(main, 'event_bus', bus)
+    response = await main.stream_events(FakeRequest(polls=1), topics="tickets", last_event_id=None)
+    bus.publish("ticket_updated", "tickets", {"id": 7, "status": "closed"})
+
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert chunks[0].startswith("retry:")
+    lines = chunks[1].splitlines()
+    assert lines[:2] == ["id: 1", "event: ticket_updated"]
+    assert json.loads(lines[2][len("data: "):]) == {"topic": "tickets", "id": 7, "status": "closed"}
+    assert bus.get_stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_ticket_created_matches_ticket_list(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'events_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    async def needs_ticket(message, kb_answer, kb_found, session_state):
+        return "Let me get someone to help.", True, False
+
+    bus = EventBus()
+    monkeypatch.setattr(main, 'event_bus', bus)
+    monkeypatch.setattr(main, 'answer_cache', None)
+    monkeypatch.setattr(main.ai_service, 'generate_response', needs_ticket)
+    main.app.dependency_overrides[get_db] = override_get_db
+    subscription = bus.subscribe(["tickets"])
+    try:
+        async with AsyncClient(app=main.app, base_url="http://test") as client:
+            await client.post("/chat", json={"message": "my order never arrived", "user_contact": "a@example.com"})
+            listed = (await client.get("/tickets")).json()
+    finally:
+        main.app.dependency_overrides.clear()
+        await engine.dispose()
+
+    event = await subscription.get(timeout=0.1)
+    payload = json.loads(event.to_sse().splitlines()[2][len("data: "):])
+    assert {key: value for key, value in payload.items() if key != "topic"} == listed[0]
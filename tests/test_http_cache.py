@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Conditional GET tests - ETags, 304 responses and response compression
+"""
+
+import sys
+import os
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from models import ChatSession, ChatMessage, Ticket
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'etag_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with TestSessionLocal() as db:
+        db.add(ChatSession(session_id="s1", user_contact="a@example.com"))
+        db.add(ChatMessage(session_id="s1", message="q", response="a"))
+        db.add(Ticket(session_id="s1", user_question="help"))
+        await db.commit()
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    # Streaming responses open their own session
+    monkeypatch.setattr(main, 'AsyncSessionLocal', TestSessionLocal)
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+async def revalidate(client, url):
+    first = await client.get(url)
+    etag = first.headers["etag"]
+    second = await client.get(url, headers={"If-None-Match": etag})
+    return first, second
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", ["/knowledge-base", "/tickets", "/chat/history/s1", "/config/status"])
+async def test_unchanged_resources_return_304(client, url):
+    first, second = await revalidate(client, url)
+    assert first.status_code == 200
+    assert second.status_code == 304 and second.content == b""
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+@pytest.mark.asyncio
+async def test_etag_changes_with_data(client):
+    first = await client.get("/tickets")
+    await client.put("/tickets/1/status", params={"status": "closed"})
+    second = await client.get("/tickets", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()[0]["status"] == "closed"
+
+    history = await client.get("/chat/history/s1")
+    page = await client.get("/chat/history/s1", params={"limit": 1})
+    assert history.headers["etag"] != page.headers["etag"]
+
+
+@pytest.mark.asyncio
+async def test_large_responses_are_compressed(client):
+    response = await client.get("/knowledge-base", headers={"Accept-Encoding": "gzip"})
+    assert response.headers.get("content-encoding") == "gzip"
+    assert len(response.json()["qa_pairs"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_compressed_bodies_get_a_weak_etag(client):
+    plain = await client.get("/knowledge-base", headers={"Accept-Encoding": "identity"})
+    compressed = await client.get("/knowledge-base", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers and not plain.headers["etag"].startswith("W/")
+    assert compressed.headers["etag"] == f"W/{plain.headers['etag']}"
+
+    revalidated = await client.get("/knowledge-base", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == compressed.headers["etag"]
+    assert revalidated.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio
+async def test_ndjson_streams_are_not_compressed(client):
+    response = await client.get("/chat/history/s1", params={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "content-encoding" not in response.headers
+    assert len(response.text.strip().splitlines()) >= 2
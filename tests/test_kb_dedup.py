@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection / KB compaction tests - MinHash estimates, LSH blocking, compaction output
+"""
+
+import sys
+import os
+import random
+import numpy as np
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from kb_dedup import MinHasher, NearDuplicateFinder, compact, lsh_candidates, shingles, write_kb
+from kb_parser import KBParser
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a = "how do I check the tire pressure on my car"
+    b = "how do I check the tire pressure on my truck"
+    sa, sb = shingles(a), shingles(b)
+    jaccard = len(sa & sb) / len(sa | sb)
+    estimate = float(np.mean(hasher.signature(a) == hasher.signature(b)))
+    assert abs(estimate - jaccard) < 0.1
+
+
+def test_lsh_blocks_unrelated_questions():
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(2000)]
+    questions = [" ".join(rng.sample(words, 8)) for _ in range(500)]
+    questions.append(questions[10] + " please")
+    signatures = MinHasher().signatures(questions)
+    candidates = lsh_candidates(signatures, bands=16)
+    # Far fewer comparisons than all pairs, and the planted paraphrase is among them
+    assert (10, 500) in candidates
+    assert len(candidates) < 500 * 499 / 2 / 100
+
+
+def test_groups_and_compaction(tmp_path):
+    qa_pairs = [
+        {"question": "How do I check tire pressure?", "answer": "Use a gauge."},
+        {"question": "Should I buy a new or used car?", "answer": "It depends."},
+        {"question": "How do I check my tire pressure?", "answer": "Use a gauge."},
+        {"question": "How should I check the tire pressure?", "answer": "Use a gauge."},
+        {"question": "Should I buy a new car or a used car?", "answer": "Different answer."},
+    ]
+    groups = NearDuplicateFinder(threshold=0.6).find(qa_pairs)
+    assert [(g.keep_index, sorted(m['index'] for m in g.merge)) for g in groups] == [(0, [2, 3]), (1, [4])]
+    assert [g.answers_differ for g in groups] == [False, True]
+
+    # Groups with different answers are only merged on request
+    assert len(compact(qa_pairs, groups)) == 3
+    compacted = compact(qa_pairs, groups, merge_differing=True)
+    assert [qa['question'] for qa in compacted] == [qa_pairs[0]['question'], qa_pairs[1]['question']]
+
+    path = str(tmp_path / "compacted.txt")
+    write_kb(path, compacted)
+    parser = KBParser()
+    assert [r.to_dict() for r in parser.iter_file(path)] == compacted and not parser.issues
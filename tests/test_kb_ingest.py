@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Bulk knowledge base ingestion tests - JSONL/CSV input, near-duplicate detection, atomic publish
+"""
+
+import sys
+import os
+import threading
+import pytest
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from knowledge_base_service import KnowledgeBaseService
+from kb_ingest import KBIngestor
+from shared_state import FileLock
+from kb_parser import KBParser
+
+KB_TEXT = """Test FAQ
+
+Q: How do I check tire pressure?
+A: Use a gauge when the tires are cold.
+
+Q: When should I change my oil?
+A: Every 5,000 miles.
+Check the manual for your model.
+
+Q: Do you offer financing?
+A: Yes, through partner banks.
+"""
+
+
+@pytest.fixture
+def kb(monkeypatch, tmp_path):
+    kb_file = tmp_path / "faq.txt"
+    kb_file.write_text(KB_TEXT, encoding='utf-8')
+    monkeypatch.setattr(config, 'get_knowledge_base_sources', lambda kb_name=None: [str(kb_file)])
+    monkeypatch.setattr(config, 'get_knowledge_base_path', lambda kb_name=None: str(kb_file))
+    service = KnowledgeBaseService()
+    service.kb_file = kb_file
+    return service
+
+
+UPLOAD = [
+    '{"question": "How can I trade in my car?", "answer": "Bring it in for an appraisal."}\n',
+    '{"question": "how do i check   TIRE pressure?", "answer": "Use a tire gauge."}\n',
+    '{"question": "How can I trade in my car", "answer": "Duplicate in the batch."}\n',
+    'not json\n',
+]
+
+
+def test_dry_run_reports_collisions_without_writing(kb):
+    report = KBIngestor(kb).ingest_stream(UPLOAD, 'jsonl', dry_run=True)
+
+    assert report.added == ["How can I trade in my car?"]
+    assert {(c.against, c.existing_question) for c in report.collisions} == {
+        ("kb", "How do I check tire pressure?"),
+        ("batch", "How can I trade in my car?"),
+    }
+    assert len(report.issues) == 1 and not report.published
+    assert kb.kb_file.read_text(encoding='utf-8') == KB_TEXT
+
+
+def test_publish_adds_and_replaces_in_place(kb):
+    index_before = kb.index
+    report = KBIngestor(kb, on_duplicate='replace').ingest_stream(UPLOAD, 'jsonl')
+
+    assert report.published and report.replaced == ["How do I check tire pressure?"]
+    assert kb.index is not index_before
+    pairs = {qa['question']: qa['answer'] for qa in kb.qa_pairs}
+    assert pairs["How do I check tire pressure?"] == "Use a tire gauge."
+    assert pairs["How can I trade in my car?"] == "Bring it in for an appraisal."
+    assert pairs["When should I change my oil?"] == "Every 5,000 miles.\nCheck the manual for your model."
+
+    # The file still parses cleanly, in its original format
+    records = list(KBParser().iter_file(str(kb.kb_file)))
+    assert [r.question for r in records][0] == "How do I check tire pressure?"
+    assert len(records) == 4
+    assert kb.kb_file.read_text(encoding='utf-8').startswith("Test FAQ\n")
+
+
+def test_csv_and_near_duplicates(kb):
+    upload = [
+        'question,answer\n',
+        '"Do you offer financing options?","Yes, see our finance page."\n',
+        'What warranty do used cars have?,"12 months, parts and labour."\n',
+    ]
+    report = KBIngestor(kb, threshold=0.6).ingest_stream(upload, 'csv', dry_run=True)
+    assert report.added == ["What warranty do used cars have?"]
+    assert report.collisions[0].existing_question == "Do you offer financing?"
+    assert 0.6 <= report.collisions[0].similarity < 1.0
+
+
+def test_other_workers_batches_are_not_lost(kb):
+    other_worker = KnowledgeBaseService()
+    KBIngestor(kb).ingest_stream(['{"question": "How can I trade in my car?", "answer": "Bring it in."}\n'], 'jsonl')
+
+    # The other worker still has the old KB loaded; it must plan against the file as it is now
+    upload = ['{"question": "how can I trade in my CAR?", "answer": "Other wording."}\n',
+              '{"question": "Do you sell gift cards?", "answer": "Yes."}\n']
+    report = KBIngestor(other_worker).ingest_stream(upload, 'jsonl')
+    assert report.added == ["Do you sell gift cards?"]
+    assert report.collisions[0].existing_question == "How can I trade in my car?"
+    questions = [r.question for r in KBParser().iter_file(str(kb.kb_file))]
+    assert "How can I trade in my car?" in questions and "Do you sell gift cards?" in questions
+
+
+def test_publish_waits_for_the_kb_file_lock(kb):
+    lock_path = os.path.join(os.path.dirname(str(kb.kb_file)), ".faq.txt.lock")
+    done = threading.Event()
+    with FileLock(lock_path):
+        # Held by "another worker"
+        thread = threading.Thread(target=lambda: KBIngestor(kb).ingest_stream(UPLOAD[:1], 'jsonl') and done.set())
+        thread.start()
+        assert not done.wait(0.2)
+    thread.join(5)
+    assert done.is_set() and "How can I trade in my car?" in kb.kb_file.read_text(encoding='utf-8')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Streaming knowledge base parser tests
+"""
+
+import sys
+import os
+import json
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from kb_parser import KBParser, resolve_kb_sources
+from knowledge_base_service import KnowledgeBaseService
+
+PLAIN_KB = """Automotive FAQ
+
+Q: How often should I rotate my tires?
+A: Every 5,000 to 8,000 miles.
+
+Q: Question that never gets an answer
+
+Q: What oil should I use?
+A: Check your owner's manual.
+Most modern cars use synthetic oil.
+Q: Do you sell tires?
+
+A: Yes, all major brands.
+
+A: Orphan answer
+"""
+
+MARKDOWN_KB = """# Insurance
+
+**Q: Do I need full coverage?**
+A: Only if the car is financed or leased.
+"""
+
+
+def test_plain_text_records_and_issues(tmp_path):
+    path = tmp_path / "kb.txt"
+    path.write_text(PLAIN_KB)
+    parser = KBParser()
+    records = list(parser.iter_file(str(path)))
+
+    assert [(r.question, r.line) for r in records] == [
+        ("How often should I rotate my tires?", 3),
+        ("What oil should I use?", 8),
+        ("Do you sell tires?", 11),
+    ]
+    assert records[1].answer == "Check your owner's manual.\nMost modern cars use synthetic oil."
+    assert records[2].answer == "Yes, all major brands."
+    assert [(issue.line, issue.message) for issue in parser.issues] == [
+        (6, "question without answer"),
+        (15, "answer without question"),
+    ]
+
+
+def test_markdown_and_jsonl(tmp_path):
+    (tmp_path / "insurance.md").write_text(MARKDOWN_KB)
+    lines = [
+        json.dumps({"question": "Is roadside assistance included?", "answer": "Yes, for 3 years."}),
+        "{not json",
+        json.dumps({"q": "Can I transfer my warranty?", "a": "Yes, to the next owner."}),
+        json.dumps({"question": "Missing answer"}),
+    ]
+    (tmp_path / "extra.jsonl").write_text("\n".join(lines) + "\n")
+
+    parser = KBParser()
+    records = list(parser.iter_sources(str(tmp_path)))
+    assert [r.question for r in records] == [
+        "Is roadside assistance included?",
+        "Can I transfer my warranty?",
+        "Do I need full coverage?",
+    ]
+    assert [issue.line for issue in parser.issues] == [2, 4]
+
+
+def test_resolve_sources(tmp_path):
+    for name in ["a.txt", "b.txt", "notes.csv"]:
+        (tmp_path / name).write_text("Q: x\nA: y\n")
+    assert resolve_kb_sources(str(tmp_path)) == [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+    assert resolve_kb_sources(str(tmp_path / "*.csv")) == [str(tmp_path / "notes.csv")]
+    assert resolve_kb_sources([str(tmp_path / "b.txt"), str(tmp_path / "*.txt")]) == [
+        str(tmp_path / "b.txt"), str(tmp_path / "a.txt")
+    ]
+    assert resolve_kb_sources(str(tmp_path / "missing.txt")) == []
+
+
+def test_multi_file_knowledge_base(monkeypatch, tmp_path):
+    (tmp_path / "part1.txt").write_text(PLAIN_KB)
+    (tmp_path / "part2.md").write_text(MARKDOWN_KB)
+    monkeypatch.setattr(config, 'get_knowledge_base_sources', lambda kb_name=None: [str(tmp_path / "part*")])
+
+    kb = KnowledgeBaseService()
+    assert len(kb.qa_pairs) == 4
+    assert len(kb.parse_issues) == 2
+    answer, found, _ = kb.search_knowledge_base("Do I need full coverage?")
+    assert found and answer == "Only if the car is financed or leased."
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+KB statistics tests - topic detection, term frequencies, answer lengths and caching per index
+"""
+
+import sys
+import os
+import pytest
+from httpx import AsyncClient
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from kb_stats import TOPIC_KEYWORDS, compute_kb_stats
+from knowledge_base_service import KBIndex
+
+
+QA_PAIRS = [
+    {"question": "How do I track my order?", "answer": "Use the tracking link in your shipping email."},
+    {"question": "Can I return a product?", "answer": "Returns are accepted within 30 days of delivery."},
+    {"question": "Do you have a store near me?", "answer": "See the store locator."},
+    {"question": "Is my scar covered?", "answer": "Ask your doctor."},
+]
+
+
+def test_compute_kb_stats():
+    stats = compute_kb_stats(QA_PAIRS)
+    assert stats["qa_pairs"] == 4
+    assert stats["topic"] == "ecommerce"
+    # Whole words matched by prefix: "returns" counts for "return", "scar" does not count for "car"
+    assert stats["topic_scores"]["ecommerce"] == 8
+    assert "automotive" not in stats["topic_scores"]
+    assert stats["top_terms"][0] == ["store", 2]
+    assert stats["vocabulary_size"] > 10
+    assert stats["answer_chars"]["max"] == len(QA_PAIRS[1]["answer"])
+    assert stats["answer_words"]["median"] == 6.0
+
+
+def test_empty_and_off_topic_kbs():
+    assert compute_kb_stats([])["topic"] == "general"
+    stats = compute_kb_stats([{"question": "Who are you?", "answer": "It is what it is."}])
+    assert stats["topic"] == "general" and stats["topic_scores"] == {}
+    # Stop words are counted, but never listed as top terms
+    assert stats["vocabulary_size"] == 6 and stats["top_terms"] == []
+
+
+def baseline_topic(qa_pairs):
+    """The substring count detect_kb_topic used before the stats pass"""
+    all_text = " ".join(qa['question'] + " " + qa['answer'] for qa in qa_pairs).lower()
+    scores = {topic: sum(all_text.count(keyword) for keyword in keywords) for topic, keywords in TOPIC_KEYWORDS.items()}
+    scores = {topic: score for topic, score in scores.items() if score > 0}
+    return max(scores, key=scores.get) if scores else "general"
+
+
+def test_topic_matches_the_baseline_for_keyword_kbs():
+    assert compute_kb_stats([{"question": "How do I reset the system settings?", "answer": "Open the system menu."}])["topic"] == "technology"
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        qa_pairs = [{"question": f"How does the {keyword} work?", "answer": f"The {keyword} is fine."} for keyword in keywords]
+        # A smaller share of another topic's keywords must not change the winner
+        other = next(k for t, k in TOPIC_KEYWORDS.items() if t != topic)
+        qa_pairs.append({"question": f"What about {other[0]}?", "answer": "Ask us."})
+        stats = compute_kb_stats(qa_pairs)
+        assert stats["topic"] == baseline_topic(qa_pairs) == topic
+        assert stats["topic_scores"][topic] == 2 * len(keywords)
+
+
+def test_answer_lengths():
+    stats = compute_kb_stats([
+        {"question": "a?", "answer": ""},
+        {"question": "b?", "answer": "two  words"},
+        {"question": "c?", "answer": "one\ttwo\nthree   four"},
+    ])
+    assert stats["answer_words"]["max"] == 4 and stats["answer_words"]["median"] == 2.0
+    assert stats["answer_words"]["mean"] == 2.0
+    assert stats["answer_chars"]["max"] == len("one\ttwo\nthree   four")
+
+
+def test_stats_computed_once_per_index(monkeypatch):
+    calls = []
+    monkeypatch.setattr('knowledge_base_service.compute_kb_stats',
+                        lambda qa_pairs: calls.append(1) or compute_kb_stats(qa_pairs))
+    index = KBIndex(qa_pairs=QA_PAIRS)
+    assert index.stats is index.stats
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_config_status_includes_kb_stats():
+    async with AsyncClient(app=main.app, base_url="http://test") as client:
+        response = await client.get("/config/status")
+    assert response.status_code == 200
+    stats = response.json()["kb_stats"]
+    assert stats["qa_pairs"] == len(main.kb_service.qa_pairs)
+    assert stats["topic"] == main.kb_service.detect_kb_topic() == "automotive"
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+LLM router tests - backend selection, per-task models, failover and micro-batching
+"""
+
+import sys
+import os
+import asyncio
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from llm_router import DEFAULT_OLLAMA_URL, LLMRouter
+
+SETTINGS = {
+    'ollama_backends': [
+        {'url': 'http://box1:11434'},
+        {'url': 'http://box2:11434', 'weight': 2},
+    ],
+    'models': {'default': 'big-model', 'intent': 'small-model'},
+    'max_retries': 2,
+}
+
+
+def make_router(monkeypatch, failing_urls=()):
+    monkeypatch.delenv("OLLAMA_BACKENDS", raising=False)
+    router = LLMRouter(SETTINGS)
+    calls = []
+
+    async def fake_post(backend, model, prompt):
+        calls.append((backend.url, model))
+        if backend.url in failing_urls:
+            raise RuntimeError("connection refused")
+        return f"answer from {backend.url}"
+
+    router._post_generate = fake_post
+    return router, calls
+
+
+def test_task_models(monkeypatch):
+    router, calls = make_router(monkeypatch)
+    asyncio.run(router.generate("Is this a human request?", task='intent'))
+    asyncio.run(router.generate("Hello"))
+    assert [model for _, model in calls] == ['small-model', 'big-model']
+    assert router.model_for('unknown') == 'big-model'
+
+
+def test_least_outstanding_respects_weight(monkeypatch):
+    router, _ = make_router(monkeypatch)
+    box1, box2 = router.backends
+    box1.outstanding = 1
+    box2.outstanding = 1
+    # Same load, but box2 has twice the capacity
+    assert router.pick_backend('big-model') is box2
+    box2.outstanding = 3
+    assert router.pick_backend('big-model') is box1
+
+
+def test_ewma_latency_strategy(monkeypatch):
+    router, _ = make_router(monkeypatch)
+    router.strategy = 'ewma_latency'
+    box1, box2 = router.backends
+    box1.record_success(0.2, router.ewma_alpha)
+    box2.record_success(2.0, router.ewma_alpha)
+    assert router.pick_backend('big-model') is box1
+
+
+def test_failover_to_other_backend(monkeypatch):
+    router, calls = make_router(monkeypatch, failing_urls={'http://box1:11434'})
+    result = asyncio.run(router.generate("Hello"))
+    assert result == "answer from http://box2:11434"
+    assert [url for url, _ in calls] == ['http://box1:11434', 'http://box2:11434']
+    # The failed backend cools down and is skipped next time
+    calls.clear()
+    asyncio.run(router.generate("Hello again"))
+    assert [url for url, _ in calls] == ['http://box2:11434']
+
+
+def test_all_backends_failing(monkeypatch):
+    router, calls = make_router(monkeypatch, failing_urls={'http://box1:11434', 'http://box2:11434'})
+    assert asyncio.run(router.generate("Hello")) is None
+    assert len(calls) == 2
+    assert all(backend.outstanding == 0 for backend in router.backends)
+
+
+def test_env_override(monkeypatch):
+    monkeypatch.setenv("OLLAMA_BACKENDS", "http://a:11434, http://b:11434/")
+    router = LLMRouter(SETTINGS)
+    assert [b.url for b in router.backends] == ['http://a:11434', 'http://b:11434']
+
+    # Set, but without a URL: the default backend, not an empty pool
+    monkeypatch.setenv("OLLAMA_BACKENDS", " , ")
+    assert [b.url for b in LLMRouter(SETTINGS).backends] == [DEFAULT_OLLAMA_URL]
+
+
+def test_batching_limits_parallelism(monkeypatch):
+    monkeypatch.delenv("OLLAMA_BACKENDS", raising=False)
+    monkeypatch.delenv("LLM_BATCHING", raising=False)
+    assert LLMRouter(SETTINGS).batcher is None
+
+    router = LLMRouter({**SETTINGS, 'batching': {'enabled': True, 'window_ms': 20, 'parallel': 2}})
+    running, peak, models = {}, {}, []
+
+    async def slow_post(backend, model, prompt):
+        running[backend.url] = running.get(backend.url, 0) + 1
+        peak[backend.url] = max(peak.get(backend.url, 0), running[backend.url])
+        models.append(model)
+        await asyncio.sleep(0.01 if prompt != "slow" else 0.05)
+        running[backend.url] -= 1
+        return f"re: {prompt}"
+
+    router._post_generate = slow_post
+
+    async def burst():
+        prompts = [("slow", 'default')] + [(f"p{i}", 'intent' if i % 2 else 'default') for i in range(9)]
+        return await asyncio.gather(*(router.generate(prompt, task) for prompt, task in prompts))
+
+    results = asyncio.run(burst())
+    assert results[0] == "re: slow" and results[1:] == [f"re: p{i}" for i in range(9)]
+    # 2 slots per backend, 2 backends; prompts for one model are sent together
+    assert sorted(peak.values()) == [2, 2]
+    assert models == sorted(models)
+    stats = router.get_status()["batching"]
+    assert stats["batches"] == 1 and stats["capacity"] == 4 and stats["in_flight"] == 0
+
+    # A backend the router strongly prefers still gets at most its own 2 slots
+    router.strategy = 'ewma_latency'
+    router.backends[0].ewma_latency, router.backends[1].ewma_latency = 0.001, 1.0
+    peak.clear()
+    asyncio.run(burst())
+    assert max(peak.values()) == 2
+
+
+def test_batching_env_override(monkeypatch):
+    monkeypatch.delenv("OLLAMA_BACKENDS", raising=False)
+    monkeypatch.setenv("LLM_BATCHING", "1")
+    router = LLMRouter(SETTINGS)
+    assert router.batcher is not None
+    batcher = router.batcher
+    router.configure(SETTINGS)
+    assert router.batcher is batcher  # unchanged settings keep the batcher
+    monkeypatch.setenv("LLM_BATCHING", "0")
+    router.configure(SETTINGS)
+    assert router.batcher is None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Metrics tests - Prometheus text format, per-stage spans, Server-Timing header and LLM outcome counters
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from llm_router import LLMRouter
+from metrics import MetricsRegistry, LLM_REQUESTS, LLM_EXHAUSTED, instrument_engine
+
+
+def test_text_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs run", ("kind",))
+    histogram = registry.histogram("job_seconds", "Job latency", buckets=(0.1, 1.0))
+    counter.inc(kind='say "hi"\n')
+    counter.inc(2, kind="plain")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+    registry.register_collector(lambda: [("queue_size", "gauge", "Queued jobs", [({"queue": "a"}, 4)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="say \\"hi\\"\\n"} 1' in lines
+    assert 'jobs_total{kind="plain"} 2' in lines
+    # Buckets are cumulative and end with +Inf
+    assert 'job_seconds_bucket{le="0.1"} 1' in lines
+    assert 'job_seconds_bucket{le="1"} 2' in lines
+    assert 'job_seconds_bucket{le="+Inf"} 3' in lines
+    assert "job_seconds_sum 3.55" in lines and "job_seconds_count 3" in lines
+    assert 'queue_size{queue="a"} 4' in lines
+
+
+def test_llm_outcomes_are_counted(monkeypatch):
+    monkeypatch.delenv("OLLAMA_BACKENDS", raising=False)
+    router = LLMRouter({'ollama_backends': [{'url': 'http://box1:11434'}], 'max_retries': 0})
+
+    async def timeout(backend, model, prompt):
+        raise asyncio.TimeoutError()
+
+    before = LLM_REQUESTS.value(task="metrics-test", outcome="timeout"), LLM_EXHAUSTED.value(task="metrics-test")
+    router._post_generate = timeout
+    assert asyncio.run(router.generate("hi", task="metrics-test")) is None
+    after = LLM_REQUESTS.value(task="metrics-test", outcome="timeout"), LLM_EXHAUSTED.value(task="metrics-test")
+    assert after == (before[0] + 1, before[1] + 1)
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'metrics_test.db'}")
+    instrument_engine(engine)
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_chat_stages_and_metrics_endpoint(client, monkeypatch):
+    async def fake_generate(prompt, task='default'):
+        return "NO" if task == 'intent' else "Use a gauge when the tires are cold."
+
+    monkeypatch.setattr(main.ai_service.llm_router, 'generate', fake_generate)
+    question = main.kb_service.qa_pairs[0]['question']
+    response = await client.post("/chat", json={"message": question})
+    assert response.status_code == 200
+
+    stages = dict(entry.split(";dur=") for entry in response.headers["server-timing"].split(", "))
+    assert {"kb", "intent", "llm", "db", "total"} <= set(stages)
+    assert float(stages["total"]) >= float(stages["kb"])
+
+    text = (await client.get("/metrics")).text
+    assert 'faq_kb_searches_total{result="hit"}' in text
+    assert 'faq_stage_duration_seconds_count{stage="kb"}' in text
+    assert 'faq_http_requests_total{method="POST",route="/chat",status="200"}' in text
+    assert "faq_session_cache_hit_ratio" in text
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-batching tests - grouping concurrent calls, batch size cap, failures and the KB search batcher
+"""
+
+import sys
+import os
+import asyncio
+import numpy as np
+import pytest
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from micro_batch import MicroBatcher, create_kb_batcher
+from metrics import REGISTRY
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return [item * 10 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_a_batch():
+    handler = Recorder()
+    batcher = MicroBatcher("test", handler, window_ms=20, max_batch=4)
+
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+    assert results == [0, 10, 20, 30, 40, 50]
+    # The 4th call fills a batch, the other two wait for the window
+    assert handler.batches == [[0, 1, 2, 3], [4, 5]]
+    assert batcher.get_stats()["mean_batch_size"] == 3.0
+
+    late = await batcher.submit(7)
+    assert late == 70 and handler.batches[-1] == [7]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_fails_every_caller():
+    batcher = MicroBatcher("test-fail", Recorder(fail=True), window_ms=1)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_kb_batcher(monkeypatch):
+    monkeypatch.delenv("KB_BATCH_WINDOW_MS", raising=False)
+    assert create_kb_batcher(main.kb_service) is None
+
+    monkeypatch.setenv("KB_BATCH_WINDOW_MS", "5")
+    batcher = create_kb_batcher(main.kb_service)
+    questions = [qa['question'] for qa in main.kb_service.qa_pairs[:8]]
+    results = await asyncio.gather(*(batcher.submit(q) for q in questions))
+    assert [found for _, found, _ in results] == [True] * 8
+    assert [answer for answer, _, _ in results] == [qa['answer'] for qa in main.kb_service.qa_pairs[:8]]
+    assert batcher.batches == 1
+    assert 'faq_batch_size_count{batcher="kb"}' in REGISTRY.render()
+
+
+def test_top_k_many():
+    kb = main.kb_service
+    queries = ["how do i check my tire pressure", "oil change", "", "what's the weather on mars"]
+    ids, scores = kb.top_k_many(queries, k=3)
+    assert ids.shape == scores.shape == (4, 3)
+    for query, row_ids, row_scores in zip(queries, ids, scores):
+        expected = np.sort(kb._score_query(kb.index, query))[::-1][:3]
+        expected[expected <= 0] = 0
+        assert row_scores == pytest.approx(expected, abs=1e-5)
+        assert all((i == -1) == (s == 0) for i, s in zip(row_ids, row_scores))
+    # Nothing in common with the KB: padded with -1
+    assert ids[2].tolist() == [-1, -1, -1]
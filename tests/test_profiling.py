@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Profiling tests - stack sampler, slow / sampled request profiles and the slow SQL log
+"""
+
+import sys
+import os
+import time
+import json
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from profiling import StackSampler, ProfileStore, ProfilingMiddleware, SlowQueryLog
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.fixture
+def sampler():
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    yield sampler
+    sampler.stop()
+
+
+def test_sampler_sees_running_code(sampler):
+    start = time.perf_counter()
+    busy_wait(0.2)
+    stacks = sampler.collapsed(start, time.perf_counter())
+    assert sum(count for stack, count in stacks.items() if "busy_wait" in stack) > 10
+    assert sampler.collapsed(0, start - 1) == {}
+
+
+@pytest.mark.asyncio
+async def test_slow_requests_are_profiled(sampler, tmp_path):
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow():
+        busy_wait(0.15)
+        return {}
+
+    @app.get("/fast")
+    async def fast():
+        return {}
+
+    store = ProfileStore(str(tmp_path / "profiles"), max_files=2)
+    app.add_middleware(ProfilingMiddleware, sampler=sampler, store=store, slow_ms=100)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/fast")
+        await client.get("/slow")
+
+    names = store.list()
+    assert len(names) == 1 and "-slow-GET-slow-" in names[0]
+    profile = store.load(names[0])
+    assert profile["status"] == 200 and profile["duration_ms"] >= 100
+    # Sync endpoints run in the thread pool; their stacks are sampled too
+    assert any("busy_wait" in stack for stack in profile["stacks"])
+
+    # Oldest profiles beyond max_files are removed
+    for i in range(3):
+        store.save({"path": f"/p{i}", "method": "GET", "reason": "sampled", "duration_ms": 1, "stacks": {}})
+    assert len(store.list()) == 2
+    assert store.load("../secrets.json") is None
+
+
+def log_entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log_rotates(tmp_path):
+    log = SlowQueryLog(str(tmp_path / "slow.jsonl"), threshold_ms=0, max_bytes=300, backups=2)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    log.instrument(engine)
+    async with engine.connect() as conn:
+        for i in range(6):
+            await conn.execute(text(f"SELECT {i}"))
+        await conn.execute(text("SELECT :contact"), {"contact": "jane@example.com"})
+    await engine.dispose()
+
+    entries = log.tail(10)
+    # Bound values (chat text, contacts) are never written, only how many there were
+    assert entries[0]["statement"] == "SELECT ?" and entries[0]["parameter_count"] == 1
+    assert "jane@example.com" not in open(log.path).read()
+    assert entries[0]["duration_ms"] >= 0
+    assert any(entry["statement"] == "SELECT 5" for entry in entries + log_entries(f"{log.path}.1"))
+    assert os.path.exists(f"{log.path}.1") and not os.path.exists(f"{log.path}.3")
+
+
+@pytest.mark.asyncio
+async def test_debug_endpoints(monkeypatch):
+    async with AsyncClient(app=main.app, base_url="http://test") as client:
+        # Hidden unless DEBUG_TOKEN is set
+        monkeypatch.delenv("DEBUG_TOKEN", raising=False)
+        assert (await client.get("/debug/profiles")).status_code == 404
+        assert (await client.get("/debug/slow-queries")).status_code == 404
+
+        monkeypatch.setenv("DEBUG_TOKEN", "s3cret")
+        assert (await client.get("/debug/slow-queries")).status_code == 403
+        assert (await client.get("/debug/slow-queries", headers={"X-Debug-Token": "wrong"})).status_code == 403
+        headers = {"X-Debug-Token": "s3cret"}
+        listing = (await client.get("/debug/profiles", headers=headers)).json()
+        assert "sample_rate" in listing["status"]
+        assert (await client.get("/debug/profiles/missing.json", headers=headers)).status_code == 404
+        assert (await client.get("/debug/slow-queries", headers=headers)).status_code == 200
+
+
+def test_slow_query_log_writes_in_the_background(tmp_path, monkeypatch):
+    log = SlowQueryLog(str(tmp_path / "slow.jsonl"), threshold_ms=0, max_bytes=300, backups=2)
+    written = []
+    real_write = log._write
+
+    def slow_write(entries):
+        time.sleep(0.2)
+        written.extend(entries)
+        real_write(entries)
+
+    monkeypatch.setattr(log, '_write', slow_write)
+    started = time.perf_counter()
+    for i in range(10):
+        log.record(f"SELECT {i}", (), 1.0)
+    # record() only queues: the caller (the event loop thread) never waits for the disk
+    assert time.perf_counter() - started < 0.1 and not written
+    entries = log.tail(20)
+    assert len(written) == 10 and entries[0]["statement"] == "SELECT 9"
+    # Rotation still happens inside one batch
+    assert os.path.exists(f"{log.path}.1")
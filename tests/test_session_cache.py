@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Session state cache tests - LRU/TTL eviction and skipping the session read for active sessions
+"""
+
+import sys
+import os
+import time
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from models import ChatSession
+from session_cache import SessionStateCache
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = SessionStateCache(max_sessions=2, ttl=60)
+    cache.update("a", 0, 'normal')
+    cache.update("b", 1, 'guiding')
+    assert cache.get("a").guidance_stage == 'normal'  # "a" is now most recent
+    cache.update("c", 0, 'normal')
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+    assert cache.get("a") is None
+    assert cache.get_stats()["sessions"] == 1
+
+
+def test_update_keeps_ticket_flag():
+    cache = SessionStateCache()
+    cache.update("s", 0, 'normal', has_ticket=True)
+    cache.update("s", 1, 'ended')
+    state = cache.get("s")
+    assert state.has_ticket and state.ended
+    assert state.as_dict() == {'unclear_message_count': 1, 'guidance_stage': 'ended'}
+
+    assert not SessionStateCache(ttl=0).enabled
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        ac.statements = statements
+        ac.session_factory = TestSessionLocal
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_active_session_skips_session_read(client, monkeypatch):
+    async def fake_generate(message, kb_answer, kb_found, session_state):
+        session_state['unclear_message_count'] += 1
+        session_state['guidance_stage'] = 'guiding'
+        return "Could you tell me more?", False, True
+
+    monkeypatch.setattr(main.ai_service, 'generate_response', fake_generate)
+    monkeypatch.setattr(main.ai_service, 'should_create_ticket', lambda *args: False)
+
+    first = await client.post("/chat", json={"message": "hmm", "user_contact": "a@example.com"})
+    session_id = first.json()["session_id"]
+
+    client.statements.clear()
+    await client.post("/chat", json={"message": "hmm", "user_contact": "a@example.com", "session_id": session_id})
+    assert not [s for s in client.statements if s.lstrip().upper().startswith("SELECT")]
+
+    # Write-through: the database holds what the cache holds
+    async with client.session_factory() as db:
+        row = (await db.execute(select(ChatSession).where(ChatSession.session_id == session_id))).scalar_one()
+    assert row.unclear_message_count == 2
+    assert main.session_cache.get(session_id).unclear_message_count == 2
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Parallel (sharded) TF-IDF index build tests
+"""
+
+import sys
+import os
+import numpy as np
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from config_loader import config
+from knowledge_base_service import KnowledgeBaseService
+from sharded_vectorizer import ShardedTfidfVectorizer
+
+DOCS = [f"How do I {verb} my {thing} number {i}?"
+        for i in range(200)
+        for verb, thing in [("renew", "insurance"), ("sell", "car"), ("finance", "truck")]]
+
+
+def test_parallel_build_matches_single_process():
+    parallel = ShardedTfidfVectorizer(workers=2, min_shard_size=50)
+    assert len(parallel._shards(DOCS)) > 1
+    sequential = ShardedTfidfVectorizer(workers=1, min_shard_size=50)
+
+    parallel_matrix = parallel.fit_transform(DOCS)
+    sequential_matrix = sequential.fit_transform(DOCS)
+    assert parallel_matrix.format == 'csr'
+    assert parallel_matrix.shape == (len(DOCS), 2 ** 20)
+    assert abs(parallel_matrix - sequential_matrix).max() < 1e-12
+
+    queries = parallel.transform(["renew insurance"])
+    assert np.allclose(queries.toarray(), sequential.transform(["renew insurance"]).toarray())
+
+
+def test_knowledge_base_parallel_build(monkeypatch):
+    kb_config = dict(config.get_knowledge_base_config())
+    kb_config['tfidf_settings'] = dict(kb_config.get('tfidf_settings', {}), build_workers=2, parallel_min_docs=1)
+    monkeypatch.setattr(config, 'get_knowledge_base_config', lambda: kb_config)
+
+    kb = KnowledgeBaseService()
+    assert isinstance(kb.vectorizer, ShardedTfidfVectorizer)
+    question = kb.qa_pairs[5]['question']
+    answer, found, score = kb.search_knowledge_base(question)
+    assert found and answer == kb.qa_pairs[5]['answer']
+    assert score > 0.99
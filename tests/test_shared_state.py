@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Multi-worker shared state tests - index cache reuse across workers, active KB / reload propagation
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from shared_state import SharedState
+from kb_index_cache import KBIndexCache
+from knowledge_base_service import KnowledgeBaseService
+from vector_index import DenseIndex
+
+
+def test_second_worker_loads_cached_index(tmp_path, monkeypatch):
+    cache = KBIndexCache(str(tmp_path / "index_cache"))
+    first = KnowledgeBaseService(index_cache=cache)
+    assert len(os.listdir(tmp_path / "index_cache")) > 0
+
+    # A second worker must not re-parse the KB
+    monkeypatch.setattr(KnowledgeBaseService, '_parse_sources', lambda self, sources: pytest.fail("re-parsed KB"))
+    monkeypatch.setattr('knowledge_base_service.compute_kb_stats', lambda qa_pairs: pytest.fail("recomputed KB stats"))
+    second = KnowledgeBaseService(index_cache=cache)
+
+    assert second.qa_pairs == first.qa_pairs
+    assert second.index.stats == first.index.stats
+    # Read-only view onto the memory-mapped cache file, not a private copy
+    assert not second.tfidf_matrix.data.flags.writeable
+    question = first.qa_pairs[3]['question']
+    assert second.search_knowledge_base(question) == first.search_knowledge_base(question)
+
+
+def test_dense_index_round_trip(tmp_path):
+    cache = KBIndexCache(str(tmp_path))
+    rng = np.random.default_rng(0)
+    dense = DenseIndex(rng.normal(size=(20, 8)), quantize=True)
+    cache.save("k", [{"question": "q", "answer": "a"}], None, None, dense_index=dense, embedding_model="m")
+
+    cached = cache.load("k")
+    restored = DenseIndex.from_arrays(cached['dense_matrix'], cached['dense_scales'])
+    query = rng.normal(size=(2, 8))
+    np.testing.assert_allclose(restored.scores(query), dense.scores(query), rtol=1e-6)
+    assert cached['embedding_model'] == "m"
+    assert cache.load("missing") is None
+
+
+def test_changes_propagate_between_workers(tmp_path):
+    worker_a = SharedState(str(tmp_path))
+    worker_b = SharedState(str(tmp_path))
+    seen = []
+    worker_b.on_change(lambda old, new: seen.append((old.get("active_kb"), new.get("active_kb"))))
+
+    worker_a.publish_active_kb("automotive_zh")
+    worker_b.poll()
+    assert seen == [(None, "automotive_zh")]
+
+    # The publishing worker does not re-apply its own change
+    worker_a.on_change(lambda old, new: pytest.fail("applied own change"))
+    worker_a.request_reload()
+    worker_a.poll()
+    worker_b.poll()
+    assert worker_b.state["reload_generation"] == 1
+    assert len(seen) == 2
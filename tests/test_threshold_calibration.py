@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Threshold calibration tests - fitting from labeled scores, chat log outcomes, calibrated
+per-KB / per-question thresholds in search, and the /knowledge-base/calibrate endpoint
+"""
+
+import sys
+import os
+import json
+import numpy as np
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+import main
+from database import Base, get_db
+from models import ChatMessage, Ticket
+from knowledge_base_service import KnowledgeBaseService
+from threshold_calibration import (
+    GOOD, BAD, UNKNOWN, ThresholdCalibrator, fetch_chat_outcomes, fit_threshold, load_thresholds,
+    parse_labeled_records, save_thresholds
+)
+
+
+@pytest.fixture(scope="module")
+def kb():
+    return KnowledgeBaseService()
+
+
+@pytest.fixture
+def thresholds_file(tmp_path, monkeypatch):
+    path = tmp_path / "kb_thresholds.json"
+    monkeypatch.setenv("KB_THRESHOLDS_FILE", str(path))
+    return path
+
+
+def test_fit_threshold():
+    scores = np.array([0.9, 0.8, 0.7, 0.6, 0.55, 0.5, 0.45, 0.4, 0.3])
+    labels = np.array([GOOD, GOOD, GOOD, BAD, GOOD, GOOD, UNKNOWN, BAD, BAD])
+    assert fit_threshold(scores, labels, 0.8) == 0.5
+    assert fit_threshold(scores, labels, 0.95) == 0.7
+    # Never lands on a bad sample, however loose the target
+    assert fit_threshold(scores, labels, 0.1) == 0.5
+    assert fit_threshold(scores, np.full(len(scores), BAD), 0.5) is None
+    # A good and a bad sample with the same score count together
+    assert fit_threshold(np.array([0.9, 0.6, 0.6]), np.array([GOOD, GOOD, BAD]), 0.8) == 0.9
+
+
+def test_labeled_records_can_lower_the_threshold(kb):
+    # Shortened KB questions score below the configured threshold but still find the right answer
+    records = [{"message": " ".join(qa['question'].split()[-4:]), "expected": qa['question']} for qa in kb.qa_pairs]
+    records += [{"message": text, "expected": None} for text in ("my cat is sick", "what time is it in Tokyo")]
+    calibrator = ThresholdCalibrator(kb, target_precision=0.8, min_samples=10)
+    assert calibrator.add_labeled(records) == len(records)
+    report = calibrator.fit(current_threshold=0.5).to_dict()
+
+    assert report["samples"]["total"] == len(records)
+    assert report["threshold"] < 0.5
+    assert report["precision"]["calibrated"] >= 0.8
+    ids, scores = kb.top_k_many([r["message"] for r in records], k=1)
+    moved = ((scores[:, 0] >= report["threshold"]) & (scores[:, 0] < 0.5)).sum()
+    assert report["fallback_reduction"] == moved > 0
+    assert report["kb_answers"]["calibrated"] == report["kb_answers"]["current"] + moved
+
+
+def test_chat_history_alone_never_lowers_the_threshold(kb):
+    outcomes = [(qa['question'], True, False) for qa in kb.qa_pairs[:30]]
+    outcomes += [("how do I cancel my order", False, True), ("hello", False, False)]
+    calibrator = ThresholdCalibrator(kb, min_samples=10)
+    calibrator.add_history(outcomes)
+    report = calibrator.fit(current_threshold=0.5)
+    assert report.samples == {"total": 32, "good": 30, "bad": 1, "unknown": 1}
+    assert report.threshold >= 0.5
+    assert any("labeled records" in note for note in report.notes)
+
+    # Too little evidence: keep the current threshold
+    report = ThresholdCalibrator(kb, min_samples=100).fit(current_threshold=0.5)
+    assert report.threshold == 0.5 and report.fallback_reduction == 0
+
+
+def test_parse_labeled_records():
+    lines = ['{"message": "a", "expected": "A?"}', '', 'not json', '{"message": "b"}', '{"question": "c", "expected": null}']
+    records, issues = parse_labeled_records(lines)
+    assert [r.get('message') or r.get('question') for r in records] == ["a", "c"]
+    assert len(issues) == 2 and issues[0].startswith("line 3")
+
+
+def test_calibrated_thresholds_are_used_by_search(kb, thresholds_file):
+    question = kb.qa_pairs[0]['question']
+    calibrator = ThresholdCalibrator(kb, min_samples=1)
+    report = calibrator.fit(current_threshold=0.5)
+    report.threshold = 0.3
+    report.question_thresholds = {question: 1.01}
+    save_thresholds("primary:tfidf", report)
+    assert set(load_thresholds()) == {"primary:tfidf"}
+
+    calibrated = KnowledgeBaseService()
+    assert calibrated.similarity_threshold == 0.3 and calibrated.config_threshold == 0.5
+    # The per-question threshold rejects even an exact match; other questions use the KB threshold
+    assert calibrated.search_knowledge_base(question)[1] is False
+    other = kb.qa_pairs[1]['question']
+    assert calibrated.search_knowledge_base(other)[1] is True
+    assert [found for _, found, _ in calibrated.search_many([question, other])] == [False, True]
+    # An explicit threshold bypasses the calibration
+    assert calibrated.search_knowledge_base(question, threshold=0.5)[1] is True
+
+    os.remove(thresholds_file)
+    calibrated.load_calibration()
+    assert calibrated.similarity_threshold == 0.5 and calibrated.search_knowledge_base(question)[1] is True
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'calibration_test.db'}")
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with TestSessionLocal() as session:
+            yield session
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        ac.session_factory = TestSessionLocal
+        yield ac
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+async def add_log(client, turns, tickets):
+    async with client.session_factory() as session:
+        session.add_all(ChatMessage(session_id=s, message=m, response="r", is_from_kb=kb_hit) for s, m, kb_hit in turns)
+        session.add_all(Ticket(session_id=s, user_question=q) for s, q in tickets)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_fetch_chat_outcomes(client):
+    await add_log(client, [("s1", "oil change?", True), ("s1", "that didn't help", False), ("s2", "hi", False),
+                           ("s3", "tire pressure?", True)], [("s1", "that didn't help")])
+    async with client.session_factory() as session:
+        outcomes = await fetch_chat_outcomes(session)
+        assert outcomes == [("oil change?", True, True), ("that didn't help", False, True),
+                            ("hi", False, False), ("tire pressure?", True, False)]
+        assert [o[0] for o in await fetch_chat_outcomes(session, limit=2)] == ["hi", "tire pressure?"]
+
+
+@pytest.mark.asyncio
+async def test_calibrate_endpoint(client, thresholds_file):
+    kb = main.kb_service
+    await add_log(client, [(f"s{i}", qa['question'], True) for i, qa in enumerate(kb.qa_pairs[:10])], [])
+    labeled = "\n".join(json.dumps({"message": " ".join(qa['question'].split()[-4:]), "expected": qa['question']})
+                        for qa in kb.qa_pairs)
+
+    response = await client.post("/knowledge-base/calibrate?target_precision=0.8&min_samples=5", content=labeled)
+    report = response.json()
+    assert response.status_code == 200 and not report["applied"]
+    assert report["samples"]["total"] == 10 + len(kb.qa_pairs)
+    assert report["threshold"] < report["current_threshold"] == 0.5
+    assert not thresholds_file.exists() and kb.similarity_threshold == 0.5
+
+    try:
+        response = await client.post("/knowledge-base/calibrate?target_precision=0.8&min_samples=5&apply=true", content=labeled)
+        assert response.json()["applied"]
+        assert kb.similarity_threshold == response.json()["threshold"]
+        status = (await client.get("/config/status")).json()
+        assert status["similarity_threshold"] == kb.similarity_threshold
+        assert status["threshold_calibration"]["configured_threshold"] == 0.5
+    finally:
+        os.remove(thresholds_file)
+        kb.load_calibration()
+    assert kb.similarity_threshold == 0.5
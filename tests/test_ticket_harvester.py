@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Ticket harvesting tests - clustering closed tickets into KB candidates, incremental runs
+"""
+
+import sys
+import os
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# Add server app to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server', 'app'))
+
+from database import Base
+from models import Ticket
+from kb_parser import KBParser
+from ticket_harvester import HarvestState, TicketHarvester, fetch_closed_tickets, write_candidates
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def make_tickets(questions, first_id=1):
+    return [
+        SimpleNamespace(id=first_id + i, user_question=q, ai_attempted_response="Please contact us.",
+                        updated_at=START + timedelta(minutes=first_id + i), created_at=START)
+        for i, q in enumerate(questions)
+    ]
+
+
+def test_clusters_and_incremental_runs(tmp_path):
+    state = HarvestState(str(tmp_path / "state.json"))
+    harvester = TicketHarvester(threshold=0.3)
+    stats = harvester.harvest(state, make_tickets([
+        "My car key fob stopped working",
+        "Key fob is not working anymore",
+        "Can I get a loaner car during repairs?",
+    ]))
+    assert stats["new_clusters"] == 2
+    state.save()
+
+    # A later run joins the existing cluster instead of starting a new one
+    state = HarvestState(str(tmp_path / "state.json"))
+    assert state.watermark == ((START + timedelta(minutes=3)).isoformat(), 3)
+    stats = harvester.harvest(state, make_tickets(["Is a loaner car available while mine is repaired?"], first_id=4))
+    assert stats["new_clusters"] == 0
+    assert sorted(c.size for c in state.clusters) == [2, 2]
+
+
+def test_candidates_file_feeds_ingestion(tmp_path):
+    state = HarvestState(str(tmp_path / "state.json"))
+    TicketHarvester().harvest(state, make_tickets([
+        "My car key fob stopped working", "Key fob is not working anymore", "Do you sell tires?"
+    ]))
+    path = str(tmp_path / "candidates.jsonl")
+    assert write_candidates(path, state.clusters, min_size=2) == 1
+
+    with open(path, encoding='utf-8') as f:
+        candidate = json.loads(f.readline())
+    assert candidate["tickets"] == 2 and candidate["answer"] == ""
+    candidate["answer"] = "Replace the battery, then re-pair the fob."
+    parser = KBParser()
+    records = list(parser.iter_jsonl_lines([json.dumps(candidate)], "candidates.jsonl"))
+    assert records[0].question == candidate["question"] and not parser.issues
+
+
+class FakeKB:
+    """search_many stand-in: the KB answers questions mentioning tires"""
+
+    def __init__(self):
+        self.calls = []
+
+    def search_many(self, queries):
+        self.calls.append(list(queries))
+        return [("answer", "tire" in q.lower(), 0.0) for q in queries]
+
+
+def test_coverage_is_checked_in_one_batch(tmp_path):
+    state = HarvestState(str(tmp_path / "state.json"))
+    kb = FakeKB()
+    harvester = TicketHarvester(kb, threshold=0.3)
+    stats = harvester.harvest(state, make_tickets([
+        "My car key fob stopped working", "Do you sell winter tires?", "Key fob is not working anymore"
+    ]))
+    assert stats["covered"] == 1 and stats["new_clusters"] == 1
+    assert len(kb.calls) == 1 and len(kb.calls[0]) == 3
+
+    # Representatives are scored in the same call; a cluster the KB now answers is retired
+    state.clusters[0].representative = "Key fob tire pressure sensor"
+    stats = harvester.harvest(state, make_tickets(["Is a loaner car available?"], first_id=4))
+    assert kb.calls[-1] == ["Key fob tire pressure sensor", "Is a loaner car available?"]
+    assert stats["retired_clusters"] == 1 and [c.representative for c in state.clusters] == ["Is a loaner car available?"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_closed_tickets_after_watermark(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'harvest.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(bind=engine, class_=AsyncSession)
+
+    async with SessionLocal() as db:
+        db.add_all([
+            Ticket(session_id="s", user_question="a", status="closed", updated_at=START),
+            Ticket(session_id="s", user_question="b", status="closed", updated_at=START),
+            Ticket(session_id="s", user_question="c", status="open", updated_at=START),
+            Ticket(session_id="s", user_question="d", status="closed", updated_at=START + timedelta(hours=1)),
+        ])
+        await db.commit()
+        first = await fetch_closed_tickets(db, None)
+        later = await fetch_closed_tickets(db, (START.isoformat(), first[0].id))
+        assert [t.user_question for t in first] == ["a", "b", "d"]
+        assert [t.user_question for t in later] == ["b", "d"]
+
+        # Inserted closed after the first run: no updated_at, so created_at places it after the watermark
+        state = HarvestState(str(tmp_path / "state.json"))
+        TicketHarvester().harvest(state, first)
+        db.add(Ticket(session_id="s", user_question="e", status="closed", created_at=START + timedelta(hours=2)))
+        await db.commit()
+        newer = await fetch_closed_tickets(db, state.watermark)
+        assert [(t.user_question, t.updated_at) for t in newer] == [("e", None)]
+    await engine.dispose()